@@ -1,8 +1,6 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session
+from flask import Flask, abort, current_app, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
-from PIL import Image
 import uuid
 import sqlite3
 import json
@@ -11,55 +9,72 @@ import re
 from datetime import datetime, timedelta
 from functools import wraps
 import secrets
+import click
 import random
-import string
+import unicodedata
+import db as database
+from db import get_db, query_db, execute_db
+import catalog as catalog_cache
+from catalog import get_catalog, invalidate_catalog
+import view_counter
+from view_counter import record_view
+import pagination
+from pagination import paginate_query, paginate_list
+import stats as dashboard
+import http_cache
+from http_cache import public_page
+import fragment_cache
+import assets
+import images
+from images import image_pipeline
+import order_items
+import carts
+import orders
+import write_queue
+import passwords
+from passwords import hash_password, verify_password
+import principals
+import request_metrics
+from principals import invalidate_principal
+from fragment_cache import flush_fragments
+import settings
+from registry import Registry
 
-app = Flask(__name__)
-app.config['SECRET_KEY'] = 'pixelcraft-secret-key-2024-rio-' + secrets.token_hex(16)
-app.config['DATABASE'] = 'instance/pixelcraft.db'
-app.config['UPLOAD_FOLDER'] = 'static/img/uploads'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max
+# Rotas, filtros e comandos entram no app em create_app (ver registry.py)
+site = Registry()
 
 login_manager = LoginManager()
-login_manager.init_app(app)
 login_manager.login_view = 'customer_login'
 
+
+def create_app(config=None):
+    """Build the app: settings (see settings.py), then every service, then the routes."""
+    app = Flask(__name__)
+    settings.load(app, config)
+    database.init_app(app)
+    catalog_cache.init_app(app)
+    view_counter.init_app(app)
+    pagination.init_app(app)
+    http_cache.init_app(app)
+    fragment_cache.init_app(app)
+    assets.init_app(app)
+    images.init_app(app)
+    carts.init_app(app)
+    orders.init_app(app)
+    write_queue.init_app(app)
+    passwords.init_app(app)
+    principals.init_app(app)
+    request_metrics.init_app(app)
+    login_manager.init_app(app)
+    site.init_app(app)
+    return app
+
 # Configurações de upload
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
-MAX_IMAGE_SIZE = (1920, 1080)
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def resize_image(image_path, max_size=MAX_IMAGE_SIZE):
-    try:
-        with Image.open(image_path) as img:
-            img.thumbnail(max_size, Image.Resampling.LANCZOS)
-            img.save(image_path, optimize=True, quality=85)
-    except Exception as e:
-        print(f"Erro ao redimensionar: {e}")
-
-# Database helper functions
-def get_db():
-    db = sqlite3.connect(app.config['DATABASE'])
-    db.row_factory = sqlite3.Row
-    return db
-
-def query_db(query, args=(), one=False):
-    db = get_db()
-    cur = db.execute(query, args)
-    rv = cur.fetchall()
-    db.close()
-    return (rv[0] if rv else None) if one else rv
-
-def execute_db(query, args=()):
-    db = get_db()
-    cur = db.execute(query, args)
-    db.commit()
-    lastrowid = cur.lastrowid
-    db.close()
-    return lastrowid
-
 # User classes for Flask-Login
 class User(UserMixin):
     def __init__(self, id, username, email, role, name=None):
@@ -71,19 +86,26 @@ class User(UserMixin):
         self.is_admin = role == 'admin'
         self.is_customer = role == 'customer'
 
+def fetch_user(user_id):
+    # The id prefix names the table: one primary-key lookup
+    role, pk = principals.parse_user_id(user_id)
+    if role == 'admin':
+        user = query_db('SELECT id, username, email FROM users WHERE id = ? AND active = 1', [pk], one=True)
+        if user:
+            return User(f"admin_{user['id']}", user['username'], user['email'], 'admin')
+    elif role == 'customer':
+        customer = query_db('SELECT id, email, name FROM customers WHERE id = ? AND active = 1', [pk], one=True)
+        if customer:
+            return User(f"customer_{customer['id']}", customer['email'], customer['email'], 'customer', customer['name'])
+    return None
+
 @login_manager.user_loader
 def load_user(user_id):
-    # Try admin users first
-    user = query_db('SELECT * FROM users WHERE id = ?', [user_id], one=True)
-    if user:
-        return User(f"admin_{user['id']}", user['username'], user['email'], 'admin')
-    
-    # Try customers
-    customer = query_db('SELECT * FROM customers WHERE id = ?', [user_id], one=True)
-    if customer:
-        return User(f"customer_{customer['id']}", customer['email'], customer['email'], 'customer', customer['name'])
-    
-    return None
+    return principals.principal_cache().get(user_id, fetch_user)
+
+def sign_in(user_obj):
+    login_user(user_obj)
+    principals.principal_cache().put(user_obj)
 
 def admin_required(f):
     @wraps(f)
@@ -296,15 +318,18 @@ def init_db():
         );
     ''')
     
+    # Apply pending schema migrations (indexes, triggers, derived tables)
+    database.migrate(db)
+    
     # Insert default admin user if not exists
     admin = query_db('SELECT * FROM users WHERE username = ?', ['admin'], one=True)
     if not admin:
-        password_hash = generate_password_hash('admin123')
+        password_hash = passwords.password_hasher().hash_inline('admin123')
         db.execute('INSERT INTO users (username, email, password_hash, role) VALUES (?, ?, ?, ?)',
                   ['admin', 'admin@pixelcraft.com', password_hash, 'admin'])
     
     # Insert default categories if not exist
-    categories_count = db.execute('SELECT COUNT(*) FROM categories').fetchone()[0]
+    categories_count = db.execute('SELECT COUNT(*) FROM categories -- scan-ok: init_db, dados de exemplo').fetchone()[0]
     if categories_count == 0:
         default_categories = [
             ('Starter', 'starter', 'PCs para iniciantes no mundo gamer', 'gamepad', '#10B981', 1),
@@ -317,7 +342,7 @@ def init_db():
             db.execute('INSERT INTO categories (name, slug, description, icon, color, ordem) VALUES (?, ?, ?, ?, ?, ?)', cat)
     
     # Insert sample PCs if not exist
-    pcs_count = db.execute('SELECT COUNT(*) FROM pcs').fetchone()[0]
+    pcs_count = db.execute('SELECT COUNT(*) FROM pcs -- scan-ok: init_db, dados de exemplo').fetchone()[0]
     if pcs_count == 0:
         sample_pcs = [
             ('Starter RJ', 'starter-rj', 'Perfeito para começar', 1, 2999.90, None, '/static/img/pcs/starter-rj.svg', 
@@ -335,7 +360,7 @@ def init_db():
                          VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', pc)
     
     # Insert sample games if not exist
-    games_count = db.execute('SELECT COUNT(*) FROM games').fetchone()[0]
+    games_count = db.execute('SELECT COUNT(*) FROM games -- scan-ok: init_db, dados de exemplo').fetchone()[0]
     if games_count == 0:
         sample_games = [
             ('Counter-Strike 2', 'cs2', 'FPS', 'Valve', 2023, '/static/img/games/cs2.svg'),
@@ -351,114 +376,69 @@ def init_db():
             db.execute('INSERT INTO games (name, slug, genre, publisher, release_year, image_url) VALUES (?, ?, ?, ?, ?, ?)', game)
     
     db.commit()
-    db.close()
 
 # Routes - Public Pages
-@app.route('/')
+@site.route('/')
+@public_page()
 def index():
-    featured_query = """
-        SELECT p.*, c.name as category_name, c.color as category_color
-        FROM pcs p
-        LEFT JOIN categories c ON p.category_id = c.id
-        WHERE p.active = 1 AND p.featured = 1
-        ORDER BY p.created_at DESC
-        LIMIT 8
-    """
-    featured_pcs = query_db(featured_query)
-    categories = query_db('SELECT * FROM categories WHERE active = 1 ORDER BY ordem')
-    return render_template('index.html', featured_pcs=featured_pcs, categories=categories)
-
-@app.route('/pcs')
+    snapshot = get_catalog()
+    return render_template('index.html', featured_pcs=snapshot.featured[:8], categories=snapshot.categories)
+
+CATALOG_FACET_FILTERS = ('price', 'gpu', 'ram', 'storage', 'in_stock', 'limited_edition')
+
+@site.route('/pcs')
+@public_page()
 def catalog():
     category = request.args.get('category')
     sort = request.args.get('sort', 'newest')
     price_min = request.args.get('price_min', type=int)
     price_max = request.args.get('price_max', type=int)
-    
-    base_query = """
-        SELECT p.*, c.name as category_name, c.color as category_color
-        FROM pcs p
-        LEFT JOIN categories c ON p.category_id = c.id
-        WHERE p.active = 1
-    """
-    params = []
-    
-    if category:
-        base_query += ' AND c.slug = ?'
-        params.append(category)
-    
-    if price_min:
-        base_query += ' AND p.price >= ?'
-        params.append(price_min)
-    
-    if price_max:
-        base_query += ' AND p.price <= ?'
-        params.append(price_max)
-    
-    # Sorting
-    if sort == 'price_low':
-        base_query += ' ORDER BY p.price ASC'
-    elif sort == 'price_high':
-        base_query += ' ORDER BY p.price DESC'
-    elif sort == 'popular':
-        base_query += ' ORDER BY p.views DESC'
-    else:
-        base_query += ' ORDER BY p.created_at DESC'
-    
-    pcs = query_db(base_query, params)
-    categories = query_db('SELECT * FROM categories WHERE active = 1 ORDER BY ordem')
-    
-    return render_template('catalog.html', pcs=pcs, categories=categories, current_category=category)
+    filters = {name: request.args.getlist(name) for name in CATALOG_FACET_FILTERS}
+    
+    snapshot = get_catalog()
+    pcs, facets = snapshot.browse(category=category, price_min=price_min, price_max=price_max,
+                                  sort=sort, filters=filters)
+    category_facet = next(facet for facet in facets if facet['name'] == 'category')
+    category_counts = {option['value']: option['count'] for option in category_facet['options']}
+    
+    key, descending = catalog_cache.SORT_KEYS.get(sort, catalog_cache.SORT_KEYS['newest'])
+    page = paginate_list(pcs, key, descending, per_page=current_app.config['CATALOG_PAGE_SIZE'],
+                         after=request.args.get('after'), before=request.args.get('before'))
+    
+    return render_template('catalog.html', pcs=page, page=page, total=len(pcs),
+                           categories=snapshot.categories, current_category=category,
+                           facets=[facet for facet in facets if facet is not category_facet],
+                           category_counts=category_counts, sort=sort,
+                           price_min=price_min, price_max=price_max)
 
-@app.route('/pc/<slug>')
+def count_product_view(slug):
+    pc = get_catalog().by_slug.get(slug)
+    if pc:
+        record_view(pc['id'])
+
+@site.route('/pc/<slug>')
+@public_page(on_not_modified=count_product_view)
 def product_detail(slug):
-    pc_query = """
-        SELECT p.*, c.name as category_name, c.color as category_color
-        FROM pcs p
-        LEFT JOIN categories c ON p.category_id = c.id
-        WHERE p.slug = ? AND p.active = 1
-    """
-    pc = query_db(pc_query, [slug], one=True)
+    snapshot = get_catalog()
+    pc = snapshot.by_slug.get(slug)
     
     if not pc:
         flash('Produto não encontrado', 'error')
         return redirect(url_for('catalog'))
     
-    execute_db('UPDATE pcs SET views = views + 1 WHERE id = ?', [pc['id']])
-    
-    games_query = """
-        SELECT g.*, pg.performance, pg.fps_avg, pg.resolution
-        FROM games g
-        JOIN pc_games pg ON g.id = pg.game_id
-        WHERE pg.pc_id = ?
-        ORDER BY pg.performance DESC
-    """
-    games = query_db(games_query, [pc['id']])
-    
-    reviews_query = """
-        SELECT r.*, c.name as customer_name
-        FROM reviews r
-        LEFT JOIN customers c ON r.customer_id = c.id
-        WHERE r.pc_id = ? AND r.status = 'approved'
-        ORDER BY r.created_at DESC
-        LIMIT 10
-    """
-    reviews = query_db(reviews_query, [pc['id']])
-    
-    related_query = """
-        SELECT p.*, c.name as category_name, c.color as category_color
-        FROM pcs p
-        LEFT JOIN categories c ON p.category_id = c.id
-        WHERE p.category_id = ? AND p.id != ? AND p.active = 1
-        ORDER BY RANDOM()
-        LIMIT 4
-    """
-    related = query_db(related_query, [pc['category_id'], pc['id']])
-    
-    return render_template('product.html', pc=pc, games=games, reviews=reviews, related=related)
+    record_view(pc['id'])
+    
+    games = snapshot.games.get(pc['id'], ())
+    gallery = snapshot.gallery.get(pc['id'], ())
+    reviews = snapshot.reviews.get(pc['id'], ())
+    review_summary = snapshot.review_summary.get(pc['id'], {'count': 0, 'average': 0})
+    related = snapshot.related(pc, random)
+    
+    return render_template('product.html', pc=pc, games=games, gallery=gallery, reviews=reviews,
+                           review_summary=review_summary, related=related)
 
 # Customer Authentication
-@app.route('/login', methods=['GET', 'POST'])
+@site.route('/login', methods=['GET', 'POST'])
 def customer_login():
     if request.method == 'POST':
         email = request.form.get('email')
@@ -466,10 +446,13 @@ def customer_login():
         
         customer = query_db('SELECT * FROM customers WHERE email = ? AND active = 1', [email], one=True)
         
-        if customer and check_password_hash(customer['password_hash'], password):
+        ok, new_hash = verify_password(customer['password_hash'], password) if customer else (False, None)
+        if ok:
             user_obj = User(f"customer_{customer['id']}", customer['email'], customer['email'], 'customer', customer['name'])
-            login_user(user_obj)
-            execute_db('UPDATE customers SET last_login = ? WHERE id = ?', [datetime.now(), customer['id']])
+            sign_in(user_obj)
+            carts.merge_on_login(customer['id'])
+            execute_db('UPDATE customers SET last_login = ?, password_hash = COALESCE(?, password_hash) WHERE id = ?',
+                       [datetime.now(), new_hash, customer['id']])
             
             next_page = request.args.get('next')
             if next_page:
@@ -480,7 +463,7 @@ def customer_login():
     
     return render_template('customer/login.html')
 
-@app.route('/register', methods=['GET', 'POST'])
+@site.route('/register', methods=['GET', 'POST'])
 def customer_register():
     if request.method == 'POST':
         data = {
@@ -499,8 +482,8 @@ def customer_register():
             return render_template('customer/register.html', data=data)
         
         # Create customer
+        password_hash = hash_password(data['password'])
         try:
-            password_hash = generate_password_hash(data['password'])
             customer_id = execute_db('''
                 INSERT INTO customers (name, email, password_hash, cpf, phone, newsletter)
                 VALUES (?, ?, ?, ?, ?, ?)
@@ -508,7 +491,8 @@ def customer_register():
             
             # Auto login
             user_obj = User(f"customer_{customer_id}", data['email'], data['email'], 'customer', data['name'])
-            login_user(user_obj)
+            sign_in(user_obj)
+            carts.merge_on_login(customer_id)
             
             flash('Conta criada com sucesso! Bem-vindo ao PixelCraft PC!', 'success')
             return redirect(url_for('customer_dashboard'))
@@ -518,15 +502,16 @@ def customer_register():
     
     return render_template('customer/register.html')
 
-@app.route('/logout')
+@site.route('/logout')
 @login_required
 def logout():
     logout_user()
+    carts.forget_cart()
     flash('Você saiu da sua conta', 'info')
     return redirect(url_for('index'))
 
 # Customer Area
-@app.route('/minha-conta')
+@site.route('/minha-conta')
 @customer_required
 def customer_dashboard():
     customer_id = current_user.id.replace('customer_', '')
@@ -542,30 +527,26 @@ def customer_dashboard():
         LIMIT 5
     ''', [customer_id])
     
-    # Get stats
-    stats = {
-        'total_orders': query_db('SELECT COUNT(*) as count FROM orders WHERE customer_id = ?', 
-                                [customer_id], one=True)['count'],
-        'total_spent': query_db('SELECT SUM(total) as total FROM orders WHERE customer_id = ? AND payment_status = "completed"', 
-                               [customer_id], one=True)['total'] or 0
-    }
+    # Get stats (kept up to date by triggers)
+    stats = dashboard.customer_stats(customer_id)
     
     return render_template('customer/dashboard.html', customer=customer, orders=orders, stats=stats)
 
-@app.route('/minha-conta/pedidos')
+@site.route('/minha-conta/pedidos')
 @customer_required
 def customer_orders():
     customer_id = current_user.id.replace('customer_', '')
     
-    orders = query_db('''
-        SELECT * FROM orders 
-        WHERE customer_id = ? 
-        ORDER BY created_at DESC
-    ''', [customer_id])
+    orders = paginate_query('''
+        SELECT * FROM orders
+        WHERE customer_id = ?
+        -- keyset: created_at, id
+    ''', [customer_id], per_page=current_app.config['ORDERS_PAGE_SIZE'],
+        after=request.args.get('after'), before=request.args.get('before'))
     
-    return render_template('customer/orders.html', orders=orders)
+    return render_template('customer/orders.html', orders=orders, page=orders)
 
-@app.route('/minha-conta/pedido/<order_number>')
+@site.route('/minha-conta/pedido/<order_number>')
 @customer_required
 def customer_order_detail(order_number):
     customer_id = current_user.id.replace('customer_', '')
@@ -579,15 +560,11 @@ def customer_order_detail(order_number):
         flash('Pedido não encontrado', 'error')
         return redirect(url_for('customer_orders'))
     
-    # Parse items JSON
-    try:
-        items = json.loads(order['items'])
-    except:
-        items = []
+    items = order_items.items_for_order(get_db(), order)
     
     return render_template('customer/order_detail.html', order=order, items=items)
 
-@app.route('/minha-conta/perfil', methods=['GET', 'POST'])
+@site.route('/minha-conta/perfil', methods=['GET', 'POST'])
 @customer_required
 def customer_profile():
     customer_id = current_user.id.replace('customer_', '')
@@ -608,11 +585,11 @@ def customer_profile():
             current_password = request.form.get('current_password')
             customer = query_db('SELECT password_hash FROM customers WHERE id = ?', [customer_id], one=True)
             
-            if not check_password_hash(customer['password_hash'], current_password):
+            if not verify_password(customer['password_hash'], current_password)[0]:
                 flash('Senha atual incorreta', 'error')
                 return redirect(url_for('customer_profile'))
             
-            data['password_hash'] = generate_password_hash(new_password)
+            data['password_hash'] = hash_password(new_password)
         
         # Update customer
         try:
@@ -630,6 +607,7 @@ def customer_profile():
                     WHERE id=?
                 ''', [data['name'], data['email'], data['cpf'], data['phone'], data['birth_date'], 
                      data['newsletter'], customer_id])
+            invalidate_principal(current_user.id)
             
             flash('Perfil atualizado com sucesso!', 'success')
             
@@ -639,7 +617,7 @@ def customer_profile():
     customer = query_db('SELECT * FROM customers WHERE id = ?', [customer_id], one=True)
     return render_template('customer/profile.html', customer=customer)
 
-@app.route('/minha-conta/enderecos', methods=['GET', 'POST'])
+@site.route('/minha-conta/enderecos', methods=['GET', 'POST'])
 @customer_required
 def customer_addresses():
     customer_id = current_user.id.replace('customer_', '')
@@ -673,7 +651,7 @@ def customer_addresses():
     customer = query_db('SELECT * FROM customers WHERE id = ?', [customer_id], one=True)
     return render_template('customer/addresses.html', customer=customer)
 
-@app.route('/minha-conta/pagamentos')
+@site.route('/minha-conta/pagamentos')
 @customer_required
 def customer_payments():
     customer_id = current_user.id.replace('customer_', '')
@@ -687,43 +665,84 @@ def customer_payments():
     return render_template('customer/payments.html', payment_methods=payment_methods)
 
 # Cart & Checkout
-@app.route('/cart')
+@site.route('/cart')
 def cart():
-    cart_items = session.get('cart', [])
+    cart_items = carts.cart_items()
     total = sum(item['price'] * item['quantity'] for item in cart_items)
     return render_template('cart.html', cart_items=cart_items, total=total)
 
-@app.route('/add-to-cart', methods=['POST'])
+MAX_CART_BATCH = 20
+MAX_CART_QUANTITY = 10
+
+def current_customer_id():
+    if current_user.is_authenticated and current_user.is_customer:
+        return int(current_user.id.replace('customer_', ''))
+    return None
+
+def cart_offer(pc_id):
+    # Returns (pc, None) or (None, (message, status)) from the in-memory offer index
+    snapshot = get_catalog()
+    try:
+        offer = snapshot.offers.get(int(pc_id))
+    except (TypeError, ValueError):
+        offer = None
+    if offer is None:
+        return None, ('Produto não encontrado', 404)
+    if not offer.in_stock:
+        return None, ('Produto sem estoque', 409)
+    return snapshot.by_id[int(pc_id)], None
+
+@site.route('/add-to-cart', methods=['POST'])
 def add_to_cart():
-    data = request.get_json()
-    pc_id = data.get('pc_id')
+    data = request.get_json(silent=True) or {}
     
-    pc = query_db('SELECT * FROM pcs WHERE id = ? AND active = 1', [pc_id], one=True)
-    if not pc:
-        return jsonify({'error': 'Produto não encontrado'}), 404
-    
-    cart = session.get('cart', [])
-    
-    for item in cart:
-        if item['id'] == pc_id:
-            item['quantity'] += 1
-            session['cart'] = cart
-            return jsonify({'success': True, 'cart_count': len(cart)})
-    
-    cart.append({
-        'id': pc['id'],
-        'name': pc['name'],
-        'price': float(pc['price']),
-        'image': pc['main_image'],
-        'quantity': 1
-    })
+    # Price and availability come from the catalog snapshot, not the database
+    pc, error = cart_offer(data.get('pc_id'))
+    if error:
+        return jsonify({'error': error[0]}), error[1]
     
-    session['cart'] = cart
-    return jsonify({'success': True, 'cart_count': len(cart)})
+    cart_count = carts.add_item(pc, customer_id=current_customer_id())
+    return jsonify({'success': True, 'cart_count': cart_count})
 
-@app.route('/checkout')
+@site.route('/api/cart/items', methods=['POST'])
+def add_to_cart_batch():
+    # {"items": [{"pc_id": 1, "quantity": 2}, ...]} -> one transaction
+    items = (request.get_json(silent=True) or {}).get('items')
+    if not isinstance(items, list) or not items or len(items) > MAX_CART_BATCH:
+        return jsonify({'error': f'Envie de 1 a {MAX_CART_BATCH} itens'}), 400
+    
+    lines, rejected, statuses = [], [], set()
+    for item in items:
+        item = item if isinstance(item, dict) else {}
+        pc, error = cart_offer(item.get('pc_id'))
+        try:
+            quantity = int(item.get('quantity', 1))
+        except (TypeError, ValueError):
+            quantity = 0
+        if error or not 1 <= quantity <= MAX_CART_QUANTITY:
+            rejected.append({'pc_id': item.get('pc_id'), 'error': error[0] if error else 'Quantidade inválida'})
+            statuses.add(error[1] if error else 400)
+        else:
+            lines.append((pc, quantity))
+    
+    if not lines:
+        # 404 only when nothing matched a product; stock or quantity problems are the request's
+        return jsonify({'success': False, 'rejected': rejected}), 404 if statuses == {404} else 400
+    cart_count = carts.add_items(lines, customer_id=current_customer_id())
+    return jsonify({'success': True, 'cart_count': cart_count, 'added': len(lines), 'rejected': rejected})
+
+@site.route('/api/cart-count')
+def api_cart_count():
+    # Per-worker cache keyed by the cart revision in the session; no query in the common case
+    response = jsonify({'count': carts.cart_count()})
+    response.headers['Cache-Control'] = 'private, no-store'
+    return response
+
+@site.route('/checkout')
 def checkout():
-    cart = session.get('cart', [])
+    cart, notices = carts.checkout_lines()
+    for notice in notices:
+        flash(notice, 'warning')
     if not cart:
         flash('Seu carrinho está vazio', 'warning')
         return redirect(url_for('catalog'))
@@ -736,87 +755,70 @@ def checkout():
         customer_id = current_user.id.replace('customer_', '')
         customer = query_db('SELECT * FROM customers WHERE id = ?', [customer_id], one=True)
     
-    return render_template('checkout.html', cart=cart, total=total, customer=customer)
+    # A fresh key per checkout view; resubmitting the same form replays the first order
+    return render_template('checkout.html', cart=cart, total=total, customer=customer,
+                           setup_fee=orders.setup_fee(cart), idempotency_key=uuid.uuid4().hex)
 
-@app.route('/process-order', methods=['POST'])
+@site.route('/process-order', methods=['POST'])
 def process_order():
-    cart = session.get('cart', [])
-    if not cart:
-        flash('Carrinho vazio', 'error')
-        return redirect(url_for('catalog'))
-    
-    # Generate order number
-    order_number = 'PC' + datetime.now().strftime('%Y%m%d') + ''.join(random.choices(string.digits, k=6))
+    key = request.form.get('idempotency_key') or None
     
-    # Get customer data
-    customer_id = None
-    if current_user.is_authenticated and current_user.is_customer:
-        customer_id = int(current_user.id.replace('customer_', ''))
+    # Prices are revalidated here; if anything changed the customer reviews the checkout again
+    cart, notices = carts.checkout_lines()
+    if notices:
+        for notice in notices:
+            flash(notice, 'warning')
+        return redirect(url_for('checkout'))
     
-    # Calculate totals
-    subtotal = sum(item['price'] * item['quantity'] for item in cart)
     setup_service = 1 if request.form.get('setup_service') else 0
-    setup_fee = 150 if setup_service else 0
-    total = subtotal + setup_fee
-    
-    # Apply discount for PIX payment
     payment_method = request.form.get('payment', 'pix')
-    if payment_method == 'pix':
-        total = total * 0.95  # 5% discount
     
-    # Create order
+    # One atomic write: revalidate, reserve stock, insert order and items, drop the cart
     try:
-        order_id = execute_db('''
-            INSERT INTO orders (
-                order_number, customer_id, customer_name, customer_email, customer_phone, customer_cpf,
-                delivery_street, delivery_number, delivery_complement, delivery_neighborhood,
-                delivery_city, delivery_state, delivery_cep, items, subtotal, shipping,
-                total, payment_method, setup_service
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', [
-            order_number, customer_id, request.form.get('name'), request.form.get('email'),
-            request.form.get('phone'), request.form.get('cpf'), request.form.get('street'),
-            request.form.get('number'), request.form.get('complement'), request.form.get('neighborhood'),
-            request.form.get('city'), request.form.get('state'), request.form.get('cep'),
-            json.dumps(cart), subtotal, 0, total, payment_method, setup_service
-        ])
-        
-        # Clear cart
-        session['cart'] = []
-        
-        flash(f'Pedido {order_number} criado com sucesso!', 'success')
-        
-        if current_user.is_authenticated:
-            return redirect(url_for('customer_order_detail', order_number=order_number))
-        else:
-            return render_template('order_success.html', order_number=order_number, total=total, payment_method=payment_method)
-        
-    except Exception as e:
+        order, replayed = orders.place_order(
+            carts.current_cart_id(), request.form, customer_id=current_customer_id(),
+            setup_service=setup_service, payment_method=payment_method, key=key)
+    except orders.EmptyCart:
+        flash('Carrinho vazio', 'error')
+        return redirect(url_for('catalog'))
+    except orders.CartChanged as e:
+        for notice in e.notices:
+            flash(notice, 'warning')
+        return redirect(url_for('checkout'))
+    except sqlite3.Error as e:
         flash(f'Erro ao processar pedido: {str(e)}', 'error')
         return redirect(url_for('checkout'))
+    
+    carts.forget_cart()
+    order_number = order['order_number']
+    if not replayed:
+        flash(f'Pedido {order_number} criado com sucesso!', 'success')
+    
+    if current_user.is_authenticated:
+        return redirect(url_for('customer_order_detail', order_number=order_number))
+    else:
+        return render_template('order_success.html', order_number=order_number, total=order['total'],
+                               payment_method=order['payment_method'])
 
 # Admin Routes
-@app.route('/admin')
+@site.route('/admin')
 @admin_required
 def admin_dashboard():
-    stats = {
-        'total_pcs': query_db('SELECT COUNT(*) as count FROM pcs WHERE active = 1', one=True)['count'],
-        'total_orders': query_db('SELECT COUNT(*) as count FROM orders', one=True)['count'],
-        'total_customers': query_db('SELECT COUNT(*) as count FROM customers', one=True)['count'],
-        'total_revenue': query_db('SELECT SUM(total) as total FROM orders WHERE payment_status = "completed"', one=True)['total'] or 0
-    }
+    stats = dashboard.dashboard_stats()
     
     recent_orders = query_db('''
         SELECT o.*, c.name as customer_name
         FROM orders o
         LEFT JOIN customers c ON o.customer_id = c.id
         ORDER BY o.created_at DESC
-        LIMIT 10
+        LIMIT 10 -- scan-ok: lê só os 10 primeiros de idx_orders_created
     ''')
+    top_products = dashboard.top_products()
     
-    return render_template('admin/dashboard.html', stats=stats, recent_orders=recent_orders)
+    return render_template('admin/dashboard.html', stats=stats, recent_orders=recent_orders,
+                           top_products=top_products)
 
-@app.route('/admin/login', methods=['GET', 'POST'])
+@site.route('/admin/login', methods=['GET', 'POST'])
 def admin_login():
     if request.method == 'POST':
         username = request.form.get('username')
@@ -824,49 +826,64 @@ def admin_login():
         
         user = query_db('SELECT * FROM users WHERE username = ? AND active = 1', [username], one=True)
         
-        if user and check_password_hash(user['password_hash'], password):
+        ok, new_hash = verify_password(user['password_hash'], password) if user else (False, None)
+        if ok:
             user_obj = User(f"admin_{user['id']}", user['username'], user['email'], 'admin')
-            login_user(user_obj)
-            execute_db('UPDATE users SET last_login = ? WHERE id = ?', [datetime.now(), user['id']])
+            sign_in(user_obj)
+            execute_db('UPDATE users SET last_login = ?, password_hash = COALESCE(?, password_hash) WHERE id = ?',
+                       [datetime.now(), new_hash, user['id']])
             return redirect(url_for('admin_dashboard'))
         
         flash('Usuário ou senha inválidos', 'error')
     
     return render_template('admin/login.html')
 
-@app.route('/admin/logout')
+@site.route('/admin/logout')
 @admin_required
 def admin_logout():
     logout_user()
     return redirect(url_for('index'))
 
 # Admin - Customers Management
-@app.route('/admin/customers')
+@site.route('/admin/customers')
 @admin_required
 def admin_customers():
     search = request.args.get('search', '')
-    
-    if search:
-        customers = query_db('''
-            SELECT c.*, COUNT(DISTINCT o.id) as total_orders, SUM(o.total) as total_spent
-            FROM customers c
-            LEFT JOIN orders o ON c.id = o.customer_id
-            WHERE c.name LIKE ? OR c.email LIKE ? OR c.cpf LIKE ?
-            GROUP BY c.id
-            ORDER BY c.created_at DESC
-        ''', [f'%{search}%', f'%{search}%', f'%{search}%'])
+    sort = request.args.get('sort', 'newest')
+    cursor = {'after': request.args.get('after'), 'before': request.args.get('before')}
+    per_page = current_app.config['ADMIN_PAGE_SIZE']
+    
+    # Totals come from the customer_stats rollup; each sort walks its own index
+    if sort == 'spent':
+        customers = paginate_query('''
+            SELECT c.*, cs.customer_id, cs.total_orders, cs.total_spent, cs.paid_orders, cs.last_order_at
+            FROM customer_stats cs
+            JOIN customers c ON c.id = cs.customer_id
+            WHERE (? = '' OR c.name LIKE ? OR c.email LIKE ? OR c.cpf LIKE ?)
+            -- keyset: cs.total_spent, cs.customer_id
+        ''', [search] + [f'%{search}%'] * 3, per_page=per_page, **cursor)
+    elif sort == 'last_order':
+        customers = paginate_query('''
+            SELECT c.*, cs.customer_id, cs.total_orders, cs.total_spent, cs.paid_orders, cs.last_order_at
+            FROM customer_stats cs
+            JOIN customers c ON c.id = cs.customer_id
+            WHERE (? = '' OR c.name LIKE ? OR c.email LIKE ? OR c.cpf LIKE ?)
+            -- keyset: cs.last_order_at, cs.customer_id
+        ''', [search] + [f'%{search}%'] * 3, per_page=per_page, **cursor)
     else:
-        customers = query_db('''
-            SELECT c.*, COUNT(DISTINCT o.id) as total_orders, SUM(o.total) as total_spent
+        sort = 'newest'
+        customers = paginate_query('''
+            SELECT c.*, cs.customer_id, cs.total_orders, cs.total_spent, cs.paid_orders, cs.last_order_at
             FROM customers c
-            LEFT JOIN orders o ON c.id = o.customer_id
-            GROUP BY c.id
-            ORDER BY c.created_at DESC
-        ''')
+            LEFT JOIN customer_stats cs ON cs.customer_id = c.id
+            WHERE (? = '' OR c.name LIKE ? OR c.email LIKE ? OR c.cpf LIKE ?)
+            -- keyset: c.created_at, c.id
+        ''', [search] + [f'%{search}%'] * 3, per_page=per_page, **cursor)
     
-    return render_template('admin/customers.html', customers=customers, search=search)
+    return render_template('admin/customers.html', customers=customers, page=customers,
+                           search=search, sort=sort)
 
-@app.route('/admin/customer/<int:customer_id>')
+@site.route('/admin/customer/<int:customer_id>')
 @admin_required
 def admin_customer_detail(customer_id):
     customer = query_db('SELECT * FROM customers WHERE id = ?', [customer_id], one=True)
@@ -875,40 +892,45 @@ def admin_customer_detail(customer_id):
         return redirect(url_for('admin_customers'))
     
     orders = query_db('SELECT * FROM orders WHERE customer_id = ? ORDER BY created_at DESC', [customer_id])
-    
-    stats = {
-        'total_orders': len(orders),
-        'total_spent': sum(order['total'] for order in orders if order['payment_status'] == 'completed'),
-        'avg_order': sum(order['total'] for order in orders) / len(orders) if orders else 0
-    }
+    stats = dashboard.customer_stats(customer_id)
     
     return render_template('admin/customer_detail.html', customer=customer, orders=orders, stats=stats)
 
+@site.route('/admin/customer/<int:customer_id>/toggle-active', methods=['POST'])
+@admin_required
+def admin_toggle_customer(customer_id):
+    execute_db('UPDATE customers SET active = 1 - active, updated_at = CURRENT_TIMESTAMP WHERE id = ?', [customer_id])
+    # A deactivated customer is logged out on their next request here, within a second in other workers
+    invalidate_principal(f'customer_{customer_id}')
+    flash('Status do cliente atualizado!', 'success')
+    return redirect(url_for('admin_customer_detail', customer_id=customer_id))
+
 # Admin - Orders Management
-@app.route('/admin/orders')
+@site.route('/admin/orders')
 @admin_required
 def admin_orders():
     status_filter = request.args.get('status', '')
+    cursor = {'after': request.args.get('after'), 'before': request.args.get('before')}
     
     if status_filter:
-        orders = query_db('''
+        orders = paginate_query('''
             SELECT o.*, c.name as customer_name
             FROM orders o
             LEFT JOIN customers c ON o.customer_id = c.id
             WHERE o.order_status = ?
-            ORDER BY o.created_at DESC
-        ''', [status_filter])
+            -- keyset: o.created_at, o.id
+        ''', [status_filter], per_page=current_app.config['ADMIN_PAGE_SIZE'], **cursor)
     else:
-        orders = query_db('''
+        orders = paginate_query('''
             SELECT o.*, c.name as customer_name
             FROM orders o
             LEFT JOIN customers c ON o.customer_id = c.id
-            ORDER BY o.created_at DESC
-        ''')
+            -- keyset: o.created_at, o.id
+        ''', per_page=current_app.config['ADMIN_PAGE_SIZE'], **cursor)
     
-    return render_template('admin/orders.html', orders=orders, status_filter=status_filter)
+    return render_template('admin/orders.html', orders=orders, page=orders, status_filter=status_filter)
 
-@app.route('/admin/order/<order_number>')
+@site.route('/admin/order/<order_number>')
 @admin_required
 def admin_order_detail(order_number):
     order = query_db('''
@@ -922,14 +944,11 @@ def admin_order_detail(order_number):
         flash('Pedido não encontrado', 'error')
         return redirect(url_for('admin_orders'))
     
-    try:
-        items = json.loads(order['items'])
-    except:
-        items = []
+    items = order_items.items_for_order(get_db(), order)
     
     return render_template('admin/order_detail.html', order=order, items=items)
 
-@app.route('/admin/order/<order_number>/update-status', methods=['POST'])
+@site.route('/admin/order/<order_number>/update-status', methods=['POST'])
 @admin_required
 def admin_update_order_status(order_number):
     new_status = request.form.get('status')
@@ -950,13 +969,13 @@ def admin_update_order_status(order_number):
     return redirect(url_for('admin_order_detail', order_number=order_number))
 
 # Admin - Games Management
-@app.route('/admin/games')
+@site.route('/admin/games')
 @admin_required
 def admin_games():
-    games = query_db('SELECT * FROM games ORDER BY name')
+    games = query_db('SELECT * FROM games ORDER BY name -- scan-ok: lista completa do admin, poucas dezenas de jogos')
     return render_template('admin/games.html', games=games)
 
-@app.route('/admin/game/new', methods=['GET', 'POST'])
+@site.route('/admin/game/new', methods=['GET', 'POST'])
 @admin_required
 def admin_game_new():
     if request.method == 'POST':
@@ -979,6 +998,7 @@ def admin_game_new():
             ''', [data['name'], slug, data['genre'], data['publisher'], data['release_year'],
                  data['min_requirements'], data['rec_requirements']])
             
+            invalidate_catalog()
             flash('Jogo adicionado com sucesso!', 'success')
             return redirect(url_for('admin_games'))
         except Exception as e:
@@ -986,23 +1006,156 @@ def admin_game_new():
     
     return render_template('admin/game_form.html')
 
+@site.route('/admin/fragment-cache/flush', methods=['POST'])
+@admin_required
+def admin_flush_fragments():
+    flushed = flush_fragments()
+    flash(f'Cache de fragmentos limpo ({flushed} entradas).', 'success')
+    return redirect(url_for('admin_dashboard'))
+
+# Admin - Image uploads
+@site.route('/admin/upload-image', methods=['POST'])
+@admin_required
+def admin_upload_image():
+    file = request.files.get('file')
+    if not file or not file.filename:
+        return jsonify({'success': False, 'error': 'Nenhum arquivo enviado'}), 400
+    if not allowed_file(file.filename):
+        return jsonify({'success': False, 'error': 'Formato não permitido'}), 400
+    
+    ext = file.filename.rsplit('.', 1)[1].lower()
+    filename = secure_filename(f"{uuid.uuid4().hex}.{ext}")
+    upload_dir = os.path.join(current_app.root_path, current_app.config['UPLOAD_FOLDER'])
+    os.makedirs(upload_dir, exist_ok=True)
+    file.save(os.path.join(upload_dir, filename))
+    
+    # Variants are generated in the background; the original is served until they exist
+    url = f"/static/img/uploads/{filename}"
+    image_id = image_pipeline().enqueue(url)
+    return jsonify({'success': True, 'url': url, 'filename': filename, 'image_id': image_id})
+
+@site.route('/admin/delete-image', methods=['POST'])
+@admin_required
+def admin_delete_image():
+    filename = secure_filename((request.get_json(silent=True) or {}).get('filename', ''))
+    if not filename:
+        return jsonify({'success': False, 'error': 'Arquivo inválido'}), 400
+    
+    image_pipeline().delete(f"/static/img/uploads/{filename}")
+    path = os.path.join(current_app.root_path, current_app.config['UPLOAD_FOLDER'], filename)
+    if os.path.isfile(path):
+        os.remove(path)
+    return jsonify({'success': True})
+
+# Admin - Metrics (contadores deste worker; 'routes' soma todos os workers)
+@site.route('/admin/metrics')
+@admin_required
+def admin_metrics():
+    metrics = request_metrics.request_metrics()
+    routes = metrics.summary() if metrics is not None else []
+    if request.accept_mimetypes.best_match(['application/json', 'text/html']) == 'text/html':
+        return render_template('admin/metrics.html', routes=routes)
+    return jsonify({
+        'pid': os.getpid(),
+        'routes': routes,
+        'http_cache': current_app.extensions['http_cache'].stats(),
+        'fragment_cache': current_app.extensions['fragment_cache'].stats(),
+        'cart_counts': current_app.extensions['cart_counts'].stats(),
+        'write_queue': current_app.extensions['write_queue'].stats() if 'write_queue' in current_app.extensions else None,
+        'passwords': passwords.password_hasher().stats(),
+        'principals': principals.principal_cache().stats(),
+        'images': image_pipeline().stats(),
+        'catalog': get_catalog().info(),
+        'view_counter': current_app.extensions['view_counter'].stats(),
+        'db_pool': database.get_pool().stats(),
+    })
+
+@site.route('/metrics')
+def prometheus_metrics():
+    # Scrapers send the token; an admin can look from the browser
+    metrics = request_metrics.request_metrics()
+    token = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    allowed = (metrics is not None and metrics.token and secrets.compare_digest(token.encode(), metrics.token.encode())) or \
+        (current_user.is_authenticated and current_user.is_admin)
+    if metrics is None or not allowed:
+        abort(404)
+    return current_app.response_class(metrics.prometheus(), mimetype='text/plain; version=0.0.4')
+
 # API Routes
-@app.route('/api/search')
+# Busca: termos sem acento/stopwords viram prefixos FTS5 ("placa de video rtx" -> {gpu} : ("rtx"*))
+SEARCH_STOPWORDS = {'a', 'o', 'as', 'os', 'de', 'da', 'do', 'das', 'dos', 'e', 'em', 'para', 'com', 'um', 'uma'}
+SEARCH_COLUMN_HINTS = {
+    'memoria': 'ram', 'ram': 'ram',
+    'placa': 'gpu', 'video': 'gpu', 'gpu': 'gpu',
+    'processador': 'processor', 'cpu': 'processor',
+    'artista': 'graffiti_artist', 'grafiteiro': 'graffiti_artist',
+    'estilo': 'graffiti_style',
+}
+
+def strip_accents(text):
+    return ''.join(ch for ch in unicodedata.normalize('NFKD', text) if not unicodedata.combining(ch))
+
+def search_tokens(text):
+    return [t for t in re.findall(r'\w+', strip_accents(text.lower())) if t not in SEARCH_STOPWORDS]
+
+def build_fts_query(text):
+    tokens = search_tokens(text)
+    terms = [t for t in tokens if t not in SEARCH_COLUMN_HINTS]
+    columns = sorted({SEARCH_COLUMN_HINTS[t] for t in tokens if t in SEARCH_COLUMN_HINTS})
+    expr = ' '.join(f'"{t}"*' for t in terms)
+    if columns and expr:
+        return '{' + ' '.join(columns) + '} : (' + expr + ')'
+    return expr
+
+def search_hint_columns(text):
+    # Only spec labels typed ("memoria", "placa de video"): the PCs that list those specs
+    tokens = search_tokens(text)
+    if not tokens or any(t not in SEARCH_COLUMN_HINTS for t in tokens):
+        return []
+    return sorted({SEARCH_COLUMN_HINTS[t] for t in tokens})
+
+@site.route('/api/search')
 def api_search():
     query = request.args.get('q', '')
-    if len(query) < 2:
-        return jsonify([])
-    
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 10, type=int), 1), 50)
+    
+    match = build_fts_query(query) if len(query) >= 2 else ''
+    columns = search_hint_columns(query) if len(query) >= 2 else []
+    if columns:
+        # Nothing to match as text: every active PC with the columns filled, most viewed first
+        pcs = [pc for pc in get_catalog().browse(sort='popular')[0] if all(pc[column] for column in columns)]
+        results = [{key: pc[key] for key in ('id', 'name', 'slug', 'price', 'main_image')}
+                   for pc in pcs[(page - 1) * per_page:page * per_page]]
+        return jsonify({'results': results, 'total': len(pcs), 'page': page, 'per_page': per_page})
+    if not match:
+        return jsonify({'results': [], 'total': 0, 'page': page, 'per_page': per_page})
+    
+    total = query_db('''
+        SELECT COUNT(*) as count
+        FROM pcs_fts
+        JOIN pcs p ON p.id = pcs_fts.rowid
+        WHERE pcs_fts MATCH ? AND p.active = 1
+    ''', [match], one=True)['count']
+    
+    # bm25 weights: name, subtitle, description, processor, gpu, ram, graffiti_artist, graffiti_style
     results = query_db('''
-        SELECT id, name, slug, price, main_image
-        FROM pcs
-        WHERE active = 1 AND (name LIKE ? OR description LIKE ?)
-        LIMIT 10
-    ''', [f'%{query}%', f'%{query}%'])
-    
-    return jsonify([dict(row) for row in results])
+        SELECT p.id, p.name, p.slug, p.price, p.main_image
+        FROM pcs_fts
+        JOIN pcs p ON p.id = pcs_fts.rowid
+        WHERE pcs_fts MATCH ? AND p.active = 1
+        ORDER BY bm25(pcs_fts, 10.0, 4.0, 1.0, 3.0, 3.0, 2.0, 2.0, 2.0)
+        LIMIT ? OFFSET ?
+    ''', [match, per_page, (page - 1) * per_page])
+    
+    return jsonify({
+        'results': [dict(row) for row in results],
+        'total': total,
+        'page': page,
+        'per_page': per_page
+    })
 
-@app.route('/api/newsletter', methods=['POST'])
+@site.route('/api/newsletter', methods=['POST'])
 def api_newsletter():
     email = request.get_json().get('email')
     
@@ -1016,13 +1169,13 @@ def api_newsletter():
         return jsonify({'success': False, 'message': 'Erro ao cadastrar e-mail'}), 500
 
 # Template filters
-@app.template_filter('currency')
+@site.template_filter('currency')
 def currency_filter(value):
     if value is None:
         return "0,00"
     return f"{value:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
 
-@app.template_filter('json_loads')
+@site.template_filter('json_loads')
 def json_loads_filter(value):
     if value:
         try:
@@ -1031,7 +1184,7 @@ def json_loads_filter(value):
             return []
     return []
 
-@app.template_filter('date_format')
+@site.template_filter('date_format')
 def date_format(value):
     if value:
         try:
@@ -1041,12 +1194,125 @@ def date_format(value):
             return value
     return ''
 
+# CLI commands
+@site.command('init-db')
+def init_db_command():
+    os.makedirs('instance', exist_ok=True)
+    init_db()
+    print('Banco de dados inicializado.')
+
+@site.command('migrate')
+def migrate_command():
+    applied = database.migrate(get_db())
+    for version, name in applied:
+        print(f'Aplicada migração {version:04d}_{name}')
+    if not applied:
+        print('Nenhuma migração pendente.')
+
+@site.command('reconcile-stats')
+@click.option('--dry-run', is_flag=True, help='Só informa a diferença, sem corrigir.')
+def reconcile_stats_command(dry_run):
+    drift = dashboard.reconcile(get_db(), fix=not dry_run)
+    for name, stored, actual in drift:
+        print(f'{name}: armazenado={stored} recalculado={actual}')
+    if not drift:
+        print('Estatísticas consistentes.')
+    elif dry_run:
+        raise SystemExit(1)
+    else:
+        print(f'{len(drift)} valor(es) corrigido(s).')
+
+@site.command('build-assets')
+@click.option('--clean', is_flag=True, help='Remove de static/dist os builds anteriores ao último (este e o anterior ficam).')
+def build_assets_command(clean):
+    report = assets.build(current_app.static_folder, clean=clean)
+    for filename, original, minified, gz, br in report:
+        br = f'{br:>8}' if br is not None else '       -'
+        print(f'{filename:<45} {original:>8} -> {minified:>8}  gz {gz:>8}  br {br}')
+    if assets.brotli is None:
+        print('Pacote brotli não instalado: arquivos .br não gerados.')
+    current_app.extensions['assets'].reload()
+    print(f'{len(report)} arquivo(s) em static/{assets.DIST_DIR}/')
+
+@site.command('process-images')
+@click.option('--scan', is_flag=True, help='Enfileira também as imagens já usadas pelos PCs.')
+def process_images_command(scan):
+    pipeline = image_pipeline()
+    if scan:
+        sources = query_db('''
+            SELECT main_image AS url FROM pcs
+            UNION SELECT url FROM pc_images -- scan-ok: comando de CLI, enfileira todas as imagens
+        ''')
+        queued = sum(1 for row in sources if pipeline.enqueue(row['url']) is not None)
+        print(f'{queued} imagem(ns) enfileirada(s).')
+    
+    def report(stats):
+        print(f"{stats['processed']} processada(s), {stats['failed']} com erro, "
+              f"{stats['images_per_second']:.2f} imagens/s")
+    
+    stats = pipeline.process_pending(report=report)
+    print(f"Concluído: {stats['processed']} imagem(ns) em {stats['busy_seconds']:.1f} s "
+          f"({stats['images_per_second']:.2f} imagens/s com {stats['workers']} processo(s)).")
+
+@site.command('backfill-order-items')
+@click.option('--chunk-size', default=1000, show_default=True, help='Pedidos por transação.')
+def backfill_order_items_command(chunk_size):
+    def report(done, total, items, elapsed):
+        rate = done / elapsed if elapsed else 0
+        print(f'{done}/{total} pedidos, {items} itens ({rate:.0f} pedidos/s)')
+    
+    done, items, elapsed = order_items.backfill(get_db(), chunk_size=chunk_size, report=report)
+    print(f'Concluído: {done} pedido(s), {items} item(ns) em {elapsed:.1f} s.')
+
+@site.command('prune-carts')
+@click.option('--days', default=30, show_default=True, help='Idade mínima dos carrinhos anônimos removidos.')
+def prune_carts_command(days):
+    removed = carts.prune(get_db(), days=days)
+    print(f'{removed} carrinho(s) anônimo(s) removido(s).')
+
+# Modules whose SQL literals check-query-plans explains
+QUERY_PLAN_MODULES = ('app.py', 'carts.py', 'catalog.py', 'images.py', 'order_items.py', 'orders.py',
+                      'stats.py', 'view_counter.py')
+
+# Modules whose SQL literals check-query-plans explains
+QUERY_PLAN_MODULES = ('app.py', 'carts.py', 'catalog.py', 'images.py', 'order_items.py', 'orders.py',
+                      'stats.py', 'view_counter.py')
+
+# Modules whose SQL literals check-query-plans explains
+QUERY_PLAN_MODULES = ('app.py', 'carts.py', 'catalog.py', 'images.py', 'order_items.py', 'orders.py',
+                      'stats.py', 'view_counter.py')
+
+@site.command('check-query-plans')
+def check_query_plans_command():
+    import tempfile
+    # Runs EXPLAIN QUERY PLAN for every SQL literal of QUERY_PLAN_MODULES on a freshly seeded database
+    problems = []
+    with tempfile.TemporaryDirectory() as tmp:
+        check_app = create_app({'SECRET_KEY': 'check-query-plans', 'DATABASE': os.path.join(tmp, 'check.db'),
+                                'CATALOG_STAMP_FILE': os.path.join(tmp, 'catalog.version')})
+        with check_app.app_context():
+            init_db()
+            for module in QUERY_PLAN_MODULES:
+                found, accepted = database.find_full_scans(get_db(), os.path.join(check_app.root_path, module))
+                problems += [(module, *problem) for problem in found]
+                for lineno, reason, _ in accepted:
+                    print(f'{module}:{lineno}: scan-ok: {reason}')
+    for module, lineno, detail, sql in problems:
+        print(f'{module}:{lineno}: {detail}\n    {sql}')
+    if problems:
+        raise SystemExit(1)
+    print('Nenhum SCAN completo de tabela encontrado.')
+
 # Error handlers
-@app.errorhandler(404)
+@site.errorhandler(404)
 def not_found(e):
     return render_template('404.html'), 404
 
-@app.errorhandler(500)
+@site.errorhandler(passwords.PasswordHasherBusy)
+def password_hasher_busy(e):
+    return render_template('429.html'), 429, {'Retry-After': '2'}
+
+@site.errorhandler(500)
 def server_error(e):
     return render_template('500.html'), 500
 
@@ -1057,7 +1323,9 @@ if __name__ == '__main__':
     os.makedirs('static/img/uploads', exist_ok=True)
     
     # Initialize database
-    init_db()
+    app = create_app()
+    with app.app_context():
+        init_db()
     
     # Run app
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
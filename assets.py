@@ -0,0 +1,241 @@
+"""
+Build e entrega dos arquivos estáticos
+
+`flask build-assets` minifica CSS/JS/SVG de static/, grava cópias com hash
+do conteúdo no nome em static/dist/ (mais irmãos .gz e .br) e um
+manifest.json. Nos templates, asset_url('static', filename='css/style.css')
+funciona como url_for e devolve a URL com hash quando o arquivo foi
+construído. Cada worker relê o manifest quando o mtime dele muda, então
+um build feito com o servidor no ar passa a valer sem reiniciar.
+
+A rota static serve o arquivo pré-comprimido quando o cliente aceita
+(br > gzip) e, para URLs com hash, Cache-Control de um ano com immutable.
+O .br só é gerado com o pacote opcional `brotli` instalado.
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import time
+from glob import glob
+
+from flask import current_app, request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+ASSET_PATTERNS = ('css/*.css', 'js/*.js', 'img/**/*.svg')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+# Strings are kept verbatim while the code around them is squeezed
+CSS_TOKENS = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|/\*.*?\*/|\s+', re.DOTALL)
+CSS_STRING = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')')
+CSS_PUNCTUATION = re.compile(r'\s*([{};,>])\s*')
+CSS_COLON = re.compile(r':\s+')
+CSS_URL = re.compile(r'url\(\s*([\'"]?)(/static/[^\'")]+)\1\s*\)')
+JS_BLOCK_COMMENT = re.compile(r'^\s*/\*.*?\*/\s*$', re.DOTALL | re.MULTILINE)
+JS_LINE_COMMENT = re.compile(r'^\s*//.*$', re.MULTILINE)
+SVG_COMMENT = re.compile(r'<!--.*?-->', re.DOTALL)
+SVG_BETWEEN_TAGS = re.compile(r'>\s+<')
+
+
+def minify_css(text):
+    def squeeze(match):
+        if match.group(1):
+            return match.group(1)
+        return '' if match.group(0).startswith('/*') else ' '
+
+    parts = CSS_STRING.split(CSS_TOKENS.sub(squeeze, text))
+    for i in range(0, len(parts), 2):
+        # The space before ':' is kept: "a :hover" and "a:hover" are different selectors
+        parts[i] = CSS_COLON.sub(':', CSS_PUNCTUATION.sub(r'\1', parts[i])).replace(';}', '}')
+    return ''.join(parts).strip()
+
+
+def minify_js(text):
+    # Conservative: whole-line comments, indentation and blank lines only
+    text = JS_BLOCK_COMMENT.sub('', text)
+    text = JS_LINE_COMMENT.sub('', text)
+    return '\n'.join(line.strip() for line in text.splitlines() if line.strip()) + '\n'
+
+
+def minify_svg(text):
+    text = SVG_COMMENT.sub('', text)
+    text = SVG_BETWEEN_TAGS.sub('><', text)
+    return text.strip()
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js, '.svg': minify_svg}
+
+
+def _hashed_name(filename, content):
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    root, ext = os.path.splitext(filename)
+    return f'{root}.{digest}{ext}'
+
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+
+def _sources(static_folder):
+    for pattern in ASSET_PATTERNS:
+        for path in sorted(glob(os.path.join(static_folder, pattern), recursive=True)):
+            filename = os.path.relpath(path, static_folder).replace(os.sep, '/')
+            if not filename.startswith(DIST_DIR + '/'):
+                yield filename, path
+
+
+def build(static_folder, clean=False):
+    """Build static/dist; returns a list of (filename, original, minified, gzip, brotli) sizes."""
+    dist = os.path.join(static_folder, DIST_DIR)
+    previous = AssetManifest(static_folder).files
+    manifest, report = {}, []
+    # SVGs first so CSS url(/static/img/...) references can point at hashed copies
+    sources = sorted(_sources(static_folder), key=lambda item: not item[0].endswith('.svg'))
+    for filename, path in sources:
+        with open(path, encoding='utf-8') as f:
+            original = f.read()
+        text = MINIFIERS[os.path.splitext(filename)[1]](original)
+        if filename.endswith('.css'):
+            text = CSS_URL.sub(lambda m: _rewrite_css_url(m, manifest), text)
+        content = text.encode('utf-8')
+        hashed = _hashed_name(filename, content)
+        target = os.path.join(dist, hashed)
+        _write(target, content)
+        gz = gzip.compress(content, compresslevel=9, mtime=0)
+        _write(target + '.gz', gz)
+        br = None
+        if brotli is not None:
+            br = brotli.compress(content, quality=11)
+            _write(target + '.br', br)
+        manifest[filename] = hashed
+        report.append((filename, len(original.encode('utf-8')), len(content), len(gz), len(br) if br else None))
+
+    if clean:
+        # The previous build stays: pages rendered before the workers see the new
+        # manifest (and browser/CDN copies of them) still point at its files
+        keep = {os.path.join(dist, name) + suffix
+                for name in (*manifest.values(), *previous.values()) for suffix in ('', '.gz', '.br')}
+        for root, _, files in os.walk(dist):
+            for name in files:
+                path = os.path.join(root, name)
+                if name != MANIFEST and path not in keep:
+                    os.remove(path)
+
+    _write(os.path.join(dist, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    return report
+
+
+def _rewrite_css_url(match, manifest):
+    filename = match.group(2)[len('/static/'):]
+    if filename in manifest:
+        return f'url(/static/{DIST_DIR}/{manifest[filename]})'
+    return match.group(0)
+
+
+class AssetManifest:
+    def __init__(self, static_folder, check_interval=1.0):
+        self.static_folder = static_folder
+        self.path = os.path.join(static_folder, DIST_DIR, MANIFEST)
+        self.check_interval = check_interval
+        self.files = {}
+        self._digest = ''
+        self._mtime = None
+        self._checked_at = time.monotonic()
+        self.reload()
+
+    def _mtime_ns(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def reload(self):
+        self._mtime = self._mtime_ns()
+        try:
+            with open(self.path, 'rb') as f:
+                content = f.read()
+            self.files = json.loads(content)
+            # Part of the page ETags: new asset URLs mean new HTML
+            self._digest = hashlib.sha256(content).hexdigest()[:12]
+        except (OSError, ValueError):
+            self.files, self._digest = {}, ''
+        return self.files
+
+    def _check_mtime(self):
+        # build-assets run in another process (or by a deploy) rewrites the manifest
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        if self._mtime_ns() != self._mtime:
+            self.reload()
+
+    @property
+    def digest(self):
+        self._check_mtime()
+        return self._digest
+
+    def lookup(self, filename):
+        self._check_mtime()
+        hashed = self.files.get(filename)
+        return f'{DIST_DIR}/{hashed}' if hashed else None
+
+
+def asset_url(endpoint, **values):
+    # Drop-in for url_for('static', filename=...) that prefers the hashed build
+    if endpoint == 'static' and 'filename' in values:
+        hashed = current_app.extensions['assets'].lookup(values['filename'])
+        if hashed:
+            values['filename'] = hashed
+    return url_for(endpoint, **values)
+
+
+def _preferred_encoding(path):
+    for encoding, suffix in ENCODINGS:
+        if request.accept_encodings[encoding] and os.path.isfile(path + suffix):
+            return encoding, suffix
+    return None, ''
+
+
+def serve_static(filename):
+    app = current_app
+    manifest = app.extensions['assets']
+    immutable = filename.startswith(DIST_DIR + '/')
+    built = filename if immutable else manifest.lookup(filename)
+
+    if built is None:
+        return app.send_static_file(filename)
+
+    path = os.path.join(app.static_folder, built)
+    encoding, suffix = _preferred_encoding(path)
+    response = send_from_directory(app.static_folder, built + suffix, mimetype=_mimetype(filename))
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    if immutable:
+        response.headers['Cache-Control'] = IMMUTABLE
+    return response
+
+
+def _mimetype(filename):
+    return mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+
+def init_app(app):
+    app.extensions['assets'] = AssetManifest(app.static_folder)
+    app.add_template_global(asset_url)
+    app.view_functions['static'] = serve_static
@@ -0,0 +1,147 @@
+"""
+Teste de carga: checkouts simultâneos no mesmo PC com estoque limitado
+
+Cada checkout anônimo monta o carrinho, abre /checkout (que gera a chave
+de idempotência) e espera numa barreira; todos enviam /process-order ao
+mesmo tempo, espalhados por vários processos (como workers do servidor).
+Uma parte dos clientes reenvia o mesmo formulário em paralelo, simulando
+o clique duplo em "Finalizar Pedido".
+
+Ao final confere que: nenhum número de pedido se repete, o estoque não
+fica negativo nem vende além do disponível, cada chave gera no máximo um
+pedido e todo reenvio devolve o número do pedido original.
+
+Uso: python benchmarks/checkout_load.py [--checkouts 200] [--processes 4] [--stock 150] [--duplicates 20]
+"""
+
+import argparse
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+import time
+
+from common import make_app
+
+ORDER_NUMBER = re.compile(r'#(PC\d+)')
+KEY_INPUT = re.compile(r'name="idempotency_key" value="(\w+)"')
+
+
+def prepare(app, pc_id):
+    client = app.test_client()
+    client.post('/add-to-cart', json={'pc_id': pc_id})
+    key = KEY_INPUT.search(client.get('/checkout').get_data(as_text=True)).group(1)
+    form = {'name': 'Carga', 'email': 'carga@example.com', 'payment': 'pix', 'idempotency_key': key}
+    return client, form
+
+
+def submit(client, form, results, start_barrier):
+    start_barrier.wait()
+    started = time.perf_counter()
+    response = client.post('/process-order', data=form)
+    elapsed = time.perf_counter() - started
+    match = ORDER_NUMBER.search(response.get_data(as_text=True)) if response.status_code == 200 else None
+    results.append((form['idempotency_key'], response.status_code, match.group(1) if match else None, elapsed))
+
+
+def worker(database, tmpdir, pc_id, checkouts, duplicates, barrier, queue):
+    from app import create_app
+    app = create_app(dict(DATABASE=database, CATALOG_STAMP_FILE=os.path.join(tmpdir, 'catalog.version')))
+
+    jobs = []
+    for i in range(checkouts):
+        client, form = prepare(app, pc_id)
+        jobs.append((client, form))
+        if i < duplicates:
+            # Same session cookie and form in a second client: a double click
+            twin = app.test_client()
+            twin.set_cookie('session', client.get_cookie('session').value)
+            jobs.append((twin, form))
+
+    results = []
+    start_barrier = threading.Barrier(len(jobs) + 1)
+    threads = [threading.Thread(target=submit, args=(client, form, results, start_barrier)) for client, form in jobs]
+    for thread in threads:
+        thread.start()
+    barrier.wait()  # every process is ready
+    start_barrier.wait()
+    for thread in threads:
+        thread.join()
+    queue.put(results)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--checkouts', type=int, default=200)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--stock', type=int, default=150)
+    parser.add_argument('--duplicates', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(tmp)
+        from db import get_db, get_pool
+        with app.app_context():
+            db = get_db()
+            pc_id = db.execute('SELECT id FROM pcs WHERE active = 1 ORDER BY id LIMIT 1').fetchone()[0]
+            db.execute('UPDATE pcs SET stock = ?, in_stock = 1 WHERE id = ?', [args.stock, pc_id])
+            db.commit()
+        get_pool(app).close_all()
+
+        per_process = [args.checkouts // args.processes + (i < args.checkouts % args.processes)
+                       for i in range(args.processes)]
+        dup_per_process = [args.duplicates // args.processes + (i < args.duplicates % args.processes)
+                           for i in range(args.processes)]
+        context = multiprocessing.get_context('fork')
+        barrier = context.Barrier(args.processes + 1)
+        queue = context.Queue()
+        procs = [context.Process(target=worker, args=(app.config['DATABASE'], tmp, pc_id, n, d, barrier, queue))
+                 for n, d in zip(per_process, dup_per_process)]
+        for proc in procs:
+            proc.start()
+        barrier.wait()
+        started = time.perf_counter()
+        results = [row for _ in procs for row in queue.get()]
+        wall = time.perf_counter() - started
+        for proc in procs:
+            proc.join()
+
+        with app.app_context():
+            db = get_db()
+            orders = db.execute('SELECT order_number, idempotency_key FROM orders').fetchall()
+            stock = db.execute('SELECT stock FROM pcs WHERE id = ?', [pc_id]).fetchone()[0]
+            blocks = db.execute("SELECT value FROM sequences WHERE name = 'order_number'").fetchone()[0]
+
+    latencies = sorted(row[3] for row in results)
+    created = {row[0]: row[2] for row in results if row[2]}
+    by_key = {}
+    for key, status, number, _ in results:
+        if number:
+            by_key.setdefault(key, set()).add(number)
+    numbers = [row[0] for row in orders]
+
+    print(f'{len(results)} envios ({args.checkouts} checkouts + {args.duplicates} cliques duplos) '
+          f'em {args.processes} processos, {wall:.2f} s')
+    print(f'latência p50 {latencies[len(latencies) // 2] * 1000:.1f} ms   '
+          f'p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f} ms   max {latencies[-1] * 1000:.1f} ms')
+    print(f'pedidos criados: {len(orders)}   recusados por estoque: {sum(1 for r in results if r[1] == 302)}   '
+          f'estoque final: {stock}   sequência reservada até: {blocks}')
+
+    checks = {
+        'números de pedido únicos': len(numbers) == len(set(numbers)),
+        'estoque nunca negativo': stock >= 0,
+        'vendas = min(demanda, estoque)': len(orders) == min(args.checkouts, args.stock),
+        'estoque final = inicial - vendas': stock == args.stock - len(orders),
+        'no máximo um pedido por chave': len({row[1] for row in orders}) == len(orders),
+        'reenvio devolve o mesmo pedido': all(len(found) == 1 for found in by_key.values()),
+        'toda resposta de sucesso existe no banco': set(created.values()) <= set(numbers),
+    }
+    for label, ok in checks.items():
+        print(f"  [{'ok' if ok else 'FALHOU'}] {label}")
+    if not all(checks.values()):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
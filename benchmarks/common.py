@@ -0,0 +1,84 @@
+"""
+Utilitários compartilhados pelos benchmarks (banco temporário e dados sintéticos)
+"""
+
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PROCESSORS = ['AMD Ryzen 5 5600', 'AMD Ryzen 7 7700X', 'AMD Ryzen 9 7950X', 'Intel i5-13400F',
+              'Intel i7-13700K', 'Intel i9-13900K']
+GPUS = ['RTX 3060 12GB', 'RTX 4060 8GB', 'RTX 4070 Ti 16GB', 'RTX 4080 16GB', 'RTX 4090 24GB',
+        'RX 7800 XT 16GB', 'RX 7900 XTX 24GB']
+RAMS = ['16GB DDR4 3200MHz', '32GB DDR5 5600MHz', '64GB DDR5 6000MHz']
+STORAGES = ['512GB NVMe SSD', '1TB NVMe SSD', '2TB NVMe Gen5', '2TB NVMe + 4TB HDD']
+WORDS = ['Copacabana', 'Leblon', 'Lapa', 'Tijuca', 'Maracanã', 'Ipanema', 'Urca', 'Botafogo',
+         'Niterói', 'Grajaú', 'Méier', 'Gávea', 'Flamengo', 'Catete', 'Glória', 'Penha']
+ARTISTS = ['Kobra', 'Marcelo Ment', 'Panmela Castro', 'Airá Ocrespo', 'Toz', 'Bruno Big']
+
+
+def make_app(tmpdir, **config):
+    from app import create_app, init_db
+    from db import get_pool
+
+    app = create_app(dict(
+        DATABASE=os.path.join(tmpdir, 'bench.db'),
+        CATALOG_STAMP_FILE=os.path.join(tmpdir, 'catalog.version'),
+        METRICS_DIR=os.path.join(tmpdir, 'metrics'),
+        TESTING=True,
+        **config
+    ))
+    with app.app_context():
+        init_db()
+    get_pool(app)
+    return app
+
+
+def seed_pcs(db, count, categories=5, seed=42):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        name = f'{rng.choice(WORDS)} {rng.choice(WORDS)} {i}'
+        rows.append((
+            name, f'bench-{i}', f'Edição {rng.choice(WORDS)}',
+            f'PC gamer com arte de {rng.choice(ARTISTS)} inspirada em {rng.choice(WORDS)}.',
+            rng.randint(1, categories), round(rng.uniform(2500, 25000), 2),
+            f'/static/img/pcs/bench-{i}.svg',
+            rng.choice(PROCESSORS), rng.choice(GPUS), rng.choice(RAMS), rng.choice(STORAGES),
+            rng.choice(ARTISTS), rng.choice(['Wildstyle', 'Stencil', 'Throw-up', 'Bomb']),
+            int(rng.random() < 0.1), int(rng.random() < 0.05), int(rng.random() < 0.9),
+            rng.randint(0, 5000),
+        ))
+    db.executemany('''
+        INSERT INTO pcs (name, slug, subtitle, description, category_id, price, main_image,
+                         processor, gpu, ram, storage, graffiti_artist, graffiti_style,
+                         featured, limited_edition, in_stock, views)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+    db.commit()
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        'mean_ms': statistics.mean(samples) * 1000,
+        'p50_ms': samples[len(samples) // 2] * 1000,
+        'p99_ms': samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000,
+    }
+
+
+def print_row(label, stats):
+    print(f"{label:<40} mean {stats['mean_ms']:9.3f} ms   p50 {stats['p50_ms']:9.3f} ms   p99 {stats['p99_ms']:9.3f} ms")
@@ -0,0 +1,125 @@
+"""
+Benchmark: rajada de logins contra o catálogo no mesmo worker
+
+Enquanto --logins clientes fazem POST /login ao mesmo tempo (cada um com a
+sua conta), algumas threads pedem /pcs a cada --interval segundos e
+medem a latência. Compara o hash na thread do request
+(PASSWORD_HASH_WORKERS=0) com o pool de processos, com e sem espaço na
+fila para a rajada inteira: vazão de logins, respostas 429 e p50/p99 do
+catálogo antes e durante a rajada.
+
+Uso: python benchmarks/login_burst.py [--logins 100] [--workers 2] [--max-queue 16] [--readers 4]
+                                      [--interval 0.1]
+"""
+
+import argparse
+import tempfile
+import threading
+import time
+
+from common import make_app, print_row, seed_pcs, summarize
+
+PASSWORD = 'senha-do-benchmark'
+
+
+def catalog_reader(app, stop, latencies, interval):
+    client = app.test_client()
+    while not stop.is_set():
+        started = time.perf_counter()
+        client.get('/pcs')
+        latencies.append(time.perf_counter() - started)
+        stop.wait(interval)
+
+
+def login(app, i, barrier, results):
+    client = app.test_client()
+    barrier.wait()
+    started = time.perf_counter()
+    response = client.post('/login', data={'email': f'burst{i}@example.com', 'password': PASSWORD})
+    results.append((response.status_code, time.perf_counter() - started))
+
+
+def measure_catalog(app, readers, interval, seconds):
+    stop, latencies = threading.Event(), []
+    threads = [threading.Thread(target=catalog_reader, args=(app, stop, latencies, interval))
+               for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return latencies
+
+
+def burst(app, logins, readers, interval):
+    stop, latencies, results = threading.Event(), [], []
+    barrier = threading.Barrier(logins + 1)
+    clients = [threading.Thread(target=login, args=(app, i, barrier, results)) for i in range(logins)]
+    for thread in clients:
+        thread.start()
+    reader_threads = [threading.Thread(target=catalog_reader, args=(app, stop, latencies, interval))
+                      for _ in range(readers)]
+    for thread in reader_threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in clients:
+        thread.join()
+    wall = time.perf_counter() - started
+    stop.set()
+    for thread in reader_threads:
+        thread.join()
+    return wall, results, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--logins', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--max-queue', type=int, default=16)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--interval', type=float, default=0.1)
+    args = parser.parse_args()
+
+    import passwords
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(tmp)
+        from db import get_db
+        with app.app_context():
+            db = get_db()
+            seed_pcs(db, 500)
+            # Same password for every account: one hash, computed once
+            pwhash = passwords.password_hasher(app).hash_inline(PASSWORD)
+            db.executemany('INSERT INTO customers (name, email, password_hash) VALUES (?, ?, ?)',
+                           [(f'Cliente {i}', f'burst{i}@example.com', pwhash) for i in range(args.logins)])
+            db.commit()
+
+        app.test_client().get('/pcs')  # load the catalog snapshot before measuring
+        print(f'{args.logins} logins simultâneos, {args.readers} leitores de /pcs, '
+              f"hash {passwords.normalize_method(app.config['PASSWORD_HASH_METHOD'])}")
+        print_row('catálogo sem rajada', summarize(measure_catalog(app, args.readers, args.interval, 3.0)))
+
+        modes = (
+            ('hash na thread do request', 0, 0),
+            (f'pool {args.workers} proc., fila {args.logins}', args.workers, args.logins),
+            (f'pool {args.workers} proc., fila {args.max_queue}', args.workers, args.max_queue),
+        )
+        for label, workers, max_queue in modes:
+            app.config.update(PASSWORD_HASH_WORKERS=workers, PASSWORD_HASH_MAX_QUEUE=max_queue)
+            passwords.init_app(app)
+            if workers:
+                # Start the pool processes outside the measurement
+                passwords.password_hasher(app).verify(pwhash, PASSWORD)
+            wall, results, latencies = burst(app, args.logins, args.readers, args.interval)
+            ok = sum(1 for status, _ in results if status == 302)
+            shed = sum(1 for status, _ in results if status == 429)
+            login_times = summarize([elapsed for status, elapsed in results if status == 302])
+            print(f'{label}:')
+            print(f"{'':<4}{ok} logins em {wall:.2f} s ({ok / wall:.1f}/s), {shed} respostas 429, "
+                  f"login p99 {login_times['p99_ms']:.0f} ms")
+            print_row('    catálogo durante a rajada', summarize(latencies))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark: custo das métricas por rota (REQUEST_METRICS)
+
+Dois apps sobre o mesmo banco, um com as métricas ligadas e outro sem,
+respondem à mesma sequência de páginas (home, catálogo, produto, busca,
+carrinho). As rodadas se alternam entre os dois, trocando quem vai
+primeiro, para que aquecimento e ruído da máquina caiam igualmente sobre
+ambos; compara o tempo por request
+(mediana das rodadas) e mostra a diferença em %.
+
+Uso: python benchmarks/metrics_overhead.py [--pcs 500] [--rounds 20] [--requests 300]
+"""
+
+import argparse
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from common import make_app, seed_pcs
+
+PATHS = ('/', '/pcs', '/pcs?sort=price_low', '/pc/bench-7', '/api/search?q=rtx', '/cart')
+
+
+def run_round(client, requests):
+    started = time.perf_counter()
+    for i in range(requests):
+        client.get(PATHS[i % len(PATHS)])
+    return (time.perf_counter() - started) / requests
+
+
+def direct_costs(metrics, iterations=20000):
+    # What the instrumentation adds, without the noise of a whole request
+    import request_metrics
+    sample = request_metrics.Sample()
+    sample.endpoint, sample.status = 'bench', 200
+    started = time.perf_counter()
+    for _ in range(iterations):
+        metrics.record(sample, 0.004)
+    record = (time.perf_counter() - started) / iterations
+
+    costs = []
+    for factory in (sqlite3.Connection, request_metrics.TracedConnection):
+        conn = sqlite3.connect(':memory:', factory=factory)
+        token = request_metrics._current.set(request_metrics.Sample())
+        started = time.perf_counter()
+        for _ in range(iterations):
+            conn.execute('SELECT 1').fetchall()
+        costs.append((time.perf_counter() - started) / iterations)
+        request_metrics._current.reset(token)
+        conn.close()
+    return record, costs[1] - costs[0]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pcs', type=int, default=500)
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=300)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        plain = make_app(tmp, REQUEST_METRICS=False)
+        from db import get_db
+        with plain.app_context():
+            seed_pcs(get_db(), args.pcs)
+            get_db().commit()
+        measured = make_app(tmp, REQUEST_METRICS=True)
+
+        modes = (('sem métricas', plain.test_client()), ('com métricas', measured.test_client()))
+        for _, client in modes:
+            run_round(client, len(PATHS) * 5)  # catalog snapshot, templates, pool
+        times = {label: [] for label, _ in modes}
+        for i in range(args.rounds):
+            # Alternate who goes first: the second run of a round finds warmer caches
+            for label, client in (modes if i % 2 == 0 else modes[::-1]):
+                times[label].append(run_round(client, args.requests))
+
+        print(f'{args.rounds} rodadas de {args.requests} requests ({len(PATHS)} páginas), {args.pcs} PCs')
+        baseline = statistics.median(times['sem métricas'])
+        for label, samples in times.items():
+            per_request = statistics.median(samples)
+            print(f'{label:<16} {per_request * 1000:8.3f} ms/request   {(per_request / baseline - 1) * 100:+6.2f}%')
+        routes = measured.extensions['request_metrics'].summary()
+        print(f"{sum(route['count'] for route in routes)} requests registrados em {len(routes)} endpoints")
+
+        record, per_statement = direct_costs(measured.extensions['request_metrics'])
+        statements = sum(route['sql_count_mean'] * route['count'] for route in routes) / sum(route['count'] for route in routes)
+        print(f'custo direto: record {record * 1e6:.1f} µs/request, SQL rastreado +{per_statement * 1e6:.2f} µs/comando '
+              f'({statements:.1f} comandos/request em média)')
+
+
+if __name__ == '__main__':
+    main()
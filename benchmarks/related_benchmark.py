@@ -0,0 +1,83 @@
+"""
+Benchmark: produtos relacionados por visualização de página
+
+Compara a query original (ORDER BY RANDOM() LIMIT 4 sobre a categoria) com o
+sorteio dentro do pool pré-calculado do snapshot, para categorias com 10, 1k
+e 50k PCs. Também mede quanto o cálculo dos pools acrescenta à montagem do
+snapshot.
+
+Uso: python benchmarks/related_benchmark.py [--sizes 10,1000,50000] [--repeat 200]
+"""
+
+import argparse
+import random
+import tempfile
+import time
+
+from common import make_app, print_row, seed_pcs, summarize, timed
+
+RANDOM_QUERY = '''
+    SELECT p.*, c.name as category_name, c.color as category_color
+    FROM pcs p
+    LEFT JOIN categories c ON p.category_id = c.id
+    WHERE p.category_id = ? AND p.id != ? AND p.active = 1
+    ORDER BY RANDOM()
+    LIMIT 4
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='10,1000,50000')
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    for size in [int(n) for n in args.sizes.split(',')]:
+        with tempfile.TemporaryDirectory() as tmp:
+            app = make_app(tmp)
+            import catalog
+            from db import get_db
+
+            with app.app_context():
+                db = get_db()
+                # Seeded PCs go to the first category; drop the sample ones so the size is exact
+                db.execute('UPDATE pcs SET active = 0')
+                seed_pcs(db, size, categories=1)
+                db.execute('ANALYZE')
+
+                rows = [db.execute(sql).fetchall() for sql in (
+                    catalog.PCS_QUERY,
+                    'SELECT * FROM categories WHERE active = 1 ORDER BY ordem',
+                    catalog.GAMES_QUERY,
+                    catalog.REVIEWS_QUERY,
+                )]
+                start = time.perf_counter()
+                snapshot = catalog.CatalogSnapshot(1, *rows)
+                build = time.perf_counter() - start
+                start = time.perf_counter()
+                for scope, by_sort in snapshot._sorted.items():
+                    if scope:
+                        catalog._related_pools(by_sort['price_low'])
+                pools = time.perf_counter() - start
+
+                rng = random.Random(1)
+                pcs = [pc for pc in snapshot.pcs if pc['category_slug']]
+
+                def order_by_random():
+                    pc = rng.choice(pcs)
+                    db.execute(RANDOM_QUERY, [pc['category_id'], pc['id']]).fetchall()
+
+                def pooled():
+                    pc = rng.choice(pcs)
+                    snapshot.related(pc, rng)
+
+                print(f'{size} PCs na categoria  (snapshot {build * 1000:.1f} ms, '
+                      f'dos quais pools {pools * 1000:.1f} ms)')
+                old, new = summarize(timed(order_by_random, args.repeat)), summarize(timed(pooled, args.repeat))
+                print_row('ORDER BY RANDOM() LIMIT 4', old)
+                print_row('pool pré-calculado', new)
+                print(f"{'':<40} speedup p50 {old['p50_ms'] / max(new['p50_ms'], 1e-6):.0f}x\n")
+
+
+if __name__ == '__main__':
+    main()
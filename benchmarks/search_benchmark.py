@@ -0,0 +1,80 @@
+"""
+Benchmark: busca FTS5 (/api/search) x LIKE '%q%' num catálogo de 100k PCs
+
+Os dois lados fazem o trabalho do endpoint: total de resultados + primeira
+página. Termos muito frequentes custam mais no FTS5 (bm25 pontua todos os
+matches); termos seletivos e buscas sem resultado deixam de varrer a tabela.
+
+Uso: python benchmarks/search_benchmark.py [--rows 100000] [--repeat 50]
+"""
+
+import argparse
+import tempfile
+
+from common import make_app, print_row, seed_pcs, summarize, timed
+
+LIKE_COUNT = '''
+    SELECT COUNT(*) FROM pcs
+    WHERE active = 1 AND (name LIKE ? OR description LIKE ?)
+'''
+
+LIKE_QUERY = '''
+    SELECT id, name, slug, price, main_image
+    FROM pcs
+    WHERE active = 1 AND (name LIKE ? OR description LIKE ?)
+    LIMIT 10
+'''
+
+FTS_COUNT = '''
+    SELECT COUNT(*) FROM pcs_fts
+    JOIN pcs p ON p.id = pcs_fts.rowid
+    WHERE pcs_fts MATCH ? AND p.active = 1
+'''
+
+FTS_QUERY = '''
+    SELECT p.id, p.name, p.slug, p.price, p.main_image
+    FROM pcs_fts
+    JOIN pcs p ON p.id = pcs_fts.rowid
+    WHERE pcs_fts MATCH ? AND p.active = 1
+    ORDER BY bm25(pcs_fts, 10.0, 4.0, 1.0, 3.0, 3.0, 2.0, 2.0, 2.0)
+    LIMIT 10
+'''
+
+TERMS = ['Leblon', 'Kobra', 'Copa', '4242', '31337', 'zzz']
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(tmp)
+        from app import build_fts_query
+        from db import get_db
+
+        with app.app_context():
+            db = get_db()
+            seed_pcs(db, args.rows)
+            db.execute('ANALYZE')
+            print(f'{args.rows} PCs no catálogo\n')
+            for term in TERMS:
+                def like():
+                    params = [f'%{term}%'] * 2
+                    db.execute(LIKE_COUNT, params).fetchone()
+                    db.execute(LIKE_QUERY, params).fetchall()
+
+                def fts():
+                    match = build_fts_query(term)
+                    db.execute(FTS_COUNT, [match]).fetchone()
+                    db.execute(FTS_QUERY, [match]).fetchall()
+
+                like, fts = summarize(timed(like, args.repeat)), summarize(timed(fts, args.repeat))
+                print_row(f'LIKE  {term!r}', like)
+                print_row(f'FTS5  {term!r}', fts)
+                print(f"{'':<40} speedup p50 {like['p50_ms'] / max(fts['p50_ms'], 1e-6):.1f}x\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+Benchmark: vazão do `run.py serve` conforme o número de workers
+
+Sobe o servidor de produção num diretório temporário (banco próprio) para
+cada valor de --workers e dispara --clients conexões keep-alive, espalhadas
+por alguns processos, pedindo páginas públicas (home, catálogo, produto,
+busca) durante --duration segundos. Mostra requests/s e latência por
+configuração; a vazão deve crescer com os workers até o número de núcleos.
+
+Uso: python benchmarks/serve_load.py [--workers 1,2,4] [--threads 8] [--clients 32] [--processes 4]
+                                     [--duration 10] [--port 5077]
+"""
+
+import argparse
+import http.client
+import multiprocessing
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from common import print_row, summarize
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PATHS = ('/', '/pcs', '/pcs?sort=price_low', '/pc/cristo-ultra', '/api/search?q=rtx')
+
+
+def client(port, duration, latencies, errors):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    deadline = time.perf_counter() + duration
+    i = 0
+    while time.perf_counter() < deadline:
+        path = PATHS[i % len(PATHS)]
+        i += 1
+        started = time.perf_counter()
+        try:
+            conn.request('GET', path)
+            response = conn.getresponse()
+            response.read()
+            if response.status >= 500:
+                errors.append(path)
+        except (OSError, http.client.HTTPException):
+            errors.append(path)
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - started)
+    conn.close()
+
+
+def client_process(port, threads, duration, barrier, queue):
+    latencies, errors = [], []
+    workers = [threading.Thread(target=client, args=(port, duration, latencies, errors)) for _ in range(threads)]
+    barrier.wait()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    queue.put((latencies, len(errors)))
+
+
+def wait_for_port(port, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise SystemExit(f'servidor não respondeu na porta {port}')
+
+
+def start_server(tmp, workers, threads, port):
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, 'run.py'), 'serve', '--host', '127.0.0.1', '--port', str(port),
+         '--workers', str(workers), '--threads', str(threads)],
+        cwd=tmp, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_for_port(port)
+    # Warm every worker (catalog snapshot, templates) before measuring
+    for _ in range(workers * threads * 2):
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        conn.request('GET', '/pcs')
+        conn.getresponse().read()
+        conn.close()
+    return server
+
+
+def run(port, clients, processes, duration):
+    context = multiprocessing.get_context('fork')
+    barrier = context.Barrier(processes + 1)
+    queue = context.Queue()
+    per_process = [clients // processes + (i < clients % processes) for i in range(processes)]
+    procs = [context.Process(target=client_process, args=(port, n, duration, barrier, queue)) for n in per_process]
+    for proc in procs:
+        proc.start()
+    barrier.wait()
+    started = time.perf_counter()
+    results = [queue.get() for _ in procs]
+    wall = time.perf_counter() - started
+    for proc in procs:
+        proc.join()
+    latencies = [sample for result in results for sample in result[0]]
+    return wall, latencies, sum(result[1] for result in results)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', default='1,2,4')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--port', type=int, default=5077)
+    args = parser.parse_args()
+
+    print(f'{os.cpu_count()} núcleos, {args.clients} conexões keep-alive em {args.processes} processos, '
+          f'{args.duration:.0f} s por configuração')
+    for workers in [int(w) for w in args.workers.split(',')]:
+        with tempfile.TemporaryDirectory() as tmp:
+            server = start_server(tmp, workers, args.threads, args.port)
+            try:
+                wall, latencies, errors = run(args.port, args.clients, args.processes, args.duration)
+            finally:
+                server.send_signal(signal.SIGTERM)
+                server.wait(timeout=60)
+        label = f'{workers} workers x {args.threads} threads'
+        print_row(label, summarize(latencies))
+        print(f"{'':<40} {len(latencies) / wall:9.0f} req/s   {errors} erros")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Benchmark: tempo de subida e memória de um worker
+
+Mede, para cada amostra, do início do import do app até a primeira
+resposta de GET / (processo já com o interpretador carregado) e a memória
+do processo nesse momento: RSS e PSS (a parte das páginas compartilhadas
+com outros processos é dividida entre eles, então o PSS mostra quanto um
+worker a mais custa de fato).
+
+Dois cenários:
+    processo novo   um python limpo importa tudo (worker sem master)
+    fork do master  como em `run.py serve`: o master já carregou as
+                    bibliotecas (server.preload) e o worker só importa o app
+
+--tree mede outro checkout (por exemplo um `git worktree` de uma versão
+anterior) no cenário de processo novo, para comparar antes/depois.
+
+Uso: python benchmarks/startup_benchmark.py [--samples 10] [--tree DIR]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from common import make_app, summarize
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKER = '''
+import json, os, sys, time
+started = time.perf_counter()
+sys.path.insert(0, {tree!r})
+os.chdir({tree!r})
+import app as module
+config = {{'DATABASE': {database!r}, 'CATALOG_STAMP_FILE': {stamp!r}}}
+if hasattr(module, 'create_app'):
+    app = module.create_app(config)
+else:
+    app = module.app
+    app.config.update(config)
+status = app.test_client().get('/').status_code
+elapsed = time.perf_counter() - started
+memory = {{}}
+with open('/proc/self/smaps_rollup') as f:
+    for line in f:
+        key, _, value = line.partition(':')
+        if key in ('Rss', 'Pss'):
+            memory[key] = int(value.split()[0])
+print(json.dumps({{'elapsed': elapsed, 'status': status, 'rss_kb': memory['Rss'], 'pss_kb': memory['Pss']}}))
+'''
+
+
+def fresh_process(tree, database, stamp):
+    code = WORKER.format(tree=tree, database=database, stamp=stamp)
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def forked_worker(database, stamp):
+    # The child runs the worker snippet in this (preloaded) interpreter after fork
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        os.dup2(write_fd, 1)
+        try:
+            exec(WORKER.format(tree=ROOT, database=database, stamp=stamp), {'__name__': '__worker__'})
+            sys.stdout.flush()
+        finally:
+            os._exit(0)
+    os.close(write_fd)
+    with os.fdopen(read_fd) as pipe:
+        out = pipe.read()
+    os.waitpid(pid, 0)
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def report(label, samples):
+    times = summarize([s['elapsed'] for s in samples])
+    rss = sum(s['rss_kb'] for s in samples) / len(samples) / 1024
+    pss = sum(s['pss_kb'] for s in samples) / len(samples) / 1024
+    print(f"{label:<32} até 1ª resposta p50 {times['p50_ms']:7.1f} ms  p99 {times['p99_ms']:7.1f} ms   "
+          f"RSS {rss:5.1f} MB   PSS {pss:5.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--samples', type=int, default=10)
+    parser.add_argument('--tree', help='outro checkout para comparar (processo novo)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(tmp)
+        from db import get_pool
+        get_pool(app).close_all()
+        database, stamp = app.config['DATABASE'], app.config['CATALOG_STAMP_FILE']
+
+        if args.tree:
+            tree = os.path.abspath(args.tree)
+            report(f'processo novo ({os.path.basename(tree)})',
+                   [fresh_process(tree, database, stamp) for _ in range(args.samples)])
+        report('processo novo', [fresh_process(ROOT, database, stamp) for _ in range(args.samples)])
+
+        # A clean master: only the libraries, as server.py loads them before forking
+        code = f'''
+import sys
+sys.path[:0] = [{os.path.join(ROOT, 'benchmarks')!r}, {ROOT!r}]
+import server
+server.preload()
+from startup_benchmark import forked_worker, report
+report('fork do master', [forked_worker({database!r}, {stamp!r}) for _ in range({args.samples})])
+'''
+        subprocess.run([sys.executable, '-c', code], check=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Benchmark: escritas concorrentes com e sem a fila de escrita única
+
+50 escritores (threads espalhadas por alguns processos, como workers do
+servidor) fazem cada um --writes escritas pequenas pelo caminho do app
+(execute_db): inscrição na newsletter e atualização de last_login,
+alternadas. Compara commit por escrita na conexão do request com a fila
+por processo com group commit (DATABASE_WRITE_QUEUE), medindo vazão,
+latência por escrita e erros "database is locked".
+
+Uso: python benchmarks/write_benchmark.py [--writers 50] [--processes 2] [--writes 200] [--busy-timeout 5]
+                                         [--max-latency 0]
+"""
+
+import argparse
+import multiprocessing
+import sqlite3
+import tempfile
+import threading
+import time
+
+from common import make_app, print_row, summarize
+
+
+def writer(app, worker, thread, writes, latencies, errors):
+    from db import execute_db
+    with app.app_context():
+        for i in range(writes):
+            started = time.perf_counter()
+            try:
+                if i % 2:
+                    execute_db('UPDATE customers SET last_login = CURRENT_TIMESTAMP WHERE id = ?', [1 + i % 50])
+                else:
+                    execute_db('INSERT OR IGNORE INTO newsletter (email) VALUES (?)',
+                               [f'w{worker}-{thread}-{i}@example.com'])
+            except sqlite3.OperationalError:
+                errors.append(1)
+            latencies.append(time.perf_counter() - started)
+
+
+def worker_process(database, queued, threads, writes, worker, args, barrier, queue):
+    from app import create_app
+    app = create_app(dict(DATABASE=database, DATABASE_WRITE_QUEUE=queued, DATABASE_BUSY_TIMEOUT=args.busy_timeout,
+                          DATABASE_WRITE_MAX_LATENCY=args.max_latency))
+
+    latencies, errors = [], []
+    workers = [threading.Thread(target=writer, args=(app, worker, t, writes, latencies, errors))
+               for t in range(threads)]
+    barrier.wait()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    stats = app.extensions['write_queue'].stats() if queued else None
+    queue.put((latencies, len(errors), stats))
+
+
+def run(database, queued, args):
+    context = multiprocessing.get_context('fork')
+    barrier = context.Barrier(args.processes + 1)
+    queue = context.Queue()
+    per_process = [args.writers // args.processes + (i < args.writers % args.processes) for i in range(args.processes)]
+    procs = [context.Process(target=worker_process,
+                             args=(database, queued, n, args.writes, i, args, barrier, queue))
+             for i, n in enumerate(per_process)]
+    for proc in procs:
+        proc.start()
+    barrier.wait()
+    started = time.perf_counter()
+    results = [queue.get() for _ in procs]
+    wall = time.perf_counter() - started
+    for proc in procs:
+        proc.join()
+    latencies = [sample for result in results for sample in result[0]]
+    errors = sum(result[1] for result in results)
+    return wall, latencies, errors, [result[2] for result in results if result[2]]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--writers', type=int, default=50)
+    parser.add_argument('--processes', type=int, default=2)
+    parser.add_argument('--writes', type=int, default=200)
+    parser.add_argument('--busy-timeout', type=float, default=5.0)
+    parser.add_argument('--max-latency', type=float, default=0.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(tmp)
+        from db import get_db, get_pool
+        with app.app_context():
+            db = get_db()
+            db.executemany('INSERT INTO customers (name, email, password_hash) VALUES (?, ?, ?)',
+                           [(f'Cliente {i}', f'c{i}@example.com', 'x') for i in range(50)])
+            db.commit()
+        get_pool(app).close_all()
+
+        total = args.writers * args.writes
+        print(f'{args.writers} escritores em {args.processes} processos, {total} escritas por modo')
+        for label, queued in (('commit por escrita', False), ('fila única + group commit', True)):
+            wall, latencies, errors, stats = run(app.config['DATABASE'], queued, args)
+            print_row(label, summarize(latencies))
+            print(f"{'':<40} {total / wall:9.0f} escritas/s   {errors} erros 'database is locked'")
+            for s in stats:
+                print(f"{'':<40} lote médio {s['avg_batch']}   commit p99 {s['commit_latency']['p99_ms']} ms   "
+                      f"espera p99 {s['queue_wait']['p99_ms']} ms")
+
+
+if __name__ == '__main__':
+    main()
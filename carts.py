@@ -0,0 +1,246 @@
+"""
+Carrinho de compras no servidor
+
+As linhas do carrinho ficam nas tabelas carts/cart_items e o cookie de
+sessão leva só session['cart_id'] (um id opaco) e session['cart_rev'], um
+token trocado a cada escrita. A contagem do badge do carrinho
+(/api/cart-count e o cabeçalho das páginas) sai de um cache em memória
+por worker chaveado por (cart_id, cart_rev): como a própria resposta que
+altera o carrinho devolve a nova revisão no cookie, qualquer worker pode
+confiar numa entrada em cache para aquela revisão sem consultar o banco.
+
+No login o carrinho anônimo é incorporado ao carrinho salvo do cliente.
+"""
+
+import secrets
+import threading
+from collections import OrderedDict
+
+from flask import current_app, session
+
+from db import get_db, run_write
+
+ITEMS_SQL = '''
+    SELECT pc_id as id, name, price, image, quantity
+    FROM cart_items
+    WHERE cart_id = ?
+    ORDER BY added_at, pc_id
+'''
+
+COUNT_SQL = 'SELECT COUNT(*) FROM cart_items WHERE cart_id = ?'
+
+ADD_SQL = '''
+    INSERT INTO cart_items (cart_id, pc_id, name, price, image, quantity)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (cart_id, pc_id) DO UPDATE SET quantity = quantity + excluded.quantity
+'''
+
+# Cart lines joined with the live PC rows: one round trip however big the cart is
+CHECKOUT_SQL = '''
+    SELECT ci.pc_id as id, ci.price as cart_price, ci.quantity,
+           p.name, p.price, p.main_image as image, p.setup_price, p.in_stock, p.active
+    FROM cart_items ci
+    LEFT JOIN pcs p ON p.id = ci.pc_id
+    WHERE ci.cart_id = ?
+    ORDER BY ci.added_at, ci.pc_id
+'''
+
+MERGE_SQL = '''
+    INSERT INTO cart_items (cart_id, pc_id, name, price, image, quantity, added_at)
+    SELECT ?, pc_id, name, price, image, quantity, added_at FROM cart_items WHERE cart_id = ?
+    ON CONFLICT (cart_id, pc_id) DO UPDATE SET quantity = quantity + excluded.quantity
+'''
+
+
+class CartCountCache:
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            count = self._entries.get(key)
+            if count is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return count
+
+    def set(self, key, count):
+        with self._lock:
+            self._entries[key] = count
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+            }
+
+
+def _cache():
+    return current_app.extensions['cart_counts']
+
+
+def _key():
+    cart_id = session.get('cart_id')
+    return (cart_id, session.get('cart_rev')) if cart_id else None
+
+
+def _touch(cart_id, count):
+    # New revision in the cookie; this worker already knows its count. Random
+    # rather than a counter so two browsers sharing a saved cart never collide
+    session['cart_id'] = cart_id
+    session['cart_rev'] = secrets.token_urlsafe(6)
+    _cache().set(_key(), count)
+
+
+def _forget():
+    session.pop('cart_id', None)
+    session.pop('cart_rev', None)
+
+
+def current_cart_id():
+    return session.get('cart_id')
+
+
+def cart_items():
+    cart_id = session.get('cart_id')
+    if not cart_id:
+        return []
+    return [dict(row) for row in get_db().execute(ITEMS_SQL, [cart_id])]
+
+
+def cart_count():
+    key = _key()
+    if key is None:
+        return 0
+    count = _cache().get(key)
+    if count is None:
+        count = get_db().execute(COUNT_SQL, [key[0]]).fetchone()[0]
+        _cache().set(key, count)
+    return count
+
+
+def add_item(pc, quantity=1, customer_id=None):
+    """Add `quantity` of a PC row; returns the new number of cart lines."""
+    return add_items([(pc, quantity)], customer_id=customer_id)
+
+
+def add_items(lines, customer_id=None):
+    """Add (pc, quantity) pairs in one transaction; returns the new number of cart lines."""
+    session_cart_id = session.get('cart_id') or secrets.token_urlsafe(16)
+
+    def write(db):
+        cart_id = session_cart_id
+        if customer_id is not None:
+            # A customer has one saved cart (UNIQUE customer_id). The session may
+            # still name a cart checked out on another device: use the saved one
+            saved = db.execute('SELECT id FROM carts WHERE customer_id = ?', [customer_id]).fetchone()
+            if saved is not None:
+                cart_id = saved['id']
+        # The row may be gone (pruned, or checked out on another device)
+        db.execute('INSERT OR IGNORE INTO carts (id, customer_id) VALUES (?, ?)', [cart_id, customer_id])
+        db.executemany(ADD_SQL, [(cart_id, pc['id'], pc['name'], float(pc['price']), pc['main_image'], quantity)
+                                 for pc, quantity in lines])
+        db.execute('UPDATE carts SET updated_at = CURRENT_TIMESTAMP WHERE id = ?', [cart_id])
+        return cart_id, db.execute(COUNT_SQL, [cart_id]).fetchone()[0]
+
+    cart_id, count = run_write(write)
+    _touch(cart_id, count)
+    return count
+
+
+def checkout_lines():
+    """Revalidate the cart against the pcs table before checkout.
+
+    Returns (lines, notices). Lines whose PC was deactivated or went out of
+    stock are removed and changed prices are written back to the cart, each
+    with a notice for the customer.
+    """
+    cart_id = session.get('cart_id')
+    if not cart_id:
+        return [], []
+    db = get_db()
+    lines, notices, removed, repriced = [], [], [], []
+    for row in db.execute(CHECKOUT_SQL, [cart_id]).fetchall():
+        if not row['active'] or row['price'] is None:
+            removed.append(row['id'])
+            notices.append('Um produto do carrinho não está mais disponível e foi removido.')
+        elif not row['in_stock']:
+            removed.append(row['id'])
+            notices.append(f"{row['name']} está sem estoque e foi removido do carrinho.")
+        else:
+            if abs(row['price'] - row['cart_price']) > 0.005:
+                repriced.append((row['price'], cart_id, row['id']))
+                notices.append(f"O preço de {row['name']} foi atualizado.")
+            lines.append({'id': row['id'], 'name': row['name'], 'price': row['price'], 'image': row['image'],
+                          'quantity': row['quantity'], 'setup_price': row['setup_price'] or 0})
+    if removed or repriced:
+        def write(db):
+            db.executemany('DELETE FROM cart_items WHERE cart_id = ? AND pc_id = ?',
+                           [(cart_id, pc_id) for pc_id in removed])
+            db.executemany('UPDATE cart_items SET price = ? WHERE cart_id = ? AND pc_id = ?', repriced)
+
+        run_write(write)
+        _touch(cart_id, len(lines))
+    return lines, notices
+
+
+def merge_on_login(customer_id):
+    """Fold the anonymous cart into the customer's saved cart and point the session at it."""
+    anonymous = session.get('cart_id')
+
+    def write(db):
+        saved = db.execute('SELECT id FROM carts WHERE customer_id = ?', [customer_id]).fetchone()
+        source = anonymous
+        if source:
+            owner = db.execute('SELECT customer_id FROM carts WHERE id = ?', [source]).fetchone()
+            if owner is None or owner[0] not in (None, customer_id):
+                source = None
+        if saved is None:
+            cart_id = source
+            if cart_id:
+                db.execute('UPDATE carts SET customer_id = ? WHERE id = ?', [customer_id, cart_id])
+        else:
+            cart_id = saved[0]
+            if source and source != cart_id:
+                db.execute(MERGE_SQL, [cart_id, source])
+                db.execute('DELETE FROM carts WHERE id = ?', [source])
+                db.execute('UPDATE carts SET updated_at = CURRENT_TIMESTAMP WHERE id = ?', [cart_id])
+        return cart_id, db.execute(COUNT_SQL, [cart_id]).fetchone()[0] if cart_id else 0
+
+    cart_id, count = run_write(write)
+    if count:
+        _touch(cart_id, count)
+    else:
+        _forget()
+    return count
+
+
+def forget_cart():
+    # Logout: the saved cart stays with the customer, the browser starts empty
+    _forget()
+
+
+def prune(db, days=30):
+    cur = db.execute(
+        "DELETE FROM carts WHERE customer_id IS NULL AND updated_at < datetime('now', ?)", [f'-{int(days)} days'])
+    db.commit()
+    return cur.rowcount
+
+
+def init_app(app):
+    app.extensions['cart_counts'] = CartCountCache(max_entries=app.config.get('CART_COUNT_CACHE_SIZE', 10000))
+    app.add_template_global(cart_count)
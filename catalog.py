@@ -0,0 +1,434 @@
+"""
+Snapshot imutável do catálogo em memória
+
+Index, catálogo e página de produto leem de um CatalogSnapshot montado de
+uma só vez a partir do banco. Escritas do admin chamam invalidate(), que
+reconstrói o snapshot e o troca por atribuição simples; os demais workers
+percebem a troca pelo arquivo de versão em instance/.
+"""
+
+import hashlib
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from datetime import datetime, timezone
+from types import MappingProxyType
+
+from flask import current_app
+
+from db import get_pool
+from facets import FacetIndex, gpu_tier
+
+# sort -> (key, descending); the id tiebreak keeps orderings stable for keyset pagination
+SORT_KEYS = {
+    'newest': (lambda pc: (pc['created_at'] or '', pc['id']), True),
+    'price_low': (lambda pc: (pc['price'], pc['id']), False),
+    'price_high': (lambda pc: (pc['price'], pc['id']), True),
+    'popular': (lambda pc: (pc['views'] or 0, pc['id']), True),
+}
+SORTS = tuple(SORT_KEYS)
+
+PCS_QUERY = '''
+    SELECT p.*, c.name as category_name, c.color as category_color, c.slug as category_slug
+    FROM pcs p
+    LEFT JOIN categories c ON p.category_id = c.id
+    WHERE p.active = 1
+'''
+
+GAMES_QUERY = '''
+    SELECT pg.pc_id, g.*, pg.performance, pg.fps_avg, pg.resolution
+    FROM pc_games pg
+    JOIN games g ON g.id = pg.game_id
+    JOIN pcs p ON p.id = pg.pc_id
+    WHERE p.active = 1
+    ORDER BY pg.pc_id, pg.performance DESC
+'''
+
+REVIEWS_QUERY = '''
+    SELECT r.*, c.name as customer_name
+    FROM reviews r
+    LEFT JOIN customers c ON r.customer_id = c.id
+    WHERE r.status = 'approved'
+    ORDER BY r.pc_id, r.created_at DESC -- scan-ok: o snapshot carrega todas as reviews aprovadas
+'''
+
+IMAGES_QUERY = '''
+    SELECT i.id, i.source, i.width, i.height, i.placeholder, i.processed_at,
+           v.format, v.width as variant_width, v.url
+    FROM images i
+    JOIN image_variants v ON v.image_id = i.id
+    WHERE i.status = 'done'
+    ORDER BY i.id, v.format, v.width
+'''
+
+PC_IMAGES_QUERY = '''
+    SELECT pi.pc_id, pi.position, pi.url, pi.alt, pi.width, pi.height
+    FROM pc_images pi
+    JOIN pcs p ON p.id = pi.pc_id
+    WHERE p.active = 1
+    ORDER BY pi.pc_id, pi.position
+'''
+
+REVIEWS_PER_PC = 10
+
+# Counters no page renders: a view or a sale must not change ETags or re-render the cards
+FINGERPRINT_EXCLUDED = frozenset({'views', 'stock'})
+
+# Price/availability of an active PC (add_to_cart reads this instead of the database)
+Offer = namedtuple('Offer', 'price in_stock setup_price')
+
+# Related-products pool per PC: nearest prices with the same GPU tier plus a few from adjacent tiers
+RELATED_SAME_TIER = 8
+RELATED_ADJACENT_TIER = 2
+
+
+def _freeze(row):
+    return MappingProxyType(dict(row))
+
+
+def _responsive_images(rows):
+    # source URL -> dimensions, placeholder and ready-made srcset per format
+    images = {}
+    for row in rows:
+        image = images.get(row['source'])
+        if image is None:
+            image = images[row['source']] = {
+                'width': row['width'],
+                'height': row['height'],
+                'placeholder': row['placeholder'],
+                'version': (row['id'], row['processed_at']),
+                'srcset': {},
+                'src': None,
+            }
+        image['srcset'].setdefault(row['format'], []).append(f"{row['url']} {row['variant_width']}w")
+        if row['format'] == 'webp':
+            image['src'] = row['url']
+    return MappingProxyType({
+        source: MappingProxyType({**image, 'srcset': MappingProxyType({fmt: ', '.join(entries)
+                                                                      for fmt, entries in image['srcset'].items()})})
+        for source, image in images.items()
+    })
+
+
+def _digest(*tables):
+    # Content hash of everything the snapshot was built from; identical across
+    # workers that read the same data, so it can back a strong ETag. Counters
+    # are left out: every view flush would change it otherwise
+    h = hashlib.blake2b(digest_size=16)
+    for rows in tables:
+        for row in rows:
+            row = dict(row)
+            h.update(repr(tuple(v for k, v in row.items() if k not in FINGERPRINT_EXCLUDED)).encode())
+        h.update(b'\x00')
+    return h.hexdigest()
+
+
+def _stamp_time(stamp):
+    # Stamps are '<time_ns>-<pid>', written by invalidate() and shared by every worker
+    try:
+        ns = int(stamp.partition('-')[0])
+    except (AttributeError, ValueError):
+        return None
+    return datetime.fromtimestamp(ns / 1e9, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _last_modified(*values):
+    # SQLite CURRENT_TIMESTAMP values are UTC 'YYYY-MM-DD HH:MM:SS'
+    stamps = [value for value in values if value]
+    if not stamps:
+        return None
+    try:
+        return datetime.strptime(max(stamps)[:19], '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+
+
+def _fingerprint(pc, image_version):
+    return hash((tuple(value for column, value in pc.items() if column not in FINGERPRINT_EXCLUDED), image_version))
+
+
+def _related_pools(by_price):
+    # by_price: PCs of one category ordered by price. Neighbours in a price-sorted
+    # list are the closest prices, so no pairwise scoring is needed.
+    tiers, tier_of = {}, {}
+    for pc in by_price:
+        gpu = pc['gpu']
+        if gpu not in tier_of:
+            tier_of[gpu] = gpu_tier(gpu)
+        tiers.setdefault(tier_of[gpu], []).append(pc)
+    prices = {tier: [pc['price'] for pc in group] for tier, group in tiers.items()}
+
+    side, near = RELATED_SAME_TIER // 2, RELATED_ADJACENT_TIER // 2
+    pools = {}
+    for tier, group in tiers.items():
+        adjacent = [t for t in (tier - 1, tier + 1) if t in tiers] if tier is not None else []
+        for i, pc in enumerate(group):
+            lo = max(0, min(i - side, len(group) - 1 - 2 * side))
+            pool = group[lo:i] + group[i + 1:lo + 2 * side + 1]
+            for other in adjacent:
+                j = bisect_left(prices[other], pc['price'])
+                lo = max(0, min(j - near, len(tiers[other]) - 2 * near))
+                pool += tiers[other][lo:lo + RELATED_ADJACENT_TIER]
+            pools[pc['id']] = pool
+
+    # Small categories or rare tiers: top up with the closest prices of any tier
+    for k, pc in enumerate(by_price):
+        pool = pools[pc['id']]
+        if len(pool) < RELATED_SAME_TIER:
+            seen = {p['id'] for p in pool} | {pc['id']}
+            lo = max(0, min(k - side, len(by_price) - 1 - 2 * side))
+            pool += [p for p in by_price[lo:lo + 2 * side + 1] if p['id'] not in seen]
+        pools[pc['id']] = tuple(pool)
+    return pools
+
+
+def _estimate_size(snapshot, sample=200):
+    # Shallow size of every container plus the deep size of a sample of rows
+    def deep(obj):
+        size = sys.getsizeof(obj)
+        if isinstance(obj, (dict, MappingProxyType)):
+            # Column names are shared between rows; count only the values
+            size += sum(sys.getsizeof(v) for v in obj.values())
+        return size
+
+    pcs = snapshot.pcs
+    step = max(1, len(pcs) // sample)
+    sampled = pcs[::step]
+    per_pc = sum(deep(pc) for pc in sampled) / len(sampled) if sampled else 0
+    size = int(per_pc * len(pcs))
+    for value in vars(snapshot).values():
+        size += sys.getsizeof(value)
+    size += sum(sys.getsizeof(pool) for pool in snapshot._related.values())
+    for index in (snapshot._sorted, snapshot._positions):
+        for by_sort in index.values():
+            size += sum(sys.getsizeof(items) for items in by_sort.values())
+    for rows in list(snapshot.games.values()) + list(snapshot.reviews.values()):
+        size += sum(deep(row) for row in rows)
+    size += sum(sys.getsizeof(bits) for by_value in snapshot.facets.bits.values() for bits in by_value.values())
+    return size
+
+
+class CatalogSnapshot:
+    def __init__(self, version, pcs, categories, games, reviews, images=(), gallery=(), stamp=None):
+        self.version = version
+        self.built_at = time.time()
+        self.etag = _digest(pcs, categories, games, reviews, images, gallery)
+        # The stamp time covers changes that move no updated_at (deleted rows, categories)
+        self.last_modified = _last_modified(
+            *(pc['updated_at'] for pc in pcs), *(pc['created_at'] for pc in pcs),
+            *(review['created_at'] for review in reviews), _stamp_time(stamp))
+
+        self.categories = tuple(_freeze(c) for c in categories)
+        self.images = _responsive_images(images)
+
+        # fingerprint: per-process content hash of the row (and its processed image), keys the fragment cache
+        self.pcs = tuple(
+            MappingProxyType({**p, 'fingerprint': _fingerprint(p, self._image_version(p['main_image']))})
+            for p in map(dict, pcs))
+        self.by_id = MappingProxyType({pc['id']: pc for pc in self.pcs})
+        self.by_slug = MappingProxyType({pc['slug']: pc for pc in self.pcs})
+        self.offers = MappingProxyType({
+            pc['id']: Offer(float(pc['price']), bool(pc['in_stock']), float(pc['setup_price'] or 0))
+            for pc in self.pcs
+        })
+
+        games_by_pc = {}
+        for row in games:
+            row = dict(row)
+            games_by_pc.setdefault(row.pop('pc_id'), []).append(MappingProxyType(row))
+        self.games = MappingProxyType({k: tuple(v) for k, v in games_by_pc.items()})
+
+        gallery_by_pc = {}
+        for row in gallery:
+            row = dict(row)
+            gallery_by_pc.setdefault(row.pop('pc_id'), []).append(MappingProxyType(row))
+        self.gallery = MappingProxyType({k: tuple(v) for k, v in gallery_by_pc.items()})
+
+        reviews_by_pc, totals = {}, {}
+        for row in reviews:
+            pc_id = row['pc_id']
+            count, rating_sum = totals.get(pc_id, (0, 0))
+            totals[pc_id] = (count + 1, rating_sum + row['rating'])
+            latest = reviews_by_pc.setdefault(pc_id, [])
+            if len(latest) < REVIEWS_PER_PC:
+                latest.append(_freeze(row))
+        self.reviews = MappingProxyType({k: tuple(v) for k, v in reviews_by_pc.items()})
+        self.review_summary = MappingProxyType({
+            pc_id: MappingProxyType({'count': count, 'average': round(rating_sum / count, 1)})
+            for pc_id, (count, rating_sum) in totals.items()
+        })
+
+        # Precomputed orderings per scope ('' = all categories)
+        scopes = {'': list(self.pcs)}
+        for pc in self.pcs:
+            if pc['category_slug']:
+                scopes.setdefault(pc['category_slug'], []).append(pc)
+        self._sorted = {}
+        self._prices = {}
+        for scope, items in scopes.items():
+            self._sorted[scope] = {
+                sort: tuple(sorted(items, key=key, reverse=descending))
+                for sort, (key, descending) in SORT_KEYS.items()
+            }
+            self._prices[scope] = tuple(p['price'] for p in self._sorted[scope]['price_low'])
+
+        related = {}
+        for scope, by_sort in self._sorted.items():
+            if scope:
+                related.update(_related_pools(by_sort['price_low']))
+        self._related = MappingProxyType(related)
+
+        self.featured = tuple(pc for pc in self._sorted['']['newest'] if pc['featured'])
+        self.facets = FacetIndex(self.pcs, self.categories)
+        position = self.facets.position
+        self._positions = {
+            scope: {sort: tuple(position[pc['id']] for pc in items) for sort, items in by_sort.items()}
+            for scope, by_sort in self._sorted.items()
+        }
+        self.size_bytes = _estimate_size(self)
+
+    def _image_version(self, source):
+        image = self.images.get(source)
+        return image['version'] if image else None
+
+    def _price_slice(self, scope, price_min, price_max):
+        prices = self._prices[scope]
+        lo = bisect_left(prices, price_min) if price_min else 0
+        hi = bisect_right(prices, price_max) if price_max else len(prices)
+        return slice(lo, hi)
+
+    def browse(self, category=None, price_min=None, price_max=None, sort='newest', filters=None):
+        selected = {name: set(values) for name, values in (filters or {}).items() if values}
+        narrowed = bool(selected)
+        if category:
+            selected['category'] = {category}
+
+        # The price range is a plain filter: it narrows every facet's counts
+        base = None
+        if price_min or price_max:
+            in_range = self._positions['']['price_low'][self._price_slice('', price_min, price_max)]
+            base = self.facets.mask_for_positions(in_range)
+            narrowed = True
+
+        scope, sort = category or '', sort if sort in SORTS else 'newest'
+        if scope not in self._sorted:
+            pcs = []
+        elif narrowed:
+            mask = self.facets.match(selected, base)
+            pcs = self.facets.filter(self._sorted[scope][sort], self._positions[scope][sort], mask)
+        else:
+            pcs = list(self._sorted[scope][sort])
+        return pcs, self.facets.counts(selected, base)
+
+    def related(self, pc, rng, limit=4):
+        # Random rotation inside the precomputed pool: O(pool) per page view
+        pool = self._related.get(pc['id'], ())
+        return rng.sample(pool, min(limit, len(pool)))
+
+    def info(self):
+        return {
+            'version': self.version,
+            'etag': self.etag,
+            'built_at': self.built_at,
+            'pcs': len(self.pcs),
+            'categories': len(self.categories),
+            'size_bytes': self.size_bytes,
+        }
+
+
+class CatalogCache:
+    def __init__(self, app):
+        self.app = app
+        self.stamp_path = app.config.get('CATALOG_STAMP_FILE',
+                                         os.path.join(app.instance_path, 'catalog.version'))
+        self.check_interval = app.config.get('CATALOG_CHECK_INTERVAL', 1.0)
+        self.max_age = app.config.get('CATALOG_MAX_AGE', 300)
+        self._snapshot = None
+        self._stamp = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _read_stamp(self):
+        try:
+            with open(self.stamp_path) as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    def _write_stamp(self):
+        stamp = f'{time.time_ns()}-{os.getpid()}'
+        os.makedirs(os.path.dirname(self.stamp_path), exist_ok=True)
+        tmp = f'{self.stamp_path}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            f.write(stamp)
+        os.replace(tmp, self.stamp_path)
+        return stamp
+
+    def _build(self, stamp):
+        previous = self._snapshot
+        version = previous.version + 1 if previous else 1
+        pool = get_pool(self.app)
+        db = pool.acquire()
+        try:
+            # One read transaction so every part of the snapshot sees the same data
+            db.execute('BEGIN')
+            pcs = db.execute(PCS_QUERY).fetchall()
+            categories = db.execute('SELECT * FROM categories WHERE active = 1 ORDER BY ordem').fetchall()
+            games = db.execute(GAMES_QUERY).fetchall()
+            reviews = db.execute(REVIEWS_QUERY).fetchall()
+            images = db.execute(IMAGES_QUERY).fetchall()
+            gallery = db.execute(PC_IMAGES_QUERY).fetchall()
+            db.rollback()
+        finally:
+            pool.release(db)
+        snapshot = CatalogSnapshot(version, pcs, categories, games, reviews, images, gallery, stamp)
+        self._stamp = stamp
+        self._snapshot = snapshot
+        return snapshot
+
+    def current(self):
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if snapshot is not None and now - self._checked_at < self.check_interval:
+            return snapshot
+        stamp = self._read_stamp()
+        self._checked_at = now
+        stale = (snapshot is None or stamp != self._stamp
+                 or time.time() - snapshot.built_at > self.max_age)
+        if not stale:
+            return snapshot
+        if snapshot is not None and not self._lock.acquire(blocking=False):
+            # Someone else is rebuilding; keep serving the previous snapshot
+            return snapshot
+        if snapshot is None:
+            self._lock.acquire()
+        try:
+            if self._snapshot is not snapshot:
+                return self._snapshot
+            return self._build(stamp)
+        finally:
+            self._lock.release()
+
+    def invalidate(self):
+        with self._lock:
+            return self._build(self._write_stamp())
+
+    def refresh(self):
+        # Local rebuild (e.g. fresh view counts) without signalling other workers
+        with self._lock:
+            return self._build(self._stamp)
+
+
+def init_app(app):
+    app.extensions['catalog'] = CatalogCache(app)
+
+
+def get_catalog(app=None):
+    return (app or current_app).extensions['catalog'].current()
+
+
+def invalidate_catalog(app=None):
+    return (app or current_app).extensions['catalog'].invalidate()
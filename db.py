@@ -0,0 +1,320 @@
+"""
+Camada de acesso ao SQLite do PixelCraft PC
+
+Cada worker mantém um pool limitado de conexões já configuradas (WAL,
+synchronous=NORMAL, cache de páginas e mmap) e cada request usa uma
+única conexão, guardada em `g` e devolvida ao pool no teardown. Escritas
+passam por run_write(), que opcionalmente as entrega à fila de escrita
+única (write_queue.py).
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from flask import current_app, g
+
+
+class PoolTimeout(sqlite3.OperationalError):
+    pass
+
+
+class ConnectionPool:
+    def __init__(self, database, size=8, timeout=10.0, busy_timeout=5.0,
+                 cache_size_kb=16384, mmap_size=128 * 1024 * 1024, factory=sqlite3.Connection):
+        self.database = database
+        self.factory = factory
+        self.size = size
+        self.timeout = timeout
+        self.busy_timeout = busy_timeout
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size = mmap_size
+        self._cond = threading.Condition()
+        self._reset()
+
+    def _reset(self):
+        # Connections never cross a fork: a child worker starts with an empty pool
+        self._pid = os.getpid()
+        self._idle = []
+        self._open = 0
+        self._opened = 0
+        self._reused = 0
+        self._waited = 0
+        self._wait_time = 0.0
+
+    def _connect(self):
+        conn = sqlite3.connect(self.database, timeout=self.busy_timeout,
+                               check_same_thread=False, factory=self.factory)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        conn.execute(f'PRAGMA cache_size = -{int(self.cache_size_kb)}')
+        conn.execute(f'PRAGMA mmap_size = {int(self.mmap_size)}')
+        conn.execute('PRAGMA temp_store = MEMORY')
+        return conn
+
+    def acquire(self):
+        with self._cond:
+            if self._pid != os.getpid():
+                self._reset()
+            waited_since = None
+            while True:
+                if self._idle:
+                    self._reused += 1
+                    conn = self._idle.pop()
+                    break
+                if self._open < self.size:
+                    self._open += 1
+                    self._opened += 1
+                    conn = None
+                    break
+                if waited_since is None:
+                    waited_since = time.monotonic()
+                    self._waited += 1
+                remaining = self.timeout - (time.monotonic() - waited_since)
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    raise PoolTimeout('Nenhuma conexão livre no pool do banco de dados')
+            if waited_since is not None:
+                self._wait_time += time.monotonic() - waited_since
+
+        if conn is not None:
+            return conn
+        try:
+            return self._connect()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn, discard=False):
+        with self._cond:
+            if self._pid != os.getpid():
+                return
+            if not discard:
+                try:
+                    if conn.in_transaction:
+                        conn.rollback()
+                except sqlite3.Error:
+                    discard = True
+            if discard:
+                self._open -= 1
+                conn.close()
+            else:
+                # LIFO keeps the hottest page cache in use
+                self._idle.append(conn)
+            self._cond.notify()
+
+    def close_all(self):
+        with self._cond:
+            for conn in self._idle:
+                conn.close()
+            self._open -= len(self._idle)
+            self._idle = []
+
+    def stats(self):
+        with self._cond:
+            return {
+                'size': self.size,
+                'open': self._open,
+                'idle': len(self._idle),
+                'in_use': self._open - len(self._idle),
+                'opened': self._opened,
+                'reused': self._reused,
+                'waited': self._waited,
+                'wait_time': round(self._wait_time, 4),
+            }
+
+
+def get_pool(app=None):
+    app = app or current_app
+    pool = app.extensions.get('sqlite_pool')
+    if pool is None:
+        pool = ConnectionPool(
+            app.config['DATABASE'],
+            size=app.config.get('DATABASE_POOL_SIZE', 8),
+            timeout=app.config.get('DATABASE_POOL_TIMEOUT', 10.0),
+            busy_timeout=app.config.get('DATABASE_BUSY_TIMEOUT', 5.0),
+            cache_size_kb=app.config.get('DATABASE_CACHE_SIZE_KB', 16384),
+            mmap_size=app.config.get('DATABASE_MMAP_SIZE', 128 * 1024 * 1024),
+            # Counts SQL per request when request_metrics is on
+            factory=getattr(app.extensions.get('request_metrics'), 'connection_class', sqlite3.Connection),
+        )
+        app.extensions['sqlite_pool'] = pool
+    return pool
+
+
+def get_db():
+    if 'db' not in g:
+        g.db = get_pool().acquire()
+    return g.db
+
+
+def close_db(exc=None):
+    db = g.pop('db', None)
+    if db is not None:
+        get_pool().release(db)
+
+
+def query_db(query, args=(), one=False):
+    cur = get_db().execute(query, args)
+    rv = cur.fetchall()
+    cur.close()
+    return (rv[0] if rv else None) if one else rv
+
+
+def run_write(fn):
+    """Run fn(db) as one atomic write and return its result.
+
+    With DATABASE_WRITE_QUEUE on, fn runs on the worker's writer thread and
+    shares a group commit with other requests (see write_queue.py); fn must
+    therefore never begin, commit or roll back a transaction itself.
+    """
+    queue = current_app.extensions.get('write_queue')
+    if queue is not None:
+        return queue.run(fn)
+    db = get_db()
+    # IMMEDIATE takes the write lock up front instead of failing on a lock upgrade
+    if not db.in_transaction:
+        db.execute('BEGIN IMMEDIATE')
+    try:
+        result = fn(db)
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    return result
+
+
+def execute_db(query, args=()):
+    def write(db):
+        cur = db.execute(query, args)
+        lastrowid = cur.lastrowid
+        cur.close()
+        return lastrowid
+    return run_write(write)
+
+
+# Schema migrations
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MIGRATION_FILE = re.compile(r'^(\d+)_([\w-]+)\.(sql|py)$')
+
+
+def list_migrations(directory=MIGRATIONS_DIR):
+    migrations = []
+    for filename in os.listdir(directory):
+        match = MIGRATION_FILE.match(filename)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(directory, filename)))
+    migrations.sort()
+    return migrations
+
+
+def current_schema_version(db):
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    db.commit()
+    # -1 on a database never migrated, so migration 0000 (the legacy baseline) runs
+    return db.execute('SELECT COALESCE(MAX(version), -1) FROM schema_version').fetchone()[0]
+
+
+def migrate(db, directory=MIGRATIONS_DIR):
+    applied = []
+    version = current_schema_version(db)
+    for number, name, path in list_migrations(directory):
+        if number <= version:
+            continue
+        if path.endswith('.py'):
+            run_python_migration(db, number, name, path)
+            applied.append((number, name))
+            continue
+        with open(path, encoding='utf-8') as f:
+            script = f.read()
+        # executescript commits first; wrapping keeps each migration atomic
+        try:
+            db.executescript(
+                'BEGIN IMMEDIATE;\n' + script +
+                f"\nINSERT INTO schema_version (version, name) VALUES ({number}, '{name}');\nCOMMIT;"
+            )
+        except sqlite3.Error:
+            if db.in_transaction:
+                db.rollback()
+            raise
+        applied.append((number, name))
+    return applied
+
+
+def run_python_migration(db, number, name, path):
+    # For changes SQL alone cannot express conditionally: upgrade(db) runs in one transaction
+    import importlib.util
+    spec = importlib.util.spec_from_file_location(f'migration_{number:04d}', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        module.upgrade(db)
+        db.execute('INSERT INTO schema_version (version, name) VALUES (?, ?)', (number, name))
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+
+
+# EXPLAIN QUERY PLAN over the SQL literals of a module
+SQL_START = re.compile(r'^\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b', re.IGNORECASE)
+# A SCAN reads every row, through an index or not. Bounded: SEARCH, an index used with a
+# constraint "(col=?)", or a virtual table handed one (FTS5 MATCH: "VIRTUAL TABLE INDEX 0:M8")
+FULL_SCAN = re.compile(r'^SCAN (?!CONSTANT ROW)(?!.*\bINDEX \S+ \(.+\)$)(?!.*VIRTUAL TABLE INDEX \d+:\S)')
+SCAN_OK = re.compile(r'--\s*scan-ok\b:?\s*(.*)$', re.MULTILINE)
+KEYSET_TAG = re.compile(r'--\s*keyset:\s*([\w.]+)\s*,\s*([\w.]+)')
+
+
+def sql_literals(source_path):
+    import ast  # CLI only
+    with open(source_path, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), source_path)
+    # Pieces of f-strings can't be planned on their own; docstrings aren't SQL
+    skip = {id(value) for node in ast.walk(tree) if isinstance(node, ast.JoinedStr) for value in node.values}
+    skip |= {id(node.value) for node in ast.walk(tree) if isinstance(node, ast.Expr)}
+    for node in ast.walk(tree):
+        if (isinstance(node, ast.Constant) and isinstance(node.value, str) and id(node) not in skip
+                and SQL_START.match(node.value)):
+            yield node.lineno, node.value
+
+
+def find_full_scans(db, source_path):
+    """Returns (problems, accepted): full scans, and the queries marked `-- scan-ok: <reason>`."""
+    problems, accepted = [], []
+    for lineno, sql in sql_literals(source_path):
+        scan_ok = SCAN_OK.search(sql)
+        if scan_ok:
+            reason = scan_ok.group(1).strip()
+            if reason:
+                accepted.append((lineno, reason, ' '.join(sql.split())))
+            else:
+                problems.append((lineno, 'scan-ok sem motivo (use -- scan-ok: <motivo>)', ' '.join(sql.split())))
+            continue
+        keyset = KEYSET_TAG.search(sql)
+        if keyset:
+            # Paginated listings: check a later page as paginate_query() runs it (the first
+            # page is the same index walk without the lower bound, cut by the LIMIT)
+            joiner = 'AND' if re.search(r'\bWHERE\b', sql, re.IGNORECASE) else 'WHERE'
+            sql += (f'\n{joiner} ({keyset.group(1)}, {keyset.group(2)}) < (?, ?)'
+                    f'\nORDER BY {keyset.group(1)} DESC, {keyset.group(2)} DESC\nLIMIT ?')
+        params = [None] * sql.count('?')
+        for row in db.execute('EXPLAIN QUERY PLAN ' + sql, params).fetchall():
+            detail = row[3]
+            if FULL_SCAN.match(detail):
+                problems.append((lineno, detail, ' '.join(sql.split())))
+    return sorted(problems), sorted(accepted)
+
+
+def init_app(app):
+    app.teardown_appcontext(close_db)
@@ -0,0 +1,172 @@
+"""
+Navegação facetada do catálogo
+
+Cada valor de faceta guarda um bitset (int do Python) com as posições dos
+PCs do snapshot que o possuem. Filtrar é um AND entre facetas (OR dentro de
+cada faceta) e as contagens de cada faceta saem de popcounts contra os
+filtros das outras facetas, sem consultas GROUP BY.
+"""
+
+import re
+
+PRICE_BUCKETS = (
+    ('ate-4000', 'Até R$ 4.000', 0, 4000),
+    ('4000-7000', 'R$ 4.000 a R$ 7.000', 4000, 7000),
+    ('7000-10000', 'R$ 7.000 a R$ 10.000', 7000, 10000),
+    ('10000-15000', 'R$ 10.000 a R$ 15.000', 10000, 15000),
+    ('acima-15000', 'Acima de R$ 15.000', 15000, float('inf')),
+)
+
+FACETS = (
+    ('category', 'Categorias'),
+    ('price', 'Faixa de Preço'),
+    ('gpu', 'Placa de Vídeo'),
+    ('ram', 'Memória RAM'),
+    ('storage', 'Armazenamento'),
+    ('in_stock', 'Disponibilidade'),
+    ('limited_edition', 'Edição'),
+)
+
+FLAG_LABELS = {'in_stock': 'Em estoque', 'limited_edition': 'Limited Edition'}
+
+GPU_FAMILY = re.compile(r'\b(RTX|GTX|RX|ARC)\s*([A-Z]?)(\d)(\d)', re.IGNORECASE)
+GPU_MODEL = re.compile(r'\b(RTX|GTX|RX|ARC)\s*[A-Z]?(\d{3,4})', re.IGNORECASE)
+SIZE = re.compile(r'(\d+(?:[.,]\d+)?)\s*(TB|GB)', re.IGNORECASE)
+
+
+def price_bucket(price):
+    for value, _, low, high in PRICE_BUCKETS:
+        if low <= price < high:
+            return value
+    return None
+
+
+def gpu_family(gpu):
+    match = GPU_FAMILY.search(gpu or '')
+    if not match:
+        return None
+    brand, prefix, first, second = match.groups()
+    brand = brand.upper()
+    if brand == 'RX':
+        return f'RX {first}000'
+    if brand == 'ARC':
+        return f'Arc {prefix.upper()}{first}00'
+    return f'{brand} {first}{second}'
+
+
+def gpu_tier(gpu):
+    # Rough performance class, 0-5: RTX xx60 -> 2, xx70 -> 3, xx80 -> 4, xx90 -> 5
+    match = GPU_MODEL.search(gpu or '')
+    if not match:
+        return None
+    brand, model = match.group(1).upper(), match.group(2)
+    if brand == 'ARC':
+        tier = int(model[0]) - 5
+    elif brand == 'RX':
+        tier = {6: 2, 7: 3, 8: 3, 9: 4}.get(int(model[1]), 1)
+    else:
+        tier = int(model[-2]) - 4 - (brand == 'GTX')
+    return max(0, min(tier, 5))
+
+
+def _gigabytes(text):
+    total = 0
+    for amount, unit in SIZE.findall(text or ''):
+        amount = float(amount.replace(',', '.'))
+        total += amount * 1024 if unit.upper() == 'TB' else amount
+    return int(total)
+
+
+def _size_label(gigabytes):
+    if gigabytes >= 1024 and gigabytes % 1024 == 0:
+        return f'{gigabytes // 1024}TB'
+    return f'{gigabytes}GB'
+
+
+def ram_size(ram):
+    match = SIZE.search(ram or '')
+    return _size_label(_gigabytes(match.group(0))) if match else None
+
+
+def storage_size(storage):
+    gigabytes = _gigabytes(storage)
+    return _size_label(gigabytes) if gigabytes else None
+
+
+def _bitset(positions, length):
+    bits = bytearray((length + 7) // 8)
+    for i in positions:
+        bits[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(bits, 'little')
+
+
+class FacetIndex:
+    def __init__(self, pcs, categories):
+        self.size = len(pcs)
+        self.all = (1 << self.size) - 1
+        self.position = {pc['id']: i for i, pc in enumerate(pcs)}
+
+        values = {name: {} for name, _ in FACETS}
+        for i, pc in enumerate(pcs):
+            row = {
+                'category': pc['category_slug'],
+                'price': price_bucket(pc['price']),
+                'gpu': gpu_family(pc['gpu']),
+                'ram': ram_size(pc['ram']),
+                'storage': storage_size(pc['storage']),
+                'in_stock': '1' if pc['in_stock'] else None,
+                'limited_edition': '1' if pc['limited_edition'] else None,
+            }
+            for name, value in row.items():
+                if value is not None:
+                    values[name].setdefault(value, []).append(i)
+
+        self.bits = {name: {value: _bitset(positions, self.size) for value, positions in by_value.items()}
+                     for name, by_value in values.items()}
+
+        # Display order and labels per facet
+        category_names = {c['slug']: c['name'] for c in categories}
+        category_order = [c['slug'] for c in categories]
+        self.options = {
+            'category': [(slug, category_names[slug]) for slug in category_order if slug in self.bits['category']],
+            'price': [(value, label) for value, label, _, _ in PRICE_BUCKETS if value in self.bits['price']],
+            'gpu': [(value, value) for value in sorted(self.bits['gpu'])],
+            'ram': [(value, value) for value in sorted(self.bits['ram'], key=_gigabytes)],
+            'storage': [(value, value) for value in sorted(self.bits['storage'], key=_gigabytes)],
+            'in_stock': [('1', FLAG_LABELS['in_stock'])] if self.bits['in_stock'] else [],
+            'limited_edition': [('1', FLAG_LABELS['limited_edition'])] if self.bits['limited_edition'] else [],
+        }
+
+    def mask_for_positions(self, positions):
+        return _bitset(positions, self.size)
+
+    def match(self, selected, base=None, exclude=None):
+        mask = self.all if base is None else base
+        for name, chosen in selected.items():
+            if name == exclude or not chosen:
+                continue
+            facet_mask = 0
+            for value in chosen:
+                facet_mask |= self.bits.get(name, {}).get(value, 0)
+            mask &= facet_mask
+        return mask
+
+    def filter(self, pcs, positions, mask):
+        # Byte lookups keep membership O(1) instead of shifting a large int per PC
+        bits = mask.to_bytes((self.size + 7) // 8, 'little')
+        return [pc for pc, i in zip(pcs, positions) if bits[i >> 3] >> (i & 7) & 1]
+
+    def counts(self, selected, base=None):
+        facets = []
+        for name, label in FACETS:
+            # Disjunctive counts: a facet's own selection does not narrow its options
+            others = self.match(selected, base, exclude=name)
+            chosen = selected.get(name, ())
+            options = [{
+                'value': value,
+                'label': option_label,
+                'count': (others & self.bits[name][value]).bit_count(),
+                'selected': value in chosen,
+            } for value, option_label in self.options[name]]
+            facets.append({'name': name, 'label': label, 'options': options})
+        return facets
@@ -0,0 +1,161 @@
+"""
+Cache de fragmentos renderizados (cards de PC e seções da página de produto)
+
+Nos templates:
+    {% cache 'pc_card', pc %} ...markup do card... {% endcache %}
+
+A chave é (nome do bloco, id do PC, updated_at, impressão digital do
+conteúdo do PC no snapshot do catálogo), então qualquer mudança nos dados
+do PC gera uma chave nova e a entrada antiga sai pelo LRU. O cache é por
+worker, limitado por FRAGMENT_CACHE_MAX_BYTES; a limpeza pelo admin chega
+aos outros workers pelo arquivo instance/fragments.version.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+
+from flask import current_app
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+
+class FragmentCache:
+    def __init__(self, max_bytes=8 * 1024 * 1024, stamp_path=None, check_interval=1.0):
+        self.max_bytes = max_bytes
+        self.stamp_path = stamp_path
+        self.check_interval = check_interval
+        self._stamp = self._read_stamp()
+        self._checked_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _read_stamp(self):
+        try:
+            with open(self.stamp_path) as f:
+                return f.read().strip()
+        except (OSError, TypeError):
+            return None
+
+    def _check_stamp(self):
+        # An admin flush in another worker rewrites the stamp file
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        stamp = self._read_stamp()
+        if stamp != self._stamp:
+            self._stamp = stamp
+            self.clear()
+
+    def get(self, key):
+        self._check_stamp()
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        size = sys.getsizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= sys.getsizeof(previous)
+            self._entries[key] = value
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= sys.getsizeof(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            flushed = len(self._entries)
+            self._entries.clear()
+            self.bytes = 0
+            return flushed
+
+    def flush(self):
+        # Clears this worker now and the others on their next stamp check
+        if self.stamp_path:
+            stamp = f'{time.time_ns()}-{os.getpid()}'
+            os.makedirs(os.path.dirname(self.stamp_path), exist_ok=True)
+            tmp = f'{self.stamp_path}.{os.getpid()}.tmp'
+            with open(tmp, 'w') as f:
+                f.write(stamp)
+            os.replace(tmp, self.stamp_path)
+            self._stamp = stamp
+        return self.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+            }
+
+
+def fragment_key(name, *parts):
+    # Rows are keyed by id, updated_at and (for snapshot PCs) their content
+    # fingerprint; anything else must be hashable
+    key = [name]
+    for part in parts:
+        if isinstance(part, Mapping) and 'id' in part:
+            key.append((part['id'], part.get('updated_at'), part.get('fingerprint')))
+        else:
+            key.append(part)
+    return tuple(key)
+
+
+class FragmentCacheExtension(Extension):
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render', [nodes.List(args)]), [], [], body).set_lineno(lineno)
+
+    def _render(self, args, caller):
+        cache = current_app.extensions['fragment_cache']
+        key = fragment_key(*args)
+        html = cache.get(key)
+        if html is None:
+            html = str(caller())
+            cache.set(key, html)
+        return Markup(html)
+
+
+def init_app(app):
+    app.extensions['fragment_cache'] = FragmentCache(
+        max_bytes=app.config.get('FRAGMENT_CACHE_MAX_BYTES', 8 * 1024 * 1024),
+        stamp_path=app.config.get('FRAGMENT_CACHE_STAMP_FILE',
+                                  os.path.join(app.instance_path, 'fragments.version')),
+    )
+    app.jinja_env.add_extension(FragmentCacheExtension)
+
+
+def flush_fragments(app=None):
+    return (app or current_app).extensions['fragment_cache'].flush()
@@ -0,0 +1,145 @@
+"""
+GET condicional (ETag / Last-Modified) para as páginas públicas do catálogo
+
+O ETag de cada página é derivado do hash de conteúdo do snapshot do catálogo
+mais endpoint, parâmetros da rota e query string, então é calculado sem
+renderizar nada: If-None-Match (ou, na falta dele, If-Modified-Since) é
+respondido com 304 antes de tocar nos templates.
+
+Entram no ETag também o manifest dos assets e um token do deploy
+(BUILD_VERSION, ou mtime/tamanho do código e dos templates), para que um
+deploy que muda só HTML ou CSS não seja respondido com 304. Contadores
+(visualizações, estoque) ficam fora do hash, e o Last-Modified é o maior
+updated_at ou a última invalidação do catálogo, então todos os workers
+respondem com os mesmos validadores.
+
+Só visitantes anônimos com sessão vazia recebem respostas cacheáveis. Com
+usuário logado, carrinho ou mensagens flash pendentes a página é pessoal e
+sai com Cache-Control: private, no-store.
+"""
+
+import hashlib
+import os
+import threading
+from functools import wraps
+from glob import glob
+
+from flask import current_app, make_response, request, session
+
+from catalog import get_catalog
+
+# Session keys that make a page personal (Flask-Login, flash messages, cart)
+PERSONAL_SESSION_KEYS = ('_user_id', '_flashes', 'cart_id')
+
+# What a deploy changes besides the data: code and templates
+BUILD_PATTERNS = ('*.py', 'templates/**/*.html')
+
+
+def build_token(app):
+    """Identify the deployed code: the same in every worker, different after a deploy."""
+    if app.config.get('BUILD_VERSION'):
+        return str(app.config['BUILD_VERSION'])
+    stamps = []
+    for pattern in BUILD_PATTERNS:
+        for path in sorted(glob(os.path.join(app.root_path, pattern), recursive=True)):
+            st = os.stat(path)
+            stamps.append((os.path.relpath(path, app.root_path), st.st_mtime_ns, st.st_size))
+    return hashlib.blake2b(repr(stamps).encode(), digest_size=8).hexdigest()
+
+
+class HttpCache:
+    def __init__(self, max_age=0, build=''):
+        self.max_age = max_age
+        self.build = build
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.conditional = 0
+        self.not_modified = 0
+        self.bypassed = 0
+
+    def _count(self, conditional=False, not_modified=False, bypassed=False):
+        with self._lock:
+            self.requests += 1
+            self.conditional += conditional
+            self.not_modified += not_modified
+            self.bypassed += bypassed
+
+    def is_personal(self):
+        if request.cookies.get(current_app.config.get('REMEMBER_COOKIE_NAME', 'remember_token')):
+            return True
+        return any(session.get(key) for key in PERSONAL_SESSION_KEYS)
+
+    def validators(self, snapshot):
+        args = sorted(request.args.items(multi=True))
+        view_args = sorted((request.view_args or {}).items())
+        key = repr((self.build, current_app.extensions['assets'].digest, snapshot.etag,
+                    request.endpoint, view_args, args))
+        return hashlib.blake2b(key.encode(), digest_size=16).hexdigest(), snapshot.last_modified
+
+    def is_fresh(self, etag, last_modified):
+        # If-None-Match wins over If-Modified-Since (RFC 9110 13.2.2)
+        if request.if_none_match:
+            return request.if_none_match.contains(etag)
+        if request.if_modified_since and last_modified:
+            return last_modified <= request.if_modified_since
+        return False
+
+    def public_headers(self, response, etag, last_modified):
+        response.set_etag(etag)
+        if last_modified:
+            response.last_modified = last_modified
+        response.headers['Cache-Control'] = f'public, max-age={self.max_age}, must-revalidate'
+        response.vary.add('Cookie')
+        return response
+
+    def stats(self):
+        with self._lock:
+            cacheable = self.requests - self.bypassed
+            return {
+                'requests': self.requests,
+                'bypassed': self.bypassed,
+                'conditional': self.conditional,
+                'not_modified': self.not_modified,
+                'hit_ratio': self.not_modified / cacheable if cacheable else 0.0,
+            }
+
+
+def public_page(on_not_modified=None):
+    """Serve the view with validators; answer 304 without calling it when fresh.
+
+    on_not_modified(**view_args) runs for 304s, for side effects the view
+    would otherwise have had (e.g. counting a product view).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            cache = current_app.extensions['http_cache']
+            if cache.is_personal():
+                cache._count(bypassed=True)
+                response = make_response(view(*args, **kwargs))
+                response.headers['Cache-Control'] = 'private, no-store'
+                response.vary.add('Cookie')
+                return response
+
+            etag, last_modified = cache.validators(get_catalog())
+            conditional = bool(request.if_none_match or request.if_modified_since)
+            if cache.is_fresh(etag, last_modified):
+                cache._count(conditional=True, not_modified=True)
+                if on_not_modified is not None:
+                    on_not_modified(*args, **kwargs)
+                response = current_app.response_class(status=304)
+                return cache.public_headers(response, etag, last_modified)
+
+            cache._count(conditional=conditional)
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                # Redirects (e.g. unknown product) carry a flash; never cache them
+                response.headers['Cache-Control'] = 'private, no-store'
+                return response
+            return cache.public_headers(response, etag, last_modified)
+        return wrapper
+    return decorator
+
+
+def init_app(app):
+    app.extensions['http_cache'] = HttpCache(max_age=app.config.get('HTTP_CACHE_MAX_AGE', 0), build=build_token(app))
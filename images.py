@@ -0,0 +1,317 @@
+"""
+Pipeline de imagens em segundo plano
+
+Uploads entram na tabela images com status 'pending' (a fila é o próprio
+banco, então sobrevive a restarts). Uma thread por worker reivindica lotes
+com UPDATE ... RETURNING e manda cada imagem para um ProcessPoolExecutor,
+que gera larguras em WebP (e AVIF quando o Pillow suporta) mais um
+placeholder borrado em data URI. Os arquivos levam o hash do conteúdo no
+nome e não são regravados se já existem, então reprocessar é idempotente.
+
+Nos templates, responsive_image() (macros/images.html) emite <picture> com
+srcset/sizes a partir das variantes carregadas no snapshot do catálogo.
+"""
+
+import base64
+import concurrent.futures
+import hashlib
+import io
+import os
+import threading
+import time
+
+from flask import current_app
+
+from catalog import get_catalog
+from db import get_pool
+
+RASTER_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+IMAGE_WIDTHS = (320, 640, 960, 1280, 1920)
+PLACEHOLDER_WIDTH = 24
+QUALITY = {'webp': 80, 'avif': 55}
+MAX_ATTEMPTS = 3
+# 'processing' rows older than this were claimed by a worker that died
+STALE_CLAIM_SECONDS = 600
+
+
+def avif_supported():
+    from PIL import Image
+    Image.init()
+    return 'AVIF' in Image.SAVE
+
+
+def render_variants(source_path, output_dir, url_prefix, widths, formats):
+    """Runs in a pool process. Returns dimensions, placeholder and variant list."""
+    from PIL import Image, ImageFilter, ImageOps
+
+    with open(source_path, 'rb') as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()[:16]
+
+    img = Image.open(io.BytesIO(data))
+    original_width = img.width
+    # JPEGs decode at a reduced DCT scale when the largest variant allows it
+    img.draft('RGB', (max(widths), max(widths)))
+    scale = original_width / img.width
+    img = ImageOps.exif_transpose(img)
+    img = img.convert('RGBA' if img.mode in ('RGBA', 'LA', 'P') else 'RGB')
+    width, height = round(img.width * scale), round(img.height * scale)
+
+    targets = sorted({w for w in widths if w < img.width} | {min(img.width, max(widths))})
+    os.makedirs(output_dir, exist_ok=True)
+    variants = []
+    for w in targets:
+        h = max(1, round(img.height * w / img.width))
+        resized = None
+        for fmt in formats:
+            name = f'{digest}-{w}.{fmt}'
+            path = os.path.join(output_dir, name)
+            if not os.path.exists(path):
+                if resized is None:
+                    resized = img if w == img.width else img.resize((w, h), Image.Resampling.LANCZOS)
+                options = {'quality': QUALITY[fmt]}
+                if fmt == 'webp':
+                    options['method'] = 4
+                tmp = f'{path}.{os.getpid()}.tmp'
+                resized.save(tmp, format=fmt.upper(), **options)
+                os.replace(tmp, path)
+            variants.append({'format': fmt, 'width': w, 'height': h,
+                             'url': url_prefix + name, 'bytes': os.path.getsize(path)})
+
+    tiny = img.copy()
+    tiny.thumbnail((PLACEHOLDER_WIDTH, PLACEHOLDER_WIDTH))
+    tiny = tiny.filter(ImageFilter.GaussianBlur(1))
+    buffer = io.BytesIO()
+    tiny.save(buffer, format='WEBP', quality=30)
+    placeholder = 'data:image/webp;base64,' + base64.b64encode(buffer.getvalue()).decode()
+
+    return {'width': width, 'height': height, 'placeholder': placeholder, 'variants': variants}
+
+
+def source_path(static_folder, source):
+    # Only files under /static/ are processed
+    if not source or not source.startswith('/static/'):
+        return None
+    if source.rsplit('.', 1)[-1].lower() not in RASTER_EXTENSIONS:
+        return None
+    path = os.path.normpath(os.path.join(static_folder, source[len('/static/'):]))
+    if not path.startswith(os.path.normpath(static_folder) + os.sep):
+        return None
+    return path
+
+
+CLAIM_SQL = '''
+    UPDATE images
+    SET status = 'processing', claimed_at = CURRENT_TIMESTAMP, attempts = attempts + 1
+    WHERE id IN (
+        SELECT id FROM images WHERE status = 'pending' ORDER BY id LIMIT ?
+    ) OR id IN (
+        SELECT id FROM images WHERE status = 'processing' AND claimed_at < datetime('now', ?) ORDER BY id LIMIT ?
+    )
+    RETURNING id, source, attempts
+'''
+
+
+class ImagePipeline:
+    def __init__(self, app, workers=2, batch_size=8, poll_interval=30.0,
+                 widths=IMAGE_WIDTHS, output_dir=None, url_prefix='/static/img/variants/'):
+        self.app = app
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.widths = tuple(widths)
+        self.output_dir = output_dir or os.path.join(app.static_folder, 'img', 'variants')
+        self.url_prefix = url_prefix
+        self._formats = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pid = None
+        self._thread = None
+        self._executor = None
+        self._executor_pid = None
+        self.processed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+
+    @property
+    def formats(self):
+        if self._formats is None:
+            self._formats = ('avif', 'webp') if avif_supported() else ('webp',)
+        return self._formats
+
+    def _connection(self):
+        pool = get_pool(self.app)
+        return pool, pool.acquire()
+
+    def _get_executor(self):
+        if self._executor is None or self._executor_pid != os.getpid():
+            import multiprocessing  # deferred like PIL: most workers never process an image
+            # spawn: never fork a process that already runs threads
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+            self._executor_pid = os.getpid()
+        return self._executor
+
+    def enqueue(self, source):
+        if source_path(self.app.static_folder, source) is None:
+            return None
+        pool, db = self._connection()
+        try:
+            with db:
+                db.execute('INSERT OR IGNORE INTO images (source) VALUES (?)', [source])
+                db.execute("UPDATE images SET status = 'pending', attempts = 0, error = NULL "
+                           "WHERE source = ? AND status = 'failed'", [source])
+                image_id = db.execute('SELECT id FROM images WHERE source = ?', [source]).fetchone()[0]
+        finally:
+            pool.release(db)
+        self.start()
+        self._wake.set()
+        return image_id
+
+    def start(self):
+        # One dispatcher thread per worker process (it does not survive a fork)
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='image-pipeline', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                if self.process_batch():
+                    continue
+            except Exception as e:
+                print(f"Erro no processamento de imagens: {e}")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def _claim(self, limit):
+        pool, db = self._connection()
+        try:
+            with db:
+                return db.execute(CLAIM_SQL, [limit, f'-{STALE_CLAIM_SECONDS} seconds', limit]).fetchall()
+        finally:
+            pool.release(db)
+
+    def _record(self, image_id, attempts, result=None, error=None):
+        pool, db = self._connection()
+        try:
+            with db:
+                if result is None:
+                    status = 'failed' if attempts >= MAX_ATTEMPTS else 'pending'
+                    db.execute('UPDATE images SET status = ?, error = ? WHERE id = ?', [status, error, image_id])
+                    return
+                db.execute('DELETE FROM image_variants WHERE image_id = ?', [image_id])
+                db.executemany('''
+                    INSERT INTO image_variants (image_id, format, width, height, url, bytes)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', [(image_id, v['format'], v['width'], v['height'], v['url'], v['bytes'])
+                      for v in result['variants']])
+                db.execute('''
+                    UPDATE images SET status = 'done', width = ?, height = ?, placeholder = ?,
+                           error = NULL, processed_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                ''', [result['width'], result['height'], result['placeholder'], image_id])
+        finally:
+            pool.release(db)
+
+    def process_batch(self, limit=None):
+        """Claim and process one batch; returns how many images were claimed."""
+        rows = self._claim(limit or self.batch_size)
+        if not rows:
+            return 0
+        start = time.perf_counter()
+        executor = self._get_executor()
+        futures = {}
+        for image_id, source, attempts in rows:
+            path = source_path(self.app.static_folder, source)
+            if path is None or not os.path.isfile(path):
+                self._record(image_id, MAX_ATTEMPTS, error='arquivo de origem não encontrado')
+                self.failed += 1
+                continue
+            future = executor.submit(render_variants, path, self.output_dir, self.url_prefix,
+                                     self.widths, self.formats)
+            futures[future] = (image_id, attempts)
+
+        done = 0
+        for future in concurrent.futures.as_completed(futures):
+            image_id, attempts = futures[future]
+            try:
+                self._record(image_id, attempts, result=future.result())
+                done += 1
+            except Exception as e:
+                # Pillow raises assorted errors for corrupt or unsupported files
+                self._record(image_id, attempts, error=f'{type(e).__name__}: {e}')
+                self.failed += 1
+                if isinstance(e, concurrent.futures.process.BrokenProcessPool):
+                    self._executor = None
+
+        with self._lock:
+            self.processed += done
+            self.busy_seconds += time.perf_counter() - start
+        if done:
+            self._refresh_catalog()
+        return len(rows)
+
+    def process_pending(self, report=None):
+        """Drain the queue in this process (CLI / resume after a restart)."""
+        while self.process_batch(limit=self.workers * 4):
+            if report:
+                report(self.stats())
+        return self.stats()
+
+    def _refresh_catalog(self):
+        cache = self.app.extensions.get('catalog')
+        if cache is not None:
+            cache.invalidate()
+
+    def delete(self, source):
+        pool, db = self._connection()
+        try:
+            with db:
+                row = db.execute('SELECT id FROM images WHERE source = ?', [source]).fetchone()
+                if row is None:
+                    return []
+                urls = [r[0] for r in db.execute('SELECT url FROM image_variants WHERE image_id = ?', [row[0]])]
+                db.execute('DELETE FROM image_variants WHERE image_id = ?', [row[0]])
+                db.execute('DELETE FROM images WHERE id = ?', [row[0]])
+        finally:
+            pool.release(db)
+        for url in urls:
+            path = os.path.join(self.output_dir, url[len(self.url_prefix):])
+            if os.path.isfile(path):
+                os.remove(path)
+        return urls
+
+    def stats(self):
+        with self._lock:
+            return {
+                'processed': self.processed,
+                'failed': self.failed,
+                'busy_seconds': round(self.busy_seconds, 3),
+                'images_per_second': round(self.processed / self.busy_seconds, 2) if self.busy_seconds else 0.0,
+                'workers': self.workers,
+            }
+
+
+def init_app(app):
+    pipeline = app.extensions['images'] = ImagePipeline(
+        app,
+        workers=app.config.get('IMAGE_WORKERS', 2),
+        batch_size=app.config.get('IMAGE_BATCH_SIZE', 8),
+        poll_interval=app.config.get('IMAGE_POLL_INTERVAL', 30.0),
+        widths=app.config.get('IMAGE_WIDTHS', IMAGE_WIDTHS),
+    )
+    app.add_template_global(image_info)
+    # Resume queued work (e.g. after a restart) once the worker serves requests
+    app.before_request(pipeline.start)
+
+
+def image_pipeline(app=None):
+    return (app or current_app).extensions['images']
+
+
+def image_info(source):
+    # Processed variants of an image URL, or None (template global)
+    return get_catalog().images.get(source) if source else None
@@ -0,0 +1,56 @@
+"""
+Baseline: leva um banco do esquema antigo (o instance/pixelcraft.db
+versionado, criado pelo app_backup) ao esquema que o init_db cria hoje,
+antes das migrações 0001+. Em banco novo as tabelas já têm tudo e nada
+muda.
+
+- orders: status -> order_status, cep/street/... -> delivery_*, colunas novas
+- customers: password_hash (vazia: conta sem senha não entra até redefinir), endereço, newsletter
+- order_items antigo (id, ..., total_price) sai do caminho como
+  order_items_legacy: a 0007 cria a tabela nova e a 0011 copia as linhas
+"""
+
+RENAMED = {
+    'orders': [
+        ('status', 'order_status'), ('cep', 'delivery_cep'), ('street', 'delivery_street'),
+        ('number', 'delivery_number'), ('complement', 'delivery_complement'),
+        ('neighborhood', 'delivery_neighborhood'), ('city', 'delivery_city'), ('state', 'delivery_state'),
+    ],
+}
+
+ADDED = {
+    'customers': [
+        ('password_hash', "TEXT NOT NULL DEFAULT ''"), ('birth_date', 'DATE'),
+        ('address_street', 'TEXT'), ('address_number', 'TEXT'), ('address_complement', 'TEXT'),
+        ('address_neighborhood', 'TEXT'), ('address_city', 'TEXT'), ('address_state', 'TEXT'),
+        ('address_cep', 'TEXT'), ('newsletter', 'INTEGER DEFAULT 0'), ('last_login', 'TIMESTAMP'),
+        ('updated_at', 'TIMESTAMP'),
+    ],
+    'pcs': [('graffiti_description', 'TEXT')],
+    'orders': [('customer_cpf', 'TEXT'), ('discount', 'REAL DEFAULT 0'), ('notes', 'TEXT'), ('tracking_code', 'TEXT')],
+    'games': [('publisher', 'TEXT'), ('min_requirements', 'TEXT'), ('rec_requirements', 'TEXT')],
+    'reviews': [('order_id', 'INTEGER')],
+    'users': [('last_login', 'TIMESTAMP')],
+}
+
+
+def columns(db, table):
+    return {row[1] for row in db.execute(f'PRAGMA table_info({table})')}
+
+
+def upgrade(db):
+    for table, renames in RENAMED.items():
+        existing = columns(db, table)
+        for old, new in renames:
+            if old in existing and new not in existing:
+                db.execute(f'ALTER TABLE {table} RENAME COLUMN {old} TO {new}')
+
+    for table, added in ADDED.items():
+        existing = columns(db, table)
+        for column, definition in added:
+            if column not in existing:
+                db.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+    db.execute('UPDATE customers SET updated_at = created_at WHERE updated_at IS NULL')
+
+    if 'total_price' in columns(db, 'order_items'):
+        db.execute('ALTER TABLE order_items RENAME TO order_items_legacy')
@@ -0,0 +1,35 @@
+-- Índices para as consultas quentes das páginas públicas, área do cliente e admin
+
+-- index(): destaques ativos mais recentes
+CREATE INDEX IF NOT EXISTS idx_pcs_active_featured_created ON pcs (active, featured, created_at);
+
+-- catalog(): filtro por categoria + faixa de preço e ordenações
+CREATE INDEX IF NOT EXISTS idx_pcs_category_active_price ON pcs (category_id, active, price);
+CREATE INDEX IF NOT EXISTS idx_pcs_active_created ON pcs (active, created_at);
+CREATE INDEX IF NOT EXISTS idx_pcs_active_price ON pcs (active, price);
+CREATE INDEX IF NOT EXISTS idx_pcs_active_views ON pcs (active, views);
+
+-- menu de categorias
+CREATE INDEX IF NOT EXISTS idx_categories_active_ordem ON categories (active, ordem);
+
+-- customer_orders / customer_dashboard
+CREATE INDEX IF NOT EXISTS idx_orders_customer_created ON orders (customer_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_orders_customer_payment_total ON orders (customer_id, payment_status, total);
+
+-- admin_orders / admin_dashboard
+CREATE INDEX IF NOT EXISTS idx_orders_status_created ON orders (order_status, created_at);
+CREATE INDEX IF NOT EXISTS idx_orders_created ON orders (created_at);
+CREATE INDEX IF NOT EXISTS idx_orders_payment_total ON orders (payment_status, total);
+
+-- admin_customers
+CREATE INDEX IF NOT EXISTS idx_customers_created ON customers (created_at);
+
+-- product_detail: avaliações aprovadas e jogos do PC
+CREATE INDEX IF NOT EXISTS idx_reviews_pc_status_created ON reviews (pc_id, status, created_at);
+CREATE INDEX IF NOT EXISTS idx_pc_games_pc_game ON pc_games (pc_id, game_id, performance);
+
+-- admin_games
+CREATE INDEX IF NOT EXISTS idx_games_name ON games (name);
+
+-- customer_payments
+CREATE INDEX IF NOT EXISTS idx_payment_methods_customer ON payment_methods (customer_id, active, is_default, created_at);
@@ -0,0 +1,33 @@
+-- Busca textual (FTS5) sobre os PCs, sem acentos e com índices de prefixo para o autocomplete
+
+CREATE VIRTUAL TABLE IF NOT EXISTS pcs_fts USING fts5(
+    name, subtitle, description, processor, gpu, ram, graffiti_artist, graffiti_style,
+    content='pcs', content_rowid='id',
+    tokenize="unicode61 remove_diacritics 2",
+    prefix='2 3 4'
+);
+
+CREATE TRIGGER IF NOT EXISTS pcs_fts_ai AFTER INSERT ON pcs BEGIN
+    INSERT INTO pcs_fts (rowid, name, subtitle, description, processor, gpu, ram, graffiti_artist, graffiti_style)
+    VALUES (new.id, new.name, new.subtitle, new.description, new.processor, new.gpu, new.ram,
+            new.graffiti_artist, new.graffiti_style);
+END;
+
+CREATE TRIGGER IF NOT EXISTS pcs_fts_ad AFTER DELETE ON pcs BEGIN
+    INSERT INTO pcs_fts (pcs_fts, rowid, name, subtitle, description, processor, gpu, ram, graffiti_artist, graffiti_style)
+    VALUES ('delete', old.id, old.name, old.subtitle, old.description, old.processor, old.gpu, old.ram,
+            old.graffiti_artist, old.graffiti_style);
+END;
+
+-- Only text columns: the batched views updates must not touch the index
+CREATE TRIGGER IF NOT EXISTS pcs_fts_au
+AFTER UPDATE OF name, subtitle, description, processor, gpu, ram, graffiti_artist, graffiti_style ON pcs BEGIN
+    INSERT INTO pcs_fts (pcs_fts, rowid, name, subtitle, description, processor, gpu, ram, graffiti_artist, graffiti_style)
+    VALUES ('delete', old.id, old.name, old.subtitle, old.description, old.processor, old.gpu, old.ram,
+            old.graffiti_artist, old.graffiti_style);
+    INSERT INTO pcs_fts (rowid, name, subtitle, description, processor, gpu, ram, graffiti_artist, graffiti_style)
+    VALUES (new.id, new.name, new.subtitle, new.description, new.processor, new.gpu, new.ram,
+            new.graffiti_artist, new.graffiti_style);
+END;
+
+INSERT INTO pcs_fts (pcs_fts) VALUES ('rebuild');
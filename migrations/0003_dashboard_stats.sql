@@ -0,0 +1,87 @@
+-- Contadores do dashboard mantidos por triggers (leitura O(1) em admin_dashboard/customer_dashboard)
+
+CREATE TABLE IF NOT EXISTS stats (
+    name TEXT PRIMARY KEY,
+    value REAL NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS customer_stats (
+    customer_id INTEGER PRIMARY KEY,
+    total_orders INTEGER NOT NULL DEFAULT 0,
+    total_spent REAL NOT NULL DEFAULT 0,
+    FOREIGN KEY (customer_id) REFERENCES customers(id)
+);
+
+INSERT OR REPLACE INTO stats (name, value) VALUES
+    ('total_pcs', (SELECT COUNT(*) FROM pcs WHERE active = 1)),
+    ('total_orders', (SELECT COUNT(*) FROM orders)),
+    ('total_customers', (SELECT COUNT(*) FROM customers)),
+    ('total_revenue', (SELECT COALESCE(SUM(total), 0) FROM orders WHERE payment_status = 'completed'));
+
+INSERT OR REPLACE INTO customer_stats (customer_id, total_orders, total_spent)
+    SELECT customer_id, COUNT(*), COALESCE(SUM(CASE WHEN payment_status = 'completed' THEN total END), 0)
+    FROM orders
+    WHERE customer_id IS NOT NULL
+    GROUP BY customer_id;
+
+-- PCs ativos
+CREATE TRIGGER IF NOT EXISTS stats_pcs_ai AFTER INSERT ON pcs WHEN new.active = 1 BEGIN
+    UPDATE stats SET value = value + 1 WHERE name = 'total_pcs';
+END;
+
+CREATE TRIGGER IF NOT EXISTS stats_pcs_ad AFTER DELETE ON pcs WHEN old.active = 1 BEGIN
+    UPDATE stats SET value = value - 1 WHERE name = 'total_pcs';
+END;
+
+CREATE TRIGGER IF NOT EXISTS stats_pcs_au AFTER UPDATE OF active ON pcs BEGIN
+    UPDATE stats SET value = value + (new.active = 1) - (old.active = 1) WHERE name = 'total_pcs';
+END;
+
+-- Clientes
+CREATE TRIGGER IF NOT EXISTS stats_customers_ai AFTER INSERT ON customers BEGIN
+    UPDATE stats SET value = value + 1 WHERE name = 'total_customers';
+END;
+
+CREATE TRIGGER IF NOT EXISTS stats_customers_ad AFTER DELETE ON customers BEGIN
+    UPDATE stats SET value = value - 1 WHERE name = 'total_customers';
+END;
+
+-- Pedidos e receita (pagamentos concluídos)
+CREATE TRIGGER IF NOT EXISTS stats_orders_ai AFTER INSERT ON orders BEGIN
+    UPDATE stats SET value = value + 1 WHERE name = 'total_orders';
+    UPDATE stats SET value = value + new.total
+    WHERE name = 'total_revenue' AND new.payment_status = 'completed';
+    INSERT INTO customer_stats (customer_id, total_orders, total_spent)
+    SELECT new.customer_id, 1, CASE WHEN new.payment_status = 'completed' THEN new.total ELSE 0 END
+    WHERE new.customer_id IS NOT NULL
+    ON CONFLICT (customer_id) DO UPDATE SET
+        total_orders = total_orders + 1,
+        total_spent = total_spent + excluded.total_spent;
+END;
+
+CREATE TRIGGER IF NOT EXISTS stats_orders_ad AFTER DELETE ON orders BEGIN
+    UPDATE stats SET value = value - 1 WHERE name = 'total_orders';
+    UPDATE stats SET value = value - old.total
+    WHERE name = 'total_revenue' AND old.payment_status = 'completed';
+    UPDATE customer_stats SET
+        total_orders = total_orders - 1,
+        total_spent = total_spent - CASE WHEN old.payment_status = 'completed' THEN old.total ELSE 0 END
+    WHERE customer_id = old.customer_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS stats_orders_au AFTER UPDATE OF payment_status, total, customer_id ON orders BEGIN
+    UPDATE stats SET value = value
+        + CASE WHEN new.payment_status = 'completed' THEN new.total ELSE 0 END
+        - CASE WHEN old.payment_status = 'completed' THEN old.total ELSE 0 END
+    WHERE name = 'total_revenue';
+    UPDATE customer_stats SET
+        total_orders = total_orders - 1,
+        total_spent = total_spent - CASE WHEN old.payment_status = 'completed' THEN old.total ELSE 0 END
+    WHERE customer_id = old.customer_id;
+    INSERT INTO customer_stats (customer_id, total_orders, total_spent)
+    SELECT new.customer_id, 1, CASE WHEN new.payment_status = 'completed' THEN new.total ELSE 0 END
+    WHERE new.customer_id IS NOT NULL
+    ON CONFLICT (customer_id) DO UPDATE SET
+        total_orders = total_orders + 1,
+        total_spent = total_spent + excluded.total_spent;
+END;
@@ -0,0 +1,85 @@
+-- Consolidado por cliente (pedidos, gasto, último pedido, ticket médio) para admin_customers
+-- Todo cliente tem uma linha em customer_stats, então a listagem pode ordenar por ela via índice.
+
+ALTER TABLE customer_stats ADD COLUMN paid_orders INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE customer_stats ADD COLUMN last_order_at TEXT NOT NULL DEFAULT '';
+
+INSERT OR REPLACE INTO customer_stats (customer_id, total_orders, total_spent, paid_orders, last_order_at)
+    SELECT c.id,
+           COUNT(o.id),
+           COALESCE(SUM(CASE WHEN o.payment_status = 'completed' THEN o.total END), 0),
+           COUNT(CASE WHEN o.payment_status = 'completed' THEN 1 END),
+           COALESCE(MAX(o.created_at), '')
+    FROM customers c
+    LEFT JOIN orders o ON o.customer_id = c.id
+    GROUP BY c.id;
+
+CREATE INDEX IF NOT EXISTS idx_customer_stats_spent ON customer_stats(total_spent, customer_id);
+CREATE INDEX IF NOT EXISTS idx_customer_stats_last_order ON customer_stats(last_order_at, customer_id);
+
+-- Linha vazia para clientes novos
+CREATE TRIGGER IF NOT EXISTS customer_stats_customers_ai AFTER INSERT ON customers BEGIN
+    INSERT OR IGNORE INTO customer_stats (customer_id) VALUES (new.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS customer_stats_customers_ad AFTER DELETE ON customers BEGIN
+    DELETE FROM customer_stats WHERE customer_id = old.id;
+END;
+
+-- Os triggers de pedidos passam a manter também paid_orders e last_order_at
+DROP TRIGGER IF EXISTS stats_orders_ai;
+DROP TRIGGER IF EXISTS stats_orders_ad;
+DROP TRIGGER IF EXISTS stats_orders_au;
+
+CREATE TRIGGER stats_orders_ai AFTER INSERT ON orders BEGIN
+    UPDATE stats SET value = value + 1 WHERE name = 'total_orders';
+    UPDATE stats SET value = value + new.total
+    WHERE name = 'total_revenue' AND new.payment_status = 'completed';
+    INSERT INTO customer_stats (customer_id, total_orders, total_spent, paid_orders, last_order_at)
+    SELECT new.customer_id, 1,
+           CASE WHEN new.payment_status = 'completed' THEN new.total ELSE 0 END,
+           new.payment_status = 'completed',
+           COALESCE(new.created_at, '')
+    WHERE new.customer_id IS NOT NULL
+    ON CONFLICT (customer_id) DO UPDATE SET
+        total_orders = total_orders + 1,
+        total_spent = total_spent + excluded.total_spent,
+        paid_orders = paid_orders + excluded.paid_orders,
+        last_order_at = MAX(last_order_at, excluded.last_order_at);
+END;
+
+CREATE TRIGGER stats_orders_ad AFTER DELETE ON orders BEGIN
+    UPDATE stats SET value = value - 1 WHERE name = 'total_orders';
+    UPDATE stats SET value = value - old.total
+    WHERE name = 'total_revenue' AND old.payment_status = 'completed';
+    UPDATE customer_stats SET
+        total_orders = total_orders - 1,
+        total_spent = total_spent - CASE WHEN old.payment_status = 'completed' THEN old.total ELSE 0 END,
+        paid_orders = paid_orders - (old.payment_status = 'completed'),
+        last_order_at = COALESCE((SELECT MAX(created_at) FROM orders WHERE customer_id = old.customer_id), '')
+    WHERE customer_id = old.customer_id;
+END;
+
+CREATE TRIGGER stats_orders_au AFTER UPDATE OF payment_status, total, customer_id, created_at ON orders BEGIN
+    UPDATE stats SET value = value
+        + CASE WHEN new.payment_status = 'completed' THEN new.total ELSE 0 END
+        - CASE WHEN old.payment_status = 'completed' THEN old.total ELSE 0 END
+    WHERE name = 'total_revenue';
+    UPDATE customer_stats SET
+        total_orders = total_orders - 1,
+        total_spent = total_spent - CASE WHEN old.payment_status = 'completed' THEN old.total ELSE 0 END,
+        paid_orders = paid_orders - (old.payment_status = 'completed'),
+        last_order_at = COALESCE((SELECT MAX(created_at) FROM orders WHERE customer_id = old.customer_id), '')
+    WHERE customer_id = old.customer_id;
+    INSERT INTO customer_stats (customer_id, total_orders, total_spent, paid_orders, last_order_at)
+    SELECT new.customer_id, 1,
+           CASE WHEN new.payment_status = 'completed' THEN new.total ELSE 0 END,
+           new.payment_status = 'completed',
+           COALESCE(new.created_at, '')
+    WHERE new.customer_id IS NOT NULL
+    ON CONFLICT (customer_id) DO UPDATE SET
+        total_orders = total_orders + 1,
+        total_spent = total_spent + excluded.total_spent,
+        paid_orders = paid_orders + excluded.paid_orders,
+        last_order_at = MAX(last_order_at, excluded.last_order_at);
+END;
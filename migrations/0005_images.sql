@@ -0,0 +1,28 @@
+-- Fila persistente do processamento de imagens e variantes geradas (WebP/AVIF por largura)
+
+CREATE TABLE IF NOT EXISTS images (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    source TEXT UNIQUE NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    width INTEGER,
+    height INTEGER,
+    placeholder TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    claimed_at TIMESTAMP,
+    processed_at TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_images_status ON images(status, id);
+
+CREATE TABLE IF NOT EXISTS image_variants (
+    image_id INTEGER NOT NULL,
+    format TEXT NOT NULL,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    bytes INTEGER NOT NULL,
+    PRIMARY KEY (image_id, format, width),
+    FOREIGN KEY (image_id) REFERENCES images(id) ON DELETE CASCADE
+) WITHOUT ROWID;
@@ -0,0 +1,57 @@
+-- Galeria dos PCs normalizada: uma linha por imagem, em ordem, com dimensões.
+-- O JSON de pcs.gallery é copiado para cá uma vez e deixa de ser lido.
+
+CREATE TABLE IF NOT EXISTS pc_images (
+    pc_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    alt TEXT,
+    width INTEGER,
+    height INTEGER,
+    PRIMARY KEY (pc_id, position),
+    FOREIGN KEY (pc_id) REFERENCES pcs(id) ON DELETE CASCADE
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_pc_images_url ON pc_images(url);
+
+-- json_each walks each gallery row by row; entries are URL strings or the
+-- {"url", "filename"} objects written by the admin form. Malformed JSON
+-- counts as an empty gallery; positions are renumbered without gaps.
+INSERT OR IGNORE INTO pc_images (pc_id, position, url, alt)
+SELECT pc_id, row_number() OVER (PARTITION BY pc_id ORDER BY position) - 1, url, alt FROM (
+    SELECT p.id AS pc_id, g.key AS position,
+           CASE g.type WHEN 'object' THEN json_extract(g.value, '$.url') ELSE g.value END AS url,
+           CASE g.type WHEN 'object' THEN json_extract(g.value, '$.alt') END AS alt
+    FROM pcs p, json_each(
+        CASE WHEN json_valid(p.gallery) AND json_type(p.gallery) = 'array' THEN p.gallery ELSE '[]' END
+    ) g
+    WHERE g.type IN ('text', 'object')
+)
+WHERE url IS NOT NULL AND url != '';
+
+UPDATE pc_images SET width = i.width, height = i.height
+FROM images i
+WHERE i.source = pc_images.url AND i.status = 'done';
+
+-- Dimensions follow the image pipeline
+CREATE TRIGGER IF NOT EXISTS pc_images_dimensions_ai AFTER INSERT ON pc_images
+WHEN NEW.width IS NULL
+BEGIN
+    UPDATE pc_images SET (width, height) = (
+        SELECT width, height FROM images WHERE source = NEW.url AND status = 'done'
+    )
+    WHERE pc_id = NEW.pc_id AND position = NEW.position
+      AND EXISTS (SELECT 1 FROM images WHERE source = NEW.url AND status = 'done');
+END;
+
+CREATE TRIGGER IF NOT EXISTS pc_images_images_au AFTER UPDATE OF status ON images
+WHEN NEW.status = 'done'
+BEGIN
+    UPDATE pc_images SET width = NEW.width, height = NEW.height WHERE url = NEW.source;
+END;
+
+-- foreign_keys is off on these connections, so the cascade is spelled out
+CREATE TRIGGER IF NOT EXISTS pc_images_pcs_ad AFTER DELETE ON pcs
+BEGIN
+    DELETE FROM pc_images WHERE pc_id = OLD.id;
+END;
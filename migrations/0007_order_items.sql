@@ -0,0 +1,24 @@
+-- Itens de pedido normalizados (uma linha por PC do carrinho). Pedidos
+-- antigos são copiados de orders.items por `flask backfill-order-items`.
+
+CREATE TABLE IF NOT EXISTS order_items (
+    order_id INTEGER NOT NULL,
+    line INTEGER NOT NULL,
+    pc_id INTEGER,
+    name TEXT NOT NULL,
+    unit_price REAL NOT NULL,
+    quantity INTEGER NOT NULL,
+    image TEXT,
+    PRIMARY KEY (order_id, line),
+    FOREIGN KEY (order_id) REFERENCES orders(id) ON DELETE CASCADE,
+    FOREIGN KEY (pc_id) REFERENCES pcs(id)
+) WITHOUT ROWID;
+
+-- Units sold / revenue per PC without touching orders
+CREATE INDEX IF NOT EXISTS idx_order_items_pc ON order_items(pc_id, quantity, unit_price, order_id);
+
+-- foreign_keys is off on these connections, so the cascade is spelled out
+CREATE TRIGGER IF NOT EXISTS order_items_orders_ad AFTER DELETE ON orders
+BEGIN
+    DELETE FROM order_items WHERE order_id = OLD.id;
+END;
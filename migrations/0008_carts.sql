@@ -0,0 +1,31 @@
+-- Carrinho no servidor: o cookie de sessão guarda só o id do carrinho
+
+CREATE TABLE IF NOT EXISTS carts (
+    id TEXT PRIMARY KEY,
+    customer_id INTEGER UNIQUE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (customer_id) REFERENCES customers(id)
+) WITHOUT ROWID;
+
+-- Abandoned anonymous carts are pruned by age
+CREATE INDEX IF NOT EXISTS idx_carts_updated ON carts(updated_at);
+
+CREATE TABLE IF NOT EXISTS cart_items (
+    cart_id TEXT NOT NULL,
+    pc_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    price REAL NOT NULL,
+    image TEXT,
+    quantity INTEGER NOT NULL DEFAULT 1,
+    added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (cart_id, pc_id),
+    FOREIGN KEY (cart_id) REFERENCES carts(id) ON DELETE CASCADE,
+    FOREIGN KEY (pc_id) REFERENCES pcs(id)
+) WITHOUT ROWID;
+
+-- foreign_keys is off on these connections, so the cascade is spelled out
+CREATE TRIGGER IF NOT EXISTS cart_items_carts_ad AFTER DELETE ON carts
+BEGIN
+    DELETE FROM cart_items WHERE cart_id = OLD.id;
+END;
@@ -0,0 +1,17 @@
+-- Pipeline de pedidos: sequência de números de pedido (reservada em blocos
+-- por worker), chave de idempotência do checkout e estoque controlado
+
+CREATE TABLE IF NOT EXISTS sequences (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+) WITHOUT ROWID;
+
+INSERT OR IGNORE INTO sequences (name, value) VALUES ('order_number', 0);
+
+ALTER TABLE orders ADD COLUMN idempotency_key TEXT;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_orders_idempotency_key
+    ON orders(idempotency_key) WHERE idempotency_key IS NOT NULL;
+
+-- NULL: montado sob encomenda, sem limite de unidades
+ALTER TABLE pcs ADD COLUMN stock INTEGER;
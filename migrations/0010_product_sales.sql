@@ -0,0 +1,45 @@
+-- Vendas por PC (unidades e receita) mantidas por triggers em order_items:
+-- os Mais Vendidos do dashboard leem os 5 primeiros pelo índice, sem agregar
+-- order_items a cada carga.
+
+CREATE TABLE IF NOT EXISTS product_sales (
+    pc_id INTEGER PRIMARY KEY,
+    units INTEGER NOT NULL DEFAULT 0,
+    revenue REAL NOT NULL DEFAULT 0,
+    FOREIGN KEY (pc_id) REFERENCES pcs(id)
+);
+
+INSERT OR REPLACE INTO product_sales (pc_id, units, revenue)
+    SELECT pc_id, SUM(quantity), SUM(quantity * unit_price)
+    FROM order_items
+    WHERE pc_id IS NOT NULL
+    GROUP BY pc_id;
+
+CREATE INDEX IF NOT EXISTS idx_product_sales_top ON product_sales(units, revenue, pc_id);
+
+CREATE TRIGGER IF NOT EXISTS product_sales_order_items_ai AFTER INSERT ON order_items
+WHEN new.pc_id IS NOT NULL BEGIN
+    INSERT INTO product_sales (pc_id, units, revenue)
+    VALUES (new.pc_id, new.quantity, new.quantity * new.unit_price)
+    ON CONFLICT (pc_id) DO UPDATE SET
+        units = units + excluded.units,
+        revenue = revenue + excluded.revenue;
+END;
+
+CREATE TRIGGER IF NOT EXISTS product_sales_order_items_ad AFTER DELETE ON order_items
+WHEN old.pc_id IS NOT NULL BEGIN
+    UPDATE product_sales SET units = units - old.quantity, revenue = revenue - old.quantity * old.unit_price
+    WHERE pc_id = old.pc_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS product_sales_order_items_au AFTER UPDATE OF pc_id, quantity, unit_price ON order_items
+BEGIN
+    UPDATE product_sales SET units = units - old.quantity, revenue = revenue - old.quantity * old.unit_price
+    WHERE pc_id = old.pc_id;
+    INSERT INTO product_sales (pc_id, units, revenue)
+    SELECT new.pc_id, new.quantity, new.quantity * new.unit_price
+    WHERE new.pc_id IS NOT NULL
+    ON CONFLICT (pc_id) DO UPDATE SET
+        units = units + excluded.units,
+        revenue = revenue + excluded.revenue;
+END;
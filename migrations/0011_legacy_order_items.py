@@ -0,0 +1,20 @@
+"""
+Linhas do order_items do esquema antigo (renomeado para order_items_legacy
+pela 0000) copiadas para o order_items da 0007: line é a ordem do id
+antigo dentro do pedido, name e image vêm do PC. Em banco sem a tabela
+antiga nada muda.
+"""
+
+
+def upgrade(db):
+    if not db.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'order_items_legacy'").fetchone():
+        return
+    db.execute('''
+        INSERT OR IGNORE INTO order_items (order_id, line, pc_id, name, unit_price, quantity, image)
+        SELECT l.order_id,
+               ROW_NUMBER() OVER (PARTITION BY l.order_id ORDER BY l.id) - 1,
+               l.pc_id, COALESCE(p.name, ''), l.unit_price, l.quantity, p.main_image
+        FROM order_items_legacy l LEFT JOIN pcs p ON p.id = l.pc_id
+        WHERE l.order_id IS NOT NULL
+    ''')
+    db.execute('DROP TABLE order_items_legacy')
@@ -0,0 +1,93 @@
+"""
+Itens de pedido normalizados
+
+process_order grava o pedido e as linhas de order_items na mesma
+transação. Pedidos anteriores à tabela só têm o JSON de orders.items;
+backfill() percorre esses pedidos em lotes pela chave primária (memória
+limitada ao lote) e pode ser interrompido e retomado a qualquer momento.
+"""
+
+import json
+import time
+
+ITEM_COLUMNS = ('order_id', 'line', 'pc_id', 'name', 'unit_price', 'quantity', 'image')
+
+INSERT_SQL = f'''
+    INSERT OR IGNORE INTO order_items ({', '.join(ITEM_COLUMNS)})
+    VALUES ({', '.join('?' * len(ITEM_COLUMNS))})
+'''
+
+ORDER_ITEMS_SQL = '''
+    SELECT pc_id as id, name, unit_price as price, quantity, image
+    FROM order_items
+    WHERE order_id = ?
+    ORDER BY line
+'''
+
+# Orders not yet copied, in primary-key order after the cursor
+PENDING_SQL = '''
+    SELECT o.id, o.items FROM orders o
+    WHERE o.id > ? AND NOT EXISTS (SELECT 1 FROM order_items oi WHERE oi.order_id = o.id)
+    ORDER BY o.id
+    LIMIT ?
+'''
+
+
+def item_rows(order_id, cart):
+    # Cart entries are the session dicts built by add_to_cart
+    rows = []
+    for line, item in enumerate(cart):
+        if not isinstance(item, dict):
+            continue
+        try:
+            rows.append((order_id, line, item.get('id'), item.get('name') or '',
+                         float(item.get('price') or 0), int(item.get('quantity') or 1), item.get('image')))
+        except (TypeError, ValueError):
+            continue
+    return rows
+
+
+def add_items(db, order_id, cart):
+    """Insert the order's lines; the caller owns the transaction."""
+    rows = item_rows(order_id, cart)
+    db.executemany(INSERT_SQL, rows)
+    return len(rows)
+
+
+def parse_items(value):
+    try:
+        items = json.loads(value) if value else []
+    except ValueError:
+        return []
+    return items if isinstance(items, list) else []
+
+
+def items_for_order(db, order):
+    items = [dict(row) for row in db.execute(ORDER_ITEMS_SQL, [order['id']])]
+    # Orders the backfill has not reached yet still carry only the JSON
+    return items or parse_items(order['items'])
+
+
+def backfill(db, chunk_size=1000, report=None):
+    """Copy orders.items into order_items for orders without lines.
+
+    Each chunk is one transaction; returns (orders, items, seconds).
+    """
+    total = db.execute(
+        'SELECT COUNT(*) FROM orders o WHERE NOT EXISTS (SELECT 1 FROM order_items oi WHERE oi.order_id = o.id)'
+        ' -- scan-ok: backfill-order-items (CLI), total para o progresso'
+    ).fetchone()[0]
+    start = time.perf_counter()
+    after, orders, items = 0, 0, 0
+    while True:
+        chunk = db.execute(PENDING_SQL, [after, chunk_size]).fetchall()
+        if not chunk:
+            break
+        with db:
+            for order_id, value in chunk:
+                items += add_items(db, order_id, parse_items(value))
+        orders += len(chunk)
+        after = chunk[-1][0]
+        if report:
+            report(orders, total, items, time.perf_counter() - start)
+    return orders, items, time.perf_counter() - start
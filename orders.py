@@ -0,0 +1,184 @@
+"""
+Criação de pedidos
+
+place_order() faz tudo numa única escrita (run_write: transação BEGIN
+IMMEDIATE, ou um job da fila de escrita com DATABASE_WRITE_QUEUE): confere a
+chave de idempotência do formulário de checkout (um reenvio devolve o
+pedido já criado), relê o carrinho junto com os PCs, reserva o estoque
+dos PCs com estoque controlado, grava o pedido com seus itens e apaga o
+carrinho. Se preço, disponibilidade ou estoque mudaram desde a revisão do
+checkout nada é gravado e o cliente revisa o carrinho de novo.
+
+Os números de pedido vêm da tabela sequences: cada worker reserva um
+bloco de ORDER_NUMBER_BLOCK números de uma vez e os distribui em memória,
+então não há colisão entre workers nem sorteio.
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+
+from flask import current_app
+
+import order_items
+from carts import CHECKOUT_SQL
+from catalog import invalidate_catalog
+from db import run_write
+
+PIX_DISCOUNT = 0.05
+PRICE_TOLERANCE = 0.005
+
+ORDER_COLUMNS = (
+    'order_number', 'customer_id', 'customer_name', 'customer_email', 'customer_phone', 'customer_cpf',
+    'delivery_street', 'delivery_number', 'delivery_complement', 'delivery_neighborhood',
+    'delivery_city', 'delivery_state', 'delivery_cep', 'items', 'subtotal', 'shipping',
+    'total', 'payment_method', 'setup_service', 'idempotency_key',
+)
+
+INSERT_ORDER_SQL = f'''
+    INSERT INTO orders ({', '.join(ORDER_COLUMNS)})
+    VALUES ({', '.join('?' * len(ORDER_COLUMNS))})
+'''
+
+# Customer form field -> orders column
+CUSTOMER_FIELDS = (
+    ('name', 'customer_name'), ('email', 'customer_email'), ('phone', 'customer_phone'),
+    ('cpf', 'customer_cpf'), ('street', 'delivery_street'), ('number', 'delivery_number'),
+    ('complement', 'delivery_complement'), ('neighborhood', 'delivery_neighborhood'),
+    ('city', 'delivery_city'), ('state', 'delivery_state'), ('cep', 'delivery_cep'),
+)
+
+# No row back for PCs without stock control; a negative result means not enough units
+RESERVE_STOCK_SQL = '''
+    UPDATE pcs SET stock = stock - ?, in_stock = (stock - ? > 0), updated_at = CURRENT_TIMESTAMP
+    WHERE id = ? AND stock IS NOT NULL
+    RETURNING stock
+'''
+
+
+class EmptyCart(Exception):
+    pass
+
+
+class CartChanged(Exception):
+    def __init__(self, notices):
+        super().__init__('; '.join(notices))
+        self.notices = notices
+
+
+class OrderNumberAllocator:
+    def __init__(self, block_size=100):
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._pid = None
+        self._next = 0
+        self._end = 0
+        self.blocks = 0
+
+    def _reserve(self):
+        # A write of its own; the block stays ours even if the order rolls back
+        value = run_write(lambda db: db.execute(
+            "UPDATE sequences SET value = value + ? WHERE name = 'order_number' RETURNING value",
+            [self.block_size]).fetchone()[0])
+        self._next, self._end = value - self.block_size + 1, value + 1
+        self.blocks += 1
+
+    def allocate(self):
+        """Next order number; call outside any open transaction."""
+        with self._lock:
+            if self._pid != os.getpid():
+                # A forked worker must not hand out its parent's block
+                self._pid = os.getpid()
+                self._next = self._end = 0
+            if self._next >= self._end:
+                self._reserve()
+            number = self._next
+            self._next += 1
+        # Seven digits: never equal to the legacy random six-digit suffixes
+        return f"PC{datetime.now():%Y%m%d}{number:07d}"
+
+
+def setup_fee(lines):
+    # One assembly visit per order, priced by the most demanding PC
+    return max((line['setup_price'] or 0 for line in lines), default=0)
+
+
+def order_totals(lines, setup_service, payment_method):
+    subtotal = sum(line['price'] * line['quantity'] for line in lines)
+    total = subtotal + (setup_fee(lines) if setup_service else 0)
+    if payment_method == 'pix':
+        total = total * (1 - PIX_DISCOUNT)
+    return subtotal, total
+
+
+def find_by_key(db, key):
+    if not key:
+        return None
+    return db.execute('SELECT id, order_number, total, payment_method FROM orders WHERE idempotency_key = ?',
+                      [key]).fetchone()
+
+
+def _checked_lines(db, cart_id):
+    lines, notices = [], []
+    for row in db.execute(CHECKOUT_SQL, [cart_id]).fetchall():
+        if not row['active'] or row['price'] is None or not row['in_stock']:
+            notices.append(f"{row['name'] or 'Um produto'} não está mais disponível.")
+        elif abs(row['price'] - row['cart_price']) > PRICE_TOLERANCE:
+            notices.append(f"O preço de {row['name']} foi atualizado.")
+        lines.append({'id': row['id'], 'name': row['name'], 'price': row['price'], 'image': row['image'],
+                      'quantity': row['quantity'], 'setup_price': row['setup_price'] or 0})
+    return lines, notices
+
+
+def _place(db, cart_id, form, customer_id, setup_service, payment_method, key, number):
+    # Runs inside the caller's write transaction (run_write)
+    existing = find_by_key(db, key)
+    if existing is not None:
+        return dict(existing), True, False
+
+    lines, notices = _checked_lines(db, cart_id) if cart_id else ([], [])
+    if not lines:
+        raise EmptyCart()
+    if notices:
+        raise CartChanged(notices)
+
+    sold_out = False
+    for line in lines:
+        row = db.execute(RESERVE_STOCK_SQL, [line['quantity'], line['quantity'], line['id']]).fetchone()
+        if row is None:
+            continue
+        if row[0] < 0:
+            available = row[0] + line['quantity']
+            raise CartChanged([f"Estoque insuficiente de {line['name']} ({available} disponível)."])
+        sold_out = sold_out or row[0] == 0
+
+    subtotal, total = order_totals(lines, setup_service, payment_method)
+    values = {column: form.get(field) for field, column in CUSTOMER_FIELDS}
+    values.update(order_number=number, customer_id=customer_id, items=json.dumps(lines), subtotal=subtotal,
+                  shipping=0, total=total, payment_method=payment_method, setup_service=setup_service,
+                  idempotency_key=key)
+    cursor = db.execute(INSERT_ORDER_SQL, [values[column] for column in ORDER_COLUMNS])
+    order_items.add_items(db, cursor.lastrowid, lines)
+    db.execute('DELETE FROM carts WHERE id = ?', [cart_id])
+    order = {'id': cursor.lastrowid, 'order_number': number, 'total': total, 'payment_method': payment_method}
+    return order, False, sold_out
+
+
+def place_order(cart_id, form, customer_id=None, setup_service=0, payment_method='pix', key=None):
+    """Create the order for `cart_id` atomically.
+
+    Returns (order, replayed). Raises EmptyCart, or CartChanged when the
+    cart no longer matches prices/stock (nothing is written).
+    """
+    number = current_app.extensions['order_numbers'].allocate()
+    order, replayed, sold_out = run_write(
+        lambda db: _place(db, cart_id, form, customer_id, setup_service, payment_method, key, number))
+    if sold_out:
+        # in_stock flipped: the catalog offers must stop selling it
+        invalidate_catalog()
+    return order, replayed
+
+
+def init_app(app):
+    app.extensions['order_numbers'] = OrderNumberAllocator(block_size=app.config.get('ORDER_NUMBER_BLOCK', 100))
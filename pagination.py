@@ -0,0 +1,153 @@
+"""
+Paginação por cursor (keyset)
+
+As listagens ordenam por (created_at, id) e cada página busca só as linhas
+depois (ou antes) da última chave vista, com LIMIT por_página + 1, então a
+página N custa o mesmo que a primeira. Os cursores são opacos na URL
+(?after=... / ?before=...).
+
+Consultas SQL paginadas declaram a chave num comentário da própria query:
+    -- keyset: o.created_at, o.id
+"""
+
+import base64
+import json
+import re
+from bisect import bisect_left, bisect_right
+
+from flask import request, url_for
+
+from db import KEYSET_TAG, query_db
+
+
+def encode_cursor(key):
+    raw = json.dumps(list(key), separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        key = json.loads(raw)
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(key, list) or len(key) != 2:
+        return None
+    # Bound straight into SQL parameters: a nested list/dict would raise there
+    if not all(value is None or isinstance(value, (str, int, float)) for value in key):
+        return None
+    return key
+
+
+class Page:
+    def __init__(self, items, next_cursor=None, prev_cursor=None, per_page=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.per_page = per_page
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def _page_cursors(items, key, has_more, backwards, from_cursor):
+    if not items:
+        return None, None
+    first, last = key(items[0]), key(items[-1])
+    if backwards:
+        return encode_cursor(last), encode_cursor(first) if has_more else None
+    return encode_cursor(last) if has_more else None, encode_cursor(first) if from_cursor else None
+
+
+def paginate_query(sql, params=(), per_page=20, after=None, before=None):
+    key_columns = KEYSET_TAG.search(sql).groups()
+    row_keys = [column.rsplit('.', 1)[-1] for column in key_columns]
+    params = list(params)
+
+    cursor = decode_cursor(before) or decode_cursor(after)
+    backwards = cursor is not None and decode_cursor(before) is not None
+    if cursor is not None:
+        joiner = 'AND' if re.search(r'\bWHERE\b', sql, re.IGNORECASE) else 'WHERE'
+        sql += f"\n{joiner} ({key_columns[0]}, {key_columns[1]}) {'>' if backwards else '<'} (?, ?)"
+        params += cursor
+    order = 'ASC' if backwards else 'DESC'
+    sql += f'\nORDER BY {key_columns[0]} {order}, {key_columns[1]} {order}\nLIMIT ?'
+    params.append(per_page + 1)
+
+    rows = query_db(sql, params)
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    next_cursor, prev_cursor = _page_cursors(
+        rows, lambda row: (row[row_keys[0]], row[row_keys[1]]), has_more, backwards, cursor is not None)
+    return Page(rows, next_cursor, prev_cursor, per_page)
+
+
+class _Descending:
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+
+def paginate_list(items, key, descending=True, per_page=24, after=None, before=None):
+    # items must already be ordered by key (ties broken by id inside key)
+    wrap = _Descending if descending else (lambda value: value)
+
+    def sort_key(item):
+        return wrap(tuple(key(item)))
+
+    cursor = decode_cursor(before) or decode_cursor(after)
+    backwards = cursor is not None and decode_cursor(before) is not None
+    try:
+        if cursor is None:
+            start, end = 0, per_page
+        elif backwards:
+            end = bisect_left(items, wrap(tuple(cursor)), key=sort_key)
+            start = max(0, end - per_page)
+        else:
+            start = bisect_right(items, wrap(tuple(cursor)), key=sort_key)
+            end = start + per_page
+    except TypeError:
+        # Cursor from another sort order (or tampered): back to the first page
+        cursor, backwards = None, False
+        start, end = 0, per_page
+
+    page = list(items[start:end])
+    has_more = start > 0 if backwards else end < len(items)
+    next_cursor, prev_cursor = _page_cursors(page, key, has_more, backwards, cursor is not None)
+    return Page(page, next_cursor, prev_cursor, per_page)
+
+
+def page_url(**changes):
+    # Current URL with the cursor args replaced, keeping filters (including repeated args)
+    args = request.args.to_dict(flat=False)
+    args.pop('after', None)
+    args.pop('before', None)
+    args.update({name: value for name, value in changes.items() if value is not None})
+    return url_for(request.endpoint, **(request.view_args or {}), **args)
+
+
+def init_app(app):
+    app.add_template_global(page_url)
@@ -0,0 +1,189 @@
+"""
+Hash e verificação de senhas fora da thread do request
+
+generate/check de senha (scrypt por padrão) custam dezenas a centenas de
+milissegundos de CPU. Aqui eles rodam num ProcessPoolExecutor por worker,
+com prioridade menor (PASSWORD_HASH_NICE), então uma rajada de logins não
+rouba CPU das páginas do catálogo servidas pelo mesmo worker. A fila é
+limitada: com PASSWORD_HASH_WORKERS + PASSWORD_HASH_MAX_QUEUE pedidos em
+andamento, o próximo recebe PasswordHasherBusy (429) em vez de esperar.
+
+Os parâmetros vêm de PASSWORD_HASH_METHOD/PASSWORD_SALT_LENGTH. Um login
+correto com um hash gerado com parâmetros antigos devolve também o hash
+novo, que o app grava no lugar (rehash transparente).
+"""
+
+import concurrent.futures
+import os
+import threading
+import time
+from collections import deque
+
+from flask import current_app, g
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+from db import close_db
+
+LATENCY_SAMPLES = 1000
+
+
+class PasswordHasherBusy(Exception):
+    """Too many hash jobs in flight in this worker; the request should be retried later."""
+
+
+def normalize_method(method):
+    # The prefix Werkzeug writes into the hash for this method, defaults filled in
+    name, *args = method.split(':')
+    if name == 'scrypt':
+        defaults = ['32768', '8', '1']
+    elif name == 'pbkdf2':
+        defaults = ['sha256', str(DEFAULT_PBKDF2_ITERATIONS)]
+    else:
+        return method
+    return ':'.join([name] + args + defaults[len(args):])
+
+
+def needs_rehash(pwhash, method, salt_length):
+    prefix, _, rest = pwhash.partition('$')
+    salt = rest.partition('$')[0]
+    return prefix != normalize_method(method) or len(salt) != salt_length
+
+
+def hash_job(password, method, salt_length):
+    return generate_password_hash(password, method=method, salt_length=salt_length)
+
+
+def verify_job(pwhash, password, method, salt_length):
+    """Runs in a pool process. Returns (ok, new_hash); new_hash only when outdated."""
+    if not check_password_hash(pwhash, password):
+        return False, None
+    if needs_rehash(pwhash, method, salt_length):
+        return True, hash_job(password, method, salt_length)
+    return True, None
+
+
+def _lower_priority(nice):
+    if nice:
+        os.nice(nice)
+
+
+class PasswordHasher:
+    def __init__(self, method='scrypt', salt_length=16, workers=2, max_queue=16, nice=5, timeout=30.0):
+        self.method = method
+        self.salt_length = salt_length
+        self.workers = workers
+        self.max_queue = max_queue
+        self.nice = nice
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+        self._in_flight = 0
+        self.hashed = 0
+        self.verified = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self.shed = 0
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def _get_executor(self):
+        if self._executor is None or self._executor_pid != os.getpid():
+            import multiprocessing
+            # spawn: never fork a process that already runs threads
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'),
+                initializer=_lower_priority, initargs=(self.nice,))
+            self._executor_pid = os.getpid()
+            self._in_flight = 0
+        return self._executor
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            # No pool (CLI, tests): hash on the calling thread
+            return fn(*args)
+        with self._lock:
+            executor = self._get_executor()
+            if self._in_flight >= self.workers + self.max_queue:
+                self.shed += 1
+                raise PasswordHasherBusy()
+            self._in_flight += 1
+        started = time.perf_counter()
+        try:
+            return executor.submit(fn, *args).result(self.timeout)
+        except concurrent.futures.process.BrokenProcessPool:
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            raise
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                self._latencies.append(time.perf_counter() - started)
+
+    def hash(self, password):
+        pwhash = self._run(hash_job, password, self.method, self.salt_length)
+        with self._lock:
+            self.hashed += 1
+        return pwhash
+
+    def hash_inline(self, password):
+        # On the calling thread: CLI commands and seeding, not requests
+        return hash_job(password, self.method, self.salt_length)
+
+    def verify(self, pwhash, password):
+        """Check a password; returns (ok, new_hash), new_hash set when pwhash should be replaced."""
+        ok, new_hash = self._run(verify_job, pwhash, password or '', self.method, self.salt_length)
+        with self._lock:
+            self.verified += 1
+            self.rejected += not ok
+            self.rehashed += new_hash is not None
+        return ok, new_hash
+
+    def stats(self):
+        with self._lock:
+            samples = sorted(self._latencies)
+            return {
+                'method': normalize_method(self.method),
+                'workers': self.workers,
+                'max_queue': self.max_queue,
+                'in_flight': self._in_flight,
+                'hashed': self.hashed,
+                'verified': self.verified,
+                'rejected': self.rejected,
+                'rehashed': self.rehashed,
+                'shed': self.shed,
+                'mean_ms': round(sum(samples) / len(samples) * 1000, 3) if samples else 0.0,
+                'p99_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000, 3)
+                if samples else 0.0,
+            }
+
+
+def init_app(app):
+    app.extensions['passwords'] = PasswordHasher(
+        method=app.config.get('PASSWORD_HASH_METHOD', 'scrypt'),
+        salt_length=app.config.get('PASSWORD_SALT_LENGTH', 16),
+        workers=app.config.get('PASSWORD_HASH_WORKERS', 2),
+        max_queue=app.config.get('PASSWORD_HASH_MAX_QUEUE', 16),
+        nice=app.config.get('PASSWORD_HASH_NICE', 5),
+        timeout=app.config.get('PASSWORD_HASH_TIMEOUT', 30.0),
+    )
+
+
+def password_hasher(app=None):
+    return (app or current_app).extensions['passwords']
+
+
+def _release_connection():
+    # Waiting on the pool must not pin one of the request's few DB connections
+    if 'db' in g and not g.db.in_transaction:
+        close_db()
+
+
+def hash_password(password):
+    _release_connection()
+    return password_hasher().hash(password)
+
+
+def verify_password(pwhash, password):
+    _release_connection()
+    return password_hasher().verify(pwhash, password)
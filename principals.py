@@ -0,0 +1,139 @@
+"""
+Cache dos usuários logados (user_loader do Flask-Login)
+
+O id na sessão já diz a tabela ("admin_3" -> users, "customer_12" ->
+customers), então uma falta no cache custa uma única busca pela chave
+primária. O usuário carregado fica em memória por PRINCIPAL_CACHE_TTL
+segundos; alterações de perfil/senha e desativação de conta chamam
+invalidate_principal(), que remove a entrada neste worker e regrava o
+arquivo de versão (PRINCIPAL_CACHE_STAMP_FILE). Os outros workers conferem
+o arquivo no máximo uma vez por segundo e, se mudou, descartam o cache
+inteiro. Logout não invalida nada: sem a sessão, a entrada só deixa de ser
+usada e sai pelo TTL/LRU.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+from flask import current_app
+
+ROLES = ('admin', 'customer')
+LATENCY_SAMPLES = 1000
+
+
+def parse_user_id(user_id):
+    # "customer_12" -> ('customer', 12); anything else -> (None, None)
+    role, _, pk = (user_id or '').partition('_')
+    if role not in ROLES or not pk.isdigit():
+        return None, None
+    return role, int(pk)
+
+
+class PrincipalCache:
+    def __init__(self, ttl=30.0, max_entries=10000, stamp_path=None, check_interval=1.0):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stamp_path = stamp_path
+        self.check_interval = check_interval
+        self._stamp = self._read_stamp()
+        self._checked_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._miss_times = deque(maxlen=LATENCY_SAMPLES)
+
+    def _read_stamp(self):
+        try:
+            with open(self.stamp_path) as f:
+                return f.read().strip()
+        except (OSError, TypeError):
+            return None
+
+    def _check_stamp(self, now):
+        # Another worker invalidated someone: which one isn't recorded, so drop everything
+        if now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        stamp = self._read_stamp()
+        if stamp != self._stamp:
+            with self._lock:
+                self._stamp = stamp
+                self._entries.clear()
+
+    def get(self, user_id, loader):
+        now = time.monotonic()
+        self._check_stamp(now)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+        started = time.perf_counter()
+        principal = loader(user_id)
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.misses += 1
+            self._miss_times.append(elapsed)
+        if principal is not None:
+            self.put(principal)
+        return principal
+
+    def put(self, principal):
+        with self._lock:
+            self._entries[principal.id] = (time.monotonic() + self.ttl, principal)
+            self._entries.move_to_end(principal.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        # Drops the entry here now and in the other workers on their next stamp check
+        if self.stamp_path:
+            stamp = f'{time.time_ns()}-{os.getpid()}'
+            os.makedirs(os.path.dirname(self.stamp_path), exist_ok=True)
+            tmp = f'{self.stamp_path}.{os.getpid()}.tmp'
+            with open(tmp, 'w') as f:
+                f.write(stamp)
+            os.replace(tmp, self.stamp_path)
+            self._stamp = stamp
+        with self._lock:
+            self.invalidations += 1
+            self._entries.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            samples = sorted(self._miss_times)
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'miss_mean_ms': round(sum(samples) / len(samples) * 1000, 3) if samples else 0.0,
+                'miss_p99_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000, 3)
+                if samples else 0.0,
+            }
+
+
+def init_app(app):
+    app.extensions['principals'] = PrincipalCache(
+        ttl=app.config.get('PRINCIPAL_CACHE_TTL', 30.0),
+        max_entries=app.config.get('PRINCIPAL_CACHE_SIZE', 10000),
+        stamp_path=app.config.get('PRINCIPAL_CACHE_STAMP_FILE',
+                                  os.path.join(app.instance_path, 'principals.version')),
+    )
+
+
+def principal_cache(app=None):
+    return (app or current_app).extensions['principals']
+
+
+def invalidate_principal(user_id):
+    principal_cache().invalidate(user_id)
@@ -0,0 +1,41 @@
+"""
+Registro adiado de rotas, filtros, error handlers e comandos
+
+As views do app.py são declaradas no nível do módulo com os decoradores de
+um Registry (mesma assinatura dos do Flask) e só entram num app quando
+create_app chama init_app. O endpoint continua sendo o nome da função, então
+url_for('catalog') etc. não mudam.
+"""
+
+
+class Registry:
+    def __init__(self):
+        self._deferred = []
+
+    def _defer(self, kind, *args, **kwargs):
+        def decorator(f):
+            self._deferred.append((kind, args, kwargs, f, getattr(f, '__click_params__', None)))
+            return f
+        return decorator
+
+    def route(self, rule, **options):
+        return self._defer('route', rule, **options)
+
+    def errorhandler(self, code_or_exception):
+        return self._defer('errorhandler', code_or_exception)
+
+    def template_filter(self, name=None):
+        return self._defer('template_filter', name)
+
+    def command(self, name=None, **kwargs):
+        return self._defer('command', name, **kwargs)
+
+    def init_app(self, app):
+        for kind, args, kwargs, f, click_params in self._deferred:
+            if kind == 'command':
+                # click consumes the @click.option list; give every app its own copy
+                if click_params is not None:
+                    f.__click_params__ = list(click_params)
+                app.cli.command(*args, **kwargs)(f)
+            else:
+                getattr(app, kind)(*args, **kwargs)(f)
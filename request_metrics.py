@@ -0,0 +1,354 @@
+"""
+Métricas por rota: tempo, SQL, templates e tamanho da resposta
+
+Um middleware WSGI mede cada request de ponta a ponta e, ao final, soma a
+amostra em histogramas de buckets fixos do endpoint (tempo de parede,
+quantidade de comandos SQL, tempo em SQL, tempo renderizando templates e
+bytes da resposta). Registrar custa um bisect por histograma; os
+percentis são estimados a partir dos buckets, como no histogram_quantile
+do Prometheus.
+
+O SQL é contado pela própria conexão do pool (TracedConnection, usada
+quando REQUEST_METRICS está ligado): execute*/fetch* somam na amostra do
+request corrente. Linhas lidas iterando o cursor não entram no tempo, e
+escritas feitas pela thread da fila de escrita aparecem só no tempo de
+parede do request que esperou por elas.
+
+Cada worker grava o seu estado em METRICS_DIR/<pid>.json a cada
+METRICS_FLUSH_INTERVAL segundos; /admin/metrics e /metrics somam os
+arquivos dos workers vivos, então qualquer worker responde pelo servidor
+inteiro. /metrics (formato texto do Prometheus) exige admin logado ou
+Authorization: Bearer METRICS_TOKEN.
+"""
+
+import contextvars
+import json
+import os
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+
+from flask import current_app, request, before_render_template, template_rendered
+
+SECONDS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENTS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# name -> (bounds, Prometheus metric, help)
+HISTOGRAMS = {
+    'wall': (SECONDS, 'pixelcraft_request_duration_seconds', 'Tempo de parede do request'),
+    'sql_count': (STATEMENTS, 'pixelcraft_request_sql_statements', 'Comandos SQL por request'),
+    'sql_time': (SECONDS, 'pixelcraft_request_sql_seconds', 'Tempo em SQL por request'),
+    'template_time': (SECONDS, 'pixelcraft_request_template_seconds', 'Tempo renderizando templates por request'),
+    'size': (BYTES, 'pixelcraft_response_size_bytes', 'Tamanho do corpo da resposta'),
+}
+
+_current = contextvars.ContextVar('request_sample', default=None)
+
+
+class Sample:
+    __slots__ = ('endpoint', 'status', 'size', 'sql_count', 'sql_time', 'template_time',
+                 '_template_depth', '_template_started')
+
+    def __init__(self):
+        self.endpoint = None
+        self.status = 0
+        self.size = 0
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self._template_depth = 0
+        self._template_started = 0.0
+
+
+def _traced(method, args, statements):
+    sample = _current.get()
+    if sample is None:
+        return method(*args)
+    started = time.perf_counter()
+    try:
+        return method(*args)
+    finally:
+        sample.sql_time += time.perf_counter() - started
+        sample.sql_count += statements
+
+
+class TracedCursor(sqlite3.Cursor):
+    def execute(self, *args):
+        return _traced(super().execute, args, 1)
+
+    def executemany(self, *args):
+        return _traced(super().executemany, args, 1)
+
+    def executescript(self, *args):
+        return _traced(super().executescript, args, 1)
+
+    def fetchone(self):
+        return _traced(super().fetchone, (), 0)
+
+    def fetchmany(self, *args):
+        return _traced(super().fetchmany, args, 0)
+
+    def fetchall(self):
+        return _traced(super().fetchall, (), 0)
+
+
+class TracedConnection(sqlite3.Connection):
+    # Connection.execute() builds a plain Cursor in C; route it through cursor()
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+    def executescript(self, *args):
+        return self.cursor().executescript(*args)
+
+    def commit(self):
+        # The WAL append (and any checkpoint) happens here, not in execute()
+        return _traced(super().commit, (), 0)
+
+    def rollback(self):
+        return _traced(super().rollback, (), 0)
+
+
+def new_route():
+    return {
+        'count': 0,
+        'status': {},
+        'histograms': {name: {'counts': [0] * (len(bounds) + 1), 'sum': 0} for name, (bounds, _, _) in HISTOGRAMS.items()},
+    }
+
+
+def merge_into(total, routes):
+    for endpoint, route in routes.items():
+        into = total.setdefault(endpoint, new_route())
+        into['count'] += route['count']
+        for status, count in route['status'].items():
+            into['status'][status] = into['status'].get(status, 0) + count
+        for name, histogram in route['histograms'].items():
+            target = into['histograms'][name]
+            target['sum'] += histogram['sum']
+            target['counts'] = [a + b for a, b in zip(target['counts'], histogram['counts'])]
+    return total
+
+
+def quantile(q, bounds, counts):
+    """Estimate a quantile by linear interpolation inside its bucket."""
+    total = sum(counts)
+    if not total:
+        return 0.0
+    rank = q * total
+    seen = 0
+    for i, count in enumerate(counts):
+        if seen + count >= rank and count:
+            lower = bounds[i - 1] if i > 0 else 0.0
+            if i == len(bounds):
+                return float(bounds[-1])  # +Inf bucket: the largest finite bound
+            return lower + (bounds[i] - lower) * (rank - seen) / count
+        seen += count
+    return float(bounds[-1])
+
+
+class RequestMetrics:
+    connection_class = TracedConnection
+
+    def __init__(self, directory='instance/metrics', flush_interval=5.0, token=None):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.token = token
+        self._lock = threading.Lock()
+        self._routes = {}
+        self._pid = None
+        self._thread = None
+
+    def _ensure_thread(self):
+        # Like the view counter: the flusher does not survive a fork
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._routes = {}
+            self._thread = threading.Thread(target=self._run, name='request-metrics', daemon=True)
+            self._thread.start()
+
+    def record(self, sample, wall):
+        values = (('wall', wall), ('sql_count', sample.sql_count), ('sql_time', sample.sql_time),
+                  ('template_time', sample.template_time), ('size', sample.size))
+        status = f'{sample.status // 100}xx'
+        with self._lock:
+            self._ensure_thread()
+            route = self._routes.get(sample.endpoint)
+            if route is None:
+                route = self._routes[sample.endpoint] = new_route()
+            route['count'] += 1
+            route['status'][status] = route['status'].get(status, 0) + 1
+            histograms = route['histograms']
+            for name, value in values:
+                histogram = histograms[name]
+                histogram['counts'][bisect_left(HISTOGRAMS[name][0], value)] += 1
+                histogram['sum'] += value
+
+    def local(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                return {}
+            return merge_into({}, self._routes)
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Erro ao gravar métricas: {e}")
+
+    def flush(self):
+        routes = self.local()
+        if not routes:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f'{os.getpid()}.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(routes, f)
+        os.replace(path + '.tmp', path)
+
+    def collect(self):
+        """This worker's live counters plus the last flush of every other live worker."""
+        total = self.local()
+        try:
+            filenames = os.listdir(self.directory)
+        except FileNotFoundError:
+            filenames = []
+        for filename in filenames:
+            pid, ext = os.path.splitext(filename)
+            if ext != '.json' or not pid.isdigit() or int(pid) == os.getpid():
+                continue
+            path = os.path.join(self.directory, filename)
+            try:
+                os.kill(int(pid), 0)
+            except ProcessLookupError:
+                # A retired worker: its counters go with it (Prometheus sees a reset)
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                continue
+            except PermissionError:
+                pass
+            try:
+                with open(path) as f:
+                    merge_into(total, json.load(f))
+            except (OSError, ValueError):
+                continue
+        return total
+
+    def summary(self):
+        rows = []
+        for endpoint, route in sorted(self.collect().items(), key=lambda item: -item[1]['histograms']['wall']['sum']):
+            count = route['count']
+            row = {'endpoint': endpoint, 'count': count, 'status': route['status']}
+            for name, histogram in route['histograms'].items():
+                bounds = HISTOGRAMS[name][0]
+                scale = 1000 if bounds is SECONDS else 1
+                suffix = '_ms' if bounds is SECONDS else ''
+                row[f'{name}_mean{suffix}'] = round(histogram['sum'] / count * scale, 3) if count else 0.0
+                row[f'{name}_p50{suffix}'] = round(quantile(0.5, bounds, histogram['counts']) * scale, 3)
+                row[f'{name}_p99{suffix}'] = round(quantile(0.99, bounds, histogram['counts']) * scale, 3)
+            rows.append(row)
+        return rows
+
+    def prometheus(self):
+        routes = self.collect()
+        lines = ['# HELP pixelcraft_requests_total Requests por endpoint e classe de status',
+                 '# TYPE pixelcraft_requests_total counter']
+        for endpoint, route in sorted(routes.items()):
+            for status, count in sorted(route['status'].items()):
+                lines.append(f'pixelcraft_requests_total{{endpoint="{endpoint}",status="{status}"}} {count}')
+        for name, (bounds, metric, help_text) in HISTOGRAMS.items():
+            lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} histogram']
+            for endpoint, route in sorted(routes.items()):
+                histogram = route['histograms'][name]
+                cumulative = 0
+                for bound, count in zip(bounds + ('+Inf',), histogram['counts']):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{endpoint="{endpoint}",le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_sum{{endpoint="{endpoint}"}} {histogram["sum"]}')
+                lines.append(f'{metric}_count{{endpoint="{endpoint}"}} {route["count"]}')
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsMiddleware:
+    """Times the whole WSGI call: session, routing, view, templates, hooks."""
+
+    def __init__(self, wsgi_app, metrics):
+        self.wsgi_app = wsgi_app
+        self.metrics = metrics
+
+    def __call__(self, environ, start_response):
+        sample = Sample()
+        token = _current.set(sample)
+        started = time.perf_counter()
+        try:
+            return self.wsgi_app(environ, start_response)
+        finally:
+            wall = time.perf_counter() - started
+            _current.reset(token)
+            if sample.endpoint is not None:
+                self.metrics.record(sample, wall)
+
+
+def _label_request():
+    sample = _current.get()
+    if sample is not None:
+        # Unmatched URLs would each get their own series otherwise
+        sample.endpoint = request.endpoint or '<unmatched>'
+
+
+def _measure_response(response):
+    sample = _current.get()
+    if sample is not None:
+        if sample.endpoint is None:
+            sample.endpoint = request.endpoint or '<unmatched>'
+        sample.status = response.status_code
+        sample.size = response.content_length or 0
+    return response
+
+
+def _template_started(app, template, context, **extra):
+    sample = _current.get()
+    if sample is not None:
+        if sample._template_depth == 0:
+            sample._template_started = time.perf_counter()
+        sample._template_depth += 1
+
+
+def _template_finished(app, template, context, **extra):
+    sample = _current.get()
+    if sample is not None and sample._template_depth:
+        sample._template_depth -= 1
+        if sample._template_depth == 0:
+            sample.template_time += time.perf_counter() - sample._template_started
+
+
+def init_app(app):
+    if not app.config.get('REQUEST_METRICS', True):
+        return
+    metrics = RequestMetrics(
+        directory=app.config.get('METRICS_DIR', 'instance/metrics'),
+        flush_interval=app.config.get('METRICS_FLUSH_INTERVAL', 5.0),
+        token=app.config.get('METRICS_TOKEN'),
+    )
+    app.extensions['request_metrics'] = metrics
+    app.wsgi_app = MetricsMiddleware(app.wsgi_app, metrics)
+    # First, so a before_request that answers early is still labelled
+    app.before_request_funcs.setdefault(None, []).insert(0, _label_request)
+    app.after_request(_measure_response)
+    before_render_template.connect(_template_started, app)
+    template_rendered.connect(_template_finished, app)
+
+
+def request_metrics(app=None):
+    return (app or current_app).extensions.get('request_metrics')
@@ -1,18 +1,43 @@
 #!/usr/bin/env python3
 """
 Script para iniciar o servidor PixelCraft PC
+
+    python run.py          servidor de desenvolvimento (debugger + reloader)
+    python run.py serve    produção: workers pré-forkados (ver server.py)
 """
 
+import argparse
 import os
 import sys
 
 # Adiciona o diretório ao path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-# Importa e roda a aplicação
-from app import app
 
-if __name__ == '__main__':
+def parse_args():
+    parser = argparse.ArgumentParser(description='Servidor PixelCraft PC')
+    commands = parser.add_subparsers(dest='command')
+    serve = commands.add_parser('serve', help='workers pré-forkados num socket compartilhado')
+    serve.add_argument('--host', default=os.environ.get('HOST', '0.0.0.0'))
+    serve.add_argument('--port', type=int, default=int(os.environ.get('PORT', 5000)))
+    serve.add_argument('--workers', type=int, default=int(os.environ.get('WEB_WORKERS', os.cpu_count() or 1)))
+    serve.add_argument('--threads', type=int, default=int(os.environ.get('WEB_THREADS', 8)))
+    serve.add_argument('--keepalive', type=float, default=5.0, help='segundos de keep-alive ocioso')
+    serve.add_argument('--graceful-timeout', type=float, default=30.0)
+    serve.add_argument('--reuse-port', action='store_true', help='um socket SO_REUSEPORT por worker')
+    serve.add_argument('--access-log', action='store_true')
+    return parser.parse_args()
+
+
+def run_dev():
+    # Importa e roda a aplicação
+    from app import create_app, init_db
+    app = create_app()
+    # Cria/migra o banco antes de servir, como o master do `serve` faz
+    os.makedirs('instance', exist_ok=True)
+    with app.app_context():
+        init_db()
+
     print("=" * 60)
     print("PixelCraft PC - Servidor Iniciado")
     print("=" * 60)
@@ -24,3 +49,14 @@ if __name__ == '__main__':
     print("=" * 60)
     
     app.run(debug=True, host='0.0.0.0', port=5000)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.command == 'serve':
+        os.makedirs('instance', exist_ok=True)
+        os.makedirs('static/img/uploads', exist_ok=True)
+        from server import serve
+        serve(args)
+    else:
+        run_dev()
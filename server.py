@@ -0,0 +1,288 @@
+"""
+Servidor de produção com workers pré-forkados (python run.py serve)
+
+O master abre o socket de escuta (SO_REUSEADDR + SO_REUSEPORT), roda o
+init_db uma única vez num processo filho e forka --workers processos que
+importam o app e atendem no mesmo socket, cada um com um pool fixo de
+--threads threads. O master nunca importa o app: cada worker carrega o
+código do disco, então um SIGHUP troca todos os workers por novos (código
+e configuração recarregados) sem derrubar o socket. Já as bibliotecas
+(Flask, Werkzeug, Jinja2...) o master importa antes de forkar: os workers
+as herdam prontas, sobem mais rápido e dividem essas páginas de memória.
+Com --reuse-port cada worker abre o seu próprio socket SO_REUSEPORT e o
+kernel distribui as conexões entre eles.
+
+Sinais no master:
+    SIGHUP           sobe workers novos e drena os antigos
+    SIGTERM/SIGINT   drena todos os workers e sai
+Um worker que morre sem ter sido pedido é substituído.
+
+Drenar = parar de aceitar conexões, terminar os requests em andamento
+(fechando keep-alives) e sair; quem passa de --graceful-timeout leva
+SIGKILL.
+"""
+
+import concurrent.futures
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+# A worker that dies sooner than this after starting is restarted with a delay
+MIN_WORKER_UPTIME = 1.0
+
+# Imported once by the master and inherited by every worker; app modules stay out
+PRELOAD_MODULES = ('flask', 'flask_login', 'jinja2', 'click', 'sqlite3', 'werkzeug.security', 'werkzeug.utils')
+
+
+class DrainingRequestHandler(WSGIRequestHandler):
+    access_log = False
+
+    def log_request(self, code='-', size='-'):
+        if self.access_log:
+            super().log_request(code, size)
+
+    def handle_one_request(self):
+        super().handle_one_request()
+        # Keep-alive only while a thread is free: otherwise this connection would
+        # hold its thread while others wait in the backlog. Draining closes too.
+        if self.server.draining or self.server.saturated:
+            self.close_connection = True
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """Werkzeug server that handles connections on a fixed-size thread pool.
+
+    A connection is only accepted when a thread is free, so a busy worker
+    leaves new connections in the shared backlog for its siblings.
+    """
+
+    multithread = True
+
+    def __init__(self, host, port, app, threads=8, keepalive=5.0, access_log=False, fd=None):
+        handler = type('Handler', (DrainingRequestHandler,), {'timeout': keepalive, 'access_log': access_log})
+        self.threads = threads
+        self.draining = False
+        self._active = 0
+        self._active_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(threads)
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=threads, thread_name_prefix='request')
+        super().__init__(host, port, app, handler=handler, fd=fd)
+        self.socket.setblocking(False)
+
+    def get_request(self):
+        if not self._slots.acquire(timeout=0.5):
+            raise BlockingIOError()
+        try:
+            # Non-blocking listener: a sibling may have taken the connection first
+            conn, address = self.socket.accept()
+        except BaseException:
+            self._slots.release()
+            raise
+        conn.setblocking(True)
+        with self._active_lock:
+            self._active += 1
+        return conn, address
+
+    @property
+    def saturated(self):
+        return self._active >= self.threads
+
+    def process_request(self, request, client_address):
+        self._executor.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            with self._active_lock:
+                self._active -= 1
+            self._slots.release()
+
+    def drain(self):
+        # Called from a signal handler on the serving thread: shutdown() must run elsewhere
+        self.draining = True
+        threading.Thread(target=self.shutdown, daemon=True).start()
+
+    def serve_forever(self, poll_interval=0.5):
+        try:
+            super().serve_forever(poll_interval=poll_interval)
+        finally:
+            # The listener is closed; let in-flight requests finish
+            self._executor.shutdown(wait=True)
+
+
+def listen(host, port, backlog=1024):
+    """Bind host:port with SO_REUSEPORT; backlog=None binds without listening."""
+    sock = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if hasattr(socket, 'SO_REUSEPORT'):
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    if backlog is not None:
+        sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def preload():
+    import importlib
+    for name in PRELOAD_MODULES:
+        importlib.import_module(name)
+
+
+def run_init_db():
+    # In a throwaway child so the master never imports the app (see module docstring)
+    pid = os.fork()
+    if pid == 0:
+        status = 1
+        try:
+            from app import create_app, init_db
+            from db import get_pool
+            app = create_app()
+            with app.app_context():
+                init_db()
+            get_pool(app).close_all()
+            status = 0
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(status)
+    _, status = os.waitpid(pid, 0)
+    if os.waitstatus_to_exitcode(status) != 0:
+        raise SystemExit('init_db falhou; servidor não iniciado')
+
+
+def worker_main(options, listener):
+    # Until the server runs, SIGTERM/SIGINT simply end the worker
+    for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+        signal.signal(sig, signal.SIG_DFL)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+    from app import create_app
+    app = create_app()
+    if options.reuse_port:
+        # The master's socket only reserves the port; each worker listens on its own
+        listener.close()
+        listener = listen(options.host, options.port)
+    server = PooledWSGIServer(options.host, options.port, app, threads=options.threads,
+                              keepalive=options.keepalive, access_log=options.access_log,
+                              fd=listener.fileno())
+    listener.close()  # the server holds its own dup of the descriptor
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: server.drain())
+    server.serve_forever(poll_interval=0.5)
+
+
+class Master:
+    def __init__(self, options):
+        self.options = options
+        self.listener = None
+        self.workers = {}      # pid -> started_at
+        self.retiring = {}     # pid -> SIGTERM sent at
+        self._signals = []
+
+    def log(self, message):
+        print(f'[master {os.getpid()}] {message}', flush=True)
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                worker_main(self.options, self.listener)
+            except SystemExit as e:
+                status = e.code if isinstance(e.code, int) else 1
+            except BaseException:
+                import traceback
+                traceback.print_exc()
+                status = 1
+            finally:
+                # Normal interpreter exit so atexit hooks (view counter flush) run
+                sys.exit(status)
+        self.workers[pid] = time.monotonic()
+        return pid
+
+    def retire(self, pids):
+        now = time.monotonic()
+        for pid in pids:
+            self.workers.pop(pid, None)
+            self.retiring[pid] = now
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            if self.retiring.pop(pid, None) is not None:
+                continue
+            started_at = self.workers.pop(pid, None)
+            if started_at is None:
+                continue
+            self.log(f'worker {pid} saiu (código {os.waitstatus_to_exitcode(status)}); iniciando outro')
+            if time.monotonic() - started_at < MIN_WORKER_UPTIME:
+                time.sleep(MIN_WORKER_UPTIME)
+            self.spawn()
+
+    def kill_stragglers(self):
+        deadline = time.monotonic() - self.options.graceful_timeout
+        for pid, since in list(self.retiring.items()):
+            if since < deadline:
+                self.log(f'worker {pid} não terminou em {self.options.graceful_timeout:.0f} s; SIGKILL')
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+
+    def _on_signal(self, signum, frame):
+        self._signals.append(signum)
+
+    def run(self):
+        options = self.options
+        self.listener = listen(options.host, options.port, backlog=None if options.reuse_port else 1024)
+        preload()
+        run_init_db()
+        for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+            signal.signal(sig, self._on_signal)
+        for _ in range(options.workers):
+            self.spawn()
+        self.log(f'{options.workers} workers x {options.threads} threads em '
+                 f'http://{options.host}:{options.port}' + (' (SO_REUSEPORT por worker)' if options.reuse_port else ''))
+
+        stopping = False
+        while self.workers or self.retiring:
+            while self._signals:
+                signum = self._signals.pop(0)
+                if signum == signal.SIGHUP and not stopping:
+                    old = list(self.workers)
+                    for _ in range(options.workers):
+                        self.spawn()
+                    self.retire(old)
+                    self.log(f'reload: {len(old)} workers drenando')
+                elif signum in (signal.SIGTERM, signal.SIGINT) and not stopping:
+                    stopping = True
+                    self.retire(list(self.workers))
+                    self.log('encerrando: drenando workers')
+            self.reap()
+            self.kill_stragglers()
+            time.sleep(0.1)
+        self.listener.close()
+        self.log('encerrado')
+
+
+def serve(options):
+    Master(options).run()
@@ -0,0 +1,107 @@
+"""
+Configuração do app (usada por create_app)
+
+Ordem de carga, cada etapa sobrescrevendo a anterior:
+    1. Config (padrões abaixo)
+    2. instance/config.py, se existir
+    3. o arquivo apontado por PIXELCRAFT_SETTINGS, se definida
+    4. variáveis PIXELCRAFT_<CHAVE> do ambiente; o valor é lido como JSON
+       quando possível (PIXELCRAFT_IMAGE_WORKERS=4, PIXELCRAFT_DATABASE_WRITE_QUEUE=true)
+    5. o dicionário passado a create_app (testes, benchmarks)
+
+Sem SECRET_KEY configurada, a chave fica em SECRET_KEY_FILE: o primeiro
+processo a subir gera e grava, os demais (outros workers, reinícios) leem
+a mesma, então as sessões valem em qualquer worker.
+"""
+
+import os
+import secrets
+
+ENV_PREFIX = 'PIXELCRAFT'
+CONFIG_FILE = 'instance/config.py'
+
+
+class Config:
+    SECRET_KEY = None
+    SECRET_KEY_FILE = 'instance/secret_key'
+    DATABASE = 'instance/pixelcraft.db'
+    UPLOAD_FOLDER = 'static/img/uploads'
+    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max
+
+    # Pool de conexões SQLite (por worker)
+    DATABASE_POOL_SIZE = 8
+    DATABASE_CACHE_SIZE_KB = 16384
+    DATABASE_MMAP_SIZE = 128 * 1024 * 1024
+
+    # Visualizações acumuladas em memória e gravadas em lote
+    VIEW_COUNTER_FLUSH_INTERVAL = 5.0
+    VIEW_COUNTER_MAX_PENDING = 500
+
+    # Paginação por cursor
+    CATALOG_PAGE_SIZE = 24
+    ORDERS_PAGE_SIZE = 20
+    ADMIN_PAGE_SIZE = 50
+
+    # ETag/Last-Modified nas páginas públicas (max-age 0: o navegador sempre revalida)
+    HTTP_CACHE_MAX_AGE = 0
+    # Identificador do deploy no ETag (padrão: mtime/tamanho dos .py e templates)
+    BUILD_VERSION = None
+
+    # Cache de fragmentos ({% cache %} nos cards e seções do produto)
+    FRAGMENT_CACHE_MAX_BYTES = 8 * 1024 * 1024
+
+    # Variantes WebP/AVIF das imagens geradas num pool de processos
+    IMAGE_WORKERS = 2
+
+    # Fila de escrita única com group commit
+    DATABASE_WRITE_QUEUE = False
+
+    # Hash de senha num pool de processos limitado (429 quando a fila enche)
+    PASSWORD_HASH_METHOD = 'scrypt:32768:8:1'
+    PASSWORD_HASH_WORKERS = 2
+    PASSWORD_HASH_MAX_QUEUE = 16
+
+    # Usuário logado em cache por worker (load_user sem ida ao banco)
+    PRINCIPAL_CACHE_TTL = 30.0
+
+    # Histogramas por rota (tempo, SQL, templates, bytes) em /admin/metrics e /metrics
+    REQUEST_METRICS = True
+    METRICS_DIR = 'instance/metrics'
+    METRICS_FLUSH_INTERVAL = 5.0
+    METRICS_TOKEN = None
+
+
+def load(app, config=None):
+    app.config.from_object(Config)
+    app.config.from_pyfile(os.path.abspath(CONFIG_FILE), silent=True)
+    if os.environ.get(f'{ENV_PREFIX}_SETTINGS'):
+        app.config.from_envvar(f'{ENV_PREFIX}_SETTINGS')
+    app.config.from_prefixed_env(ENV_PREFIX)
+    if config:
+        app.config.update(config)
+    if not app.config['SECRET_KEY']:
+        app.config['SECRET_KEY'] = shared_secret_key(app.config['SECRET_KEY_FILE'])
+
+
+def shared_secret_key(path):
+    """Read the key from path, creating it if missing (safe with concurrent workers)."""
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    key = secrets.token_hex(32)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        f.write(key)
+    try:
+        # link() fails if another process got there first: use its key
+        os.link(tmp, path)
+    except FileExistsError:
+        with open(path) as f:
+            key = f.read().strip()
+    finally:
+        os.unlink(tmp)
+    return key
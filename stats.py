@@ -0,0 +1,138 @@
+"""
+Estatísticas agregadas do dashboard
+
+Os números do admin e da área do cliente vêm das tabelas stats e
+customer_stats (consolidado por cliente: pedidos, gasto, pedidos pagos e
+último pedido), mantidas por triggers (migrations/0003 e 0004), e as vendas
+por PC vêm de product_sales, mantida por triggers em order_items
+(migrations/0010). reconcile() recalcula tudo a partir das tabelas de
+origem e informa (e corrige) a diferença.
+"""
+
+from db import query_db
+
+# Full recounts: only reconcile-stats (CLI) runs these
+STATS_SOURCES = {
+    'total_pcs': 'SELECT COUNT(*) FROM pcs WHERE active = 1',
+    'total_orders': 'SELECT COUNT(*) FROM orders -- scan-ok: recontagem do reconcile-stats',
+    'total_customers': 'SELECT COUNT(*) FROM customers -- scan-ok: recontagem do reconcile-stats',
+    'total_revenue': "SELECT COALESCE(SUM(total), 0) FROM orders WHERE payment_status = 'completed'",
+}
+
+CUSTOMER_STATS_COLUMNS = ('total_orders', 'total_spent', 'paid_orders', 'last_order_at')
+
+CUSTOMER_STATS_SOURCE = '''
+    SELECT c.id as customer_id,
+           COUNT(o.id) as total_orders,
+           COALESCE(SUM(CASE WHEN o.payment_status = 'completed' THEN o.total END), 0) as total_spent,
+           COUNT(CASE WHEN o.payment_status = 'completed' THEN 1 END) as paid_orders,
+           COALESCE(MAX(o.created_at), '') as last_order_at
+    FROM customers c
+    LEFT JOIN orders o ON o.customer_id = c.id
+    GROUP BY c.id -- scan-ok: recontagem do reconcile-stats
+'''
+
+PRODUCT_SALES_SOURCE = '''
+    SELECT pc_id, SUM(quantity) as units, SUM(quantity * unit_price) as revenue
+    FROM order_items
+    WHERE pc_id IS NOT NULL
+    GROUP BY pc_id
+'''
+
+TOLERANCE = 0.005
+
+
+def dashboard_stats():
+    stats = {name: 0 for name in STATS_SOURCES}
+    for row in query_db('SELECT name, value FROM stats -- scan-ok: uma linha por contador (4)'):
+        stats[row['name']] = row['value']
+    for name in ('total_pcs', 'total_orders', 'total_customers'):
+        stats[name] = int(stats[name])
+    return stats
+
+
+def top_products(limit=5):
+    # The last entries of idx_product_sales_top: constant time whatever the order volume
+    return query_db('''
+        SELECT s.pc_id, p.name, s.units, s.revenue
+        FROM product_sales s
+        JOIN pcs p ON p.id = s.pc_id
+        WHERE s.units > 0
+        ORDER BY s.units DESC, s.revenue DESC
+        LIMIT ?
+    ''', [limit])
+
+
+def avg_ticket(total_spent, paid_orders):
+    return total_spent / paid_orders if paid_orders else 0
+
+
+def customer_stats(customer_id):
+    row = query_db('SELECT * FROM customer_stats WHERE customer_id = ?', [customer_id], one=True)
+    if not row:
+        return {'total_orders': 0, 'total_spent': 0, 'paid_orders': 0, 'last_order_at': None, 'avg_ticket': 0}
+    return {
+        'total_orders': row['total_orders'],
+        'total_spent': row['total_spent'],
+        'paid_orders': row['paid_orders'],
+        'last_order_at': row['last_order_at'] or None,
+        'avg_ticket': avg_ticket(row['total_spent'], row['paid_orders']),
+    }
+
+
+def _same_rollup(have, want):
+    total_orders, total_spent, paid_orders, last_order_at = have
+    return (total_orders == want[0] and abs(total_spent - want[1]) <= TOLERANCE
+            and paid_orders == want[2] and last_order_at == want[3])
+
+
+def reconcile(db, fix=True):
+    drift = []
+    # BEGIN IMMEDIATE blocks writers so the recount matches the stored counters
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        stored = {row['name']: row['value'] for row in db.execute('SELECT name, value FROM stats -- scan-ok: uma linha por contador (4)')}
+        for name, sql in STATS_SOURCES.items():
+            actual = db.execute(sql).fetchone()[0]
+            if name not in stored or abs(stored[name] - actual) > TOLERANCE:
+                drift.append((name, stored.get(name), actual))
+                if fix:
+                    db.execute('INSERT OR REPLACE INTO stats (name, value) VALUES (?, ?)', [name, actual])
+
+        columns = ', '.join(CUSTOMER_STATS_COLUMNS)
+        stored = {row['customer_id']: tuple(row[c] for c in CUSTOMER_STATS_COLUMNS)
+                  for row in db.execute(f'SELECT customer_id, {columns} FROM customer_stats')}
+        actual = {row['customer_id']: tuple(row[c] for c in CUSTOMER_STATS_COLUMNS)
+                  for row in db.execute(CUSTOMER_STATS_SOURCE)}
+        for customer_id in stored.keys() | actual.keys():
+            have = stored.get(customer_id)
+            want = actual.get(customer_id)
+            if have is not None and want is not None and _same_rollup(have, want):
+                continue
+            drift.append((f'customer_{customer_id}', have, want))
+            if not fix:
+                continue
+            if want is None:
+                db.execute('DELETE FROM customer_stats WHERE customer_id = ?', [customer_id])
+            else:
+                db.execute(f'INSERT OR REPLACE INTO customer_stats (customer_id, {columns}) '
+                           'VALUES (?, ?, ?, ?, ?)', [customer_id, *want])
+
+        stored = {row['pc_id']: (row['units'], row['revenue'])
+                  for row in db.execute('SELECT pc_id, units, revenue FROM product_sales -- scan-ok: recontagem do reconcile-stats')}
+        actual = {row['pc_id']: (row['units'], row['revenue']) for row in db.execute(PRODUCT_SALES_SOURCE)}
+        for pc_id in stored.keys() | actual.keys():
+            # A PC whose sales were all deleted keeps a zero row
+            have = stored.get(pc_id, (0, 0))
+            want = actual.get(pc_id, (0, 0))
+            if have[0] == want[0] and abs(have[1] - want[1]) <= TOLERANCE:
+                continue
+            drift.append((f'pc_{pc_id}', stored.get(pc_id), want))
+            if fix:
+                db.execute('INSERT OR REPLACE INTO product_sales (pc_id, units, revenue) VALUES (?, ?, ?)',
+                           [pc_id, *want])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return drift
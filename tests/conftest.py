@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def app(tmp_path):
+    """The app on a fresh, seeded database of its own."""
+    from app import create_app, init_db
+    app = create_app({
+        'TESTING': True,
+        'SECRET_KEY': 'test',
+        'DATABASE': str(tmp_path / 'test.db'),
+        'CATALOG_STAMP_FILE': str(tmp_path / 'catalog.version'),
+        'FRAGMENT_CACHE_STAMP_FILE': str(tmp_path / 'fragments.version'),
+        'PRINCIPAL_CACHE_STAMP_FILE': str(tmp_path / 'principals.version'),
+        'METRICS_DIR': str(tmp_path / 'metrics'),
+        'PASSWORD_HASH_WORKERS': 0,
+    })
+    with app.app_context():
+        init_db()
+    return app
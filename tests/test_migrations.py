@@ -0,0 +1,120 @@
+"""
+Migrações: banco vazio e o banco legado versionado chegam ao mesmo esquema
+"""
+
+import os
+import shutil
+import sqlite3
+
+import pytest
+
+import db as database
+import order_items
+import orders
+from app import QUERY_PLAN_MODULES, create_app, init_db
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LEGACY_DB = os.path.join(ROOT, 'instance', 'pixelcraft.db')
+
+
+def build(tmp_path, database_path):
+    app = create_app({
+        'TESTING': True,
+        'SECRET_KEY': 'test',
+        'DATABASE': str(database_path),
+        'CATALOG_STAMP_FILE': str(tmp_path / 'catalog.version'),
+        'METRICS_DIR': str(tmp_path / 'metrics'),
+        'PASSWORD_HASH_WORKERS': 0,
+    })
+    with app.app_context():
+        init_db()
+    return app
+
+
+def schema(app):
+    with app.app_context():
+        db = database.get_db()
+        tables = [row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        return {table: {row[1] for row in db.execute(f'PRAGMA table_info("{table}")')} for table in tables}
+
+
+@pytest.fixture
+def fresh(tmp_path):
+    return build(tmp_path, tmp_path / 'fresh.db')
+
+
+@pytest.fixture
+def legacy(tmp_path):
+    path = tmp_path / 'legacy.db'
+    shutil.copy(LEGACY_DB, path)
+    return build(tmp_path, path)
+
+
+def test_empty_database_gets_every_migration(fresh):
+    latest = database.list_migrations()[-1][0]
+    with fresh.app_context():
+        versions = [row[0] for row in database.get_db().execute('SELECT version FROM schema_version ORDER BY version')]
+    assert versions == [number for number, _, _ in database.list_migrations()]
+    assert versions[-1] == latest
+
+
+def test_legacy_database_reaches_current_schema(fresh, legacy):
+    current, upgraded = schema(fresh), schema(legacy)
+    for table, columns in current.items():
+        assert table in upgraded, table
+        assert columns <= upgraded[table], (table, columns - upgraded[table])
+    assert 'status' not in upgraded['orders']
+    assert 'total_price' not in upgraded['order_items']
+    assert 'order_items_legacy' not in upgraded
+
+
+def test_legacy_order_items_are_copied(tmp_path):
+    path = tmp_path / 'legacy.db'
+    shutil.copy(LEGACY_DB, path)
+    conn = sqlite3.connect(path)
+    order_id = conn.execute(
+        "INSERT INTO orders (order_number, items, subtotal, total) VALUES ('PC-OLD', '[]', 30, 30)").lastrowid
+    conn.executemany('INSERT INTO order_items (order_id, pc_id, quantity, unit_price, total_price) VALUES (?, ?, ?, ?, ?)',
+                     [(order_id, 2, 1, 20, 20), (order_id, 1, 2, 5, 10)])
+    conn.commit()
+    conn.close()
+
+    app = build(tmp_path, path)
+    with app.app_context():
+        db = database.get_db()
+        lines = db.execute('SELECT line, pc_id, name, quantity FROM order_items WHERE order_id = ? ORDER BY line',
+                           [order_id]).fetchall()
+        assert [tuple(row) for row in lines] == [(0, 2, 'Ipanema Gaming Beast', 1), (1, 1, 'Grafite Starter RJ', 2)]
+        assert db.execute('SELECT units FROM product_sales WHERE pc_id = 1').fetchone()[0] == 2
+
+
+def test_migrate_is_idempotent(legacy):
+    with legacy.app_context():
+        assert database.migrate(database.get_db()) == []
+
+
+def test_legacy_database_serves_and_takes_orders(legacy):
+    client = legacy.test_client()
+    assert client.get('/').status_code == 200
+    assert client.get('/pcs').status_code == 200
+
+    with legacy.app_context():
+        db = database.get_db()
+        pc = db.execute('SELECT id, name, price FROM pcs LIMIT 1').fetchone()
+        values = dict.fromkeys(orders.ORDER_COLUMNS)
+        values.update(order_number='PC-TEST-1', items='[]', subtotal=pc['price'], shipping=0, total=pc['price'],
+                      setup_service=0)
+        cur = db.execute(orders.INSERT_ORDER_SQL, [values[column] for column in orders.ORDER_COLUMNS])
+        cart = [{'id': pc['id'], 'name': pc['name'], 'price': pc['price'], 'quantity': 2}]
+        assert order_items.add_items(db, cur.lastrowid, cart) == 1
+        db.commit()
+        order = db.execute('SELECT id, items FROM orders WHERE id = ?', [cur.lastrowid]).fetchone()
+        assert order_items.items_for_order(db, order)[0]['quantity'] == 2
+
+
+@pytest.mark.parametrize('module', QUERY_PLAN_MODULES)
+def test_no_full_table_scans(fresh, module):
+    with fresh.app_context():
+        problems, accepted = database.find_full_scans(database.get_db(), os.path.join(ROOT, module))
+    assert problems == []
+    assert all(reason for _, reason, _ in accepted)
@@ -0,0 +1,75 @@
+"""
+Checkout (orders.place_order): chave de idempotência, reserva de estoque e carrinho alterado
+"""
+
+import pytest
+
+from db import get_db
+from orders import CartChanged, place_order
+
+FORM = {'name': 'Cliente Teste', 'email': 'cliente@example.com', 'phone': '21999999999', 'cpf': '12345678909',
+        'street': 'Rua A', 'number': '1', 'complement': '', 'neighborhood': 'Centro', 'city': 'Rio de Janeiro',
+        'state': 'RJ', 'cep': '20000000'}
+
+
+@pytest.fixture
+def ctx(app):
+    with app.test_request_context():
+        yield get_db()
+
+
+def make_cart(db, cart_id='cart-1', pc_id=1, quantity=1):
+    pc = db.execute('SELECT name, price, main_image FROM pcs WHERE id = ?', [pc_id]).fetchone()
+    db.execute('INSERT INTO carts (id) VALUES (?)', [cart_id])
+    db.execute('INSERT INTO cart_items (cart_id, pc_id, name, price, image, quantity) VALUES (?, ?, ?, ?, ?, ?)',
+               [cart_id, pc_id, pc['name'], pc['price'], pc['main_image'], quantity])
+    db.commit()
+    return cart_id
+
+
+def count(db, table):
+    return db.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+
+
+def test_replayed_key_returns_the_same_order(ctx):
+    order, replayed = place_order(make_cart(ctx), FORM, key='key-1')
+    assert not replayed
+    # The retry arrives after the cart is gone: the key alone answers it
+    again, replayed = place_order(make_cart(ctx, 'cart-2'), FORM, key='key-1')
+    assert replayed
+    assert again['id'] == order['id']
+    assert again['order_number'] == order['order_number']
+    assert count(ctx, 'orders') == 1
+    assert ctx.execute("SELECT COUNT(*) FROM carts WHERE id = 'cart-2'").fetchone()[0] == 1
+
+
+def test_stock_cannot_go_negative(ctx):
+    ctx.execute('UPDATE pcs SET stock = 1 WHERE id = 1')
+    ctx.commit()
+    with pytest.raises(CartChanged) as raised:
+        place_order(make_cart(ctx, quantity=2), FORM, key='key-1')
+    assert 'Estoque insuficiente' in raised.value.notices[0]
+    assert ctx.execute('SELECT stock, in_stock FROM pcs WHERE id = 1').fetchone()[:] == (1, 1)
+    assert count(ctx, 'orders') == 0
+
+
+def test_last_unit_sells_out(ctx):
+    ctx.execute('UPDATE pcs SET stock = 1 WHERE id = 1')
+    ctx.commit()
+    place_order(make_cart(ctx), FORM, key='key-1')
+    assert ctx.execute('SELECT stock, in_stock FROM pcs WHERE id = 1').fetchone()[:] == (0, 0)
+    with pytest.raises(CartChanged):
+        place_order(make_cart(ctx, 'cart-2'), FORM, key='key-2')
+    assert count(ctx, 'orders') == 1
+
+
+def test_price_change_writes_nothing(ctx):
+    cart_id = make_cart(ctx)
+    ctx.execute('UPDATE pcs SET price = price + 100 WHERE id = 1')
+    ctx.commit()
+    with pytest.raises(CartChanged) as raised:
+        place_order(cart_id, FORM, key='key-1')
+    assert 'preço' in raised.value.notices[0]
+    assert count(ctx, 'orders') == 0
+    assert count(ctx, 'order_items') == 0
+    assert ctx.execute('SELECT COUNT(*) FROM cart_items WHERE cart_id = ?', [cart_id]).fetchone()[0] == 1
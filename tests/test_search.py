@@ -0,0 +1,44 @@
+"""
+Busca (/api/search): rótulos de especificação ("memoria", "placa de video")
+"""
+
+import pytest
+
+from catalog import invalidate_catalog
+from db import get_db
+
+
+@pytest.fixture
+def client(app):
+    with app.app_context():
+        # A PC without GPU/RAM listed must not answer the spec searches
+        get_db().execute("INSERT INTO pcs (name, slug, category_id, price, in_stock) VALUES ('Sem Specs', 'sem-specs', 1, 999, 1)")
+        get_db().commit()
+        invalidate_catalog()
+    return app.test_client()
+
+
+def search(client, q):
+    data = client.get('/api/search', query_string={'q': q}).get_json()
+    return data['total'], {row['slug'] for row in data['results']}
+
+
+def test_spec_label_alone_lists_pcs_with_that_spec(client):
+    total, slugs = search(client, 'memoria')
+    assert total == 4
+    assert 'sem-specs' not in slugs
+
+
+def test_spec_phrase_alone_lists_pcs_with_a_gpu(client):
+    total, slugs = search(client, 'placa de video')
+    assert total == 4
+    assert slugs == {'starter-rj', 'cristo-ultra', 'ipanema-beast', 'lapa-creator'}
+
+
+def test_spec_phrase_with_term_searches_inside_the_column(client):
+    total, slugs = search(client, 'placa de video rtx')
+    assert total == 4
+    assert 'sem-specs' not in slugs
+    assert search(client, 'placa de video radeon')[0] == 0
+    # "rtx" is in the GPU column only: searched under the RAM label it finds nothing
+    assert search(client, 'memoria rtx')[0] == 0
@@ -0,0 +1,138 @@
+"""
+Contador de visualizações com escrita adiada (write-behind)
+
+product_detail só incrementa um contador em memória; uma thread por worker
+grava os incrementos acumulados num único UPDATE em lote a cada
+VIEW_COUNTER_FLUSH_INTERVAL segundos ou quando VIEW_COUNTER_MAX_PENDING
+visualizações se acumulam. Num crash perdem-se no máximo as visualizações
+pendentes desde o último flush (limitadas por VIEW_COUNTER_MAX_PENDING).
+Se o banco falha, as contagens voltam para a próxima tentativa, mas nunca
+além desse limite: o excesso é descartado e aparece em stats()['dropped'].
+"""
+
+import atexit
+import os
+import sqlite3
+import threading
+import time
+
+from flask import current_app
+
+from db import get_pool
+
+
+class ViewCounter:
+    def __init__(self, app, flush_interval=5.0, max_pending=500, catalog_refresh=60.0):
+        self.app = app
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.catalog_refresh = catalog_refresh
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._counts = {}
+        self._pending = 0
+        self._pid = None
+        self._thread = None
+        self._last_catalog_refresh = time.monotonic()
+        self.flushed = 0
+        self.flushes = 0
+        self.dropped = 0
+        atexit.register(self.flush)
+
+    def _ensure_thread(self):
+        # The flusher thread does not survive a fork; each worker starts its own
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._counts = {}
+            self._pending = 0
+            self._thread = threading.Thread(target=self._run, name='view-counter', daemon=True)
+            self._thread.start()
+
+    def hit(self, pc_id):
+        with self._lock:
+            self._ensure_thread()
+            full = self._pending >= self.max_pending
+            if full:
+                # Flushes are failing (or can't keep up): keep the loss bounded
+                self.dropped += 1
+            else:
+                self._counts[pc_id] = self._counts.get(pc_id, 0) + 1
+                self._pending += 1
+                full = self._pending >= self.max_pending
+        if full:
+            self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                if self.flush():
+                    self._refresh_catalog()
+            except Exception:
+                self.app.logger.exception('Erro ao gravar visualizações')
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                if not self._counts or self._pid != os.getpid():
+                    return 0
+                counts, self._counts = self._counts, {}
+                self._pending = 0
+
+            pool = get_pool(self.app)
+            db = pool.acquire()
+            try:
+                with db:
+                    db.executemany('UPDATE pcs SET views = views + ? WHERE id = ?',
+                                   [(n, pc_id) for pc_id, n in counts.items()])
+            except sqlite3.Error:
+                # Put the counts back so the next flush retries them, up to max_pending
+                with self._lock:
+                    for pc_id, n in counts.items():
+                        kept = min(n, self.max_pending - self._pending)
+                        if kept > 0:
+                            self._counts[pc_id] = self._counts.get(pc_id, 0) + kept
+                            self._pending += kept
+                        self.dropped += n - max(kept, 0)
+                raise
+            finally:
+                pool.release(db)
+
+            total = sum(counts.values())
+            self.flushed += total
+            self.flushes += 1
+            return total
+
+    def _refresh_catalog(self):
+        # Keeps sort=popular close to the flushed values without rebuilding on every flush
+        if time.monotonic() - self._last_catalog_refresh < self.catalog_refresh:
+            return
+        self._last_catalog_refresh = time.monotonic()
+        cache = self.app.extensions.get('catalog')
+        if cache is not None:
+            cache.refresh()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pending': self._pending,
+                'pcs_pending': len(self._counts),
+                'flushed': self.flushed,
+                'flushes': self.flushes,
+                'dropped': self.dropped,
+            }
+
+
+def init_app(app):
+    app.extensions['view_counter'] = ViewCounter(
+        app,
+        flush_interval=app.config.get('VIEW_COUNTER_FLUSH_INTERVAL', 5.0),
+        max_pending=app.config.get('VIEW_COUNTER_MAX_PENDING', 500),
+        catalog_refresh=app.config.get('VIEW_COUNTER_CATALOG_REFRESH', 60.0),
+    )
+
+
+def record_view(pc_id):
+    current_app.extensions['view_counter'].hit(pc_id)
@@ -0,0 +1,184 @@
+"""
+Fila de escrita única com group commit (opcional: DATABASE_WRITE_QUEUE)
+
+Com a fila ligada, run_write()/execute_db() não abrem transação na conexão
+do request: a escrita vira um job numa fila e uma thread escritora por
+worker junta numa única transação BEGIN IMMEDIATE tudo o que se acumulou
+na fila enquanto o lote anterior fazia commit (até DATABASE_WRITE_MAX_BATCH;
+com DATABASE_WRITE_MAX_LATENCY > 0 ainda espera esse tanto por mais jobs).
+Cada job roda no seu SAVEPOINT, então um job que falha é desfeito sozinho
+e a exceção volta para quem o enviou; os demais entram no mesmo COMMIT. O
+resultado chega ao request por um Future.
+
+DATABASE_WRITE_TIMEOUT limita só a espera na fila: o job ainda não
+iniciado é cancelado e quem esperava recebe WriteTimeout (um
+sqlite3.OperationalError, como "database is locked" sem a fila); um job
+que já começou é aguardado até o fim, porque vai fazer commit.
+
+Assim um worker disputa o lock de escrita do SQLite com uma conexão só,
+em vez de uma por thread de request.
+"""
+
+import collections
+import concurrent.futures
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from db import get_pool
+
+# Batch-size histogram buckets (upper bounds)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+LATENCY_SAMPLES = 1000
+
+
+class WriteTimeout(sqlite3.OperationalError):
+    """The job waited DATABASE_WRITE_TIMEOUT in the queue and was cancelled unrun."""
+
+
+class WriteQueue:
+    def __init__(self, app, max_batch=64, max_latency=0.0, timeout=10.0):
+        self.app = app
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.jobs = 0
+        self.failed = 0
+        self.batches = 0
+        self.commit_errors = 0
+        self.batch_sizes = collections.Counter()
+        self._commit_times = collections.deque(maxlen=LATENCY_SAMPLES)
+        self._wait_times = collections.deque(maxlen=LATENCY_SAMPLES)
+
+    def _ensure_thread(self):
+        # Neither the queue nor the writer thread survives a fork
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._queue = queue.SimpleQueue()
+                self._reset_stats()
+                self._thread = threading.Thread(target=self._run, name='sqlite-writer', daemon=True)
+                self._thread.start()
+
+    def submit(self, fn):
+        """Queue fn(db); it must not begin, commit or roll back transactions."""
+        self._ensure_thread()
+        future = concurrent.futures.Future()
+        self._queue.put((fn, future, time.perf_counter()))
+        return future
+
+    def run(self, fn):
+        future = self.submit(fn)
+        try:
+            return future.result(self.timeout)
+        except concurrent.futures.TimeoutError:
+            if future.cancel():
+                # Still queued: the writer skips it, so nothing was written
+                raise WriteTimeout(f'write waited more than {self.timeout}s in the queue') from None
+            # Already running: it will commit, so report its real outcome
+            return future.result()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = batch[0][2] + self.max_latency
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        pool = get_pool(self.app)
+        db = pool.acquire()
+        while True:
+            batch = self._collect()
+            try:
+                self._commit(db, batch)
+            except Exception as e:
+                # BEGIN or COMMIT itself failed: nothing in the batch was written
+                if db.in_transaction:
+                    db.rollback()
+                with self._lock:
+                    self.commit_errors += 1
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _commit(self, db, batch):
+        started = time.perf_counter()
+        outcomes = []
+        db.execute('BEGIN IMMEDIATE')
+        for fn, future, queued_at in batch:
+            if not future.set_running_or_notify_cancel():
+                continue  # cancelled by a caller that timed out
+            db.execute('SAVEPOINT job')
+            try:
+                outcomes.append((future, fn(db), None, queued_at))
+            except BaseException as e:
+                db.execute('ROLLBACK TO job')
+                outcomes.append((future, None, e, queued_at))
+            db.execute('RELEASE job')
+        db.commit()
+        finished = time.perf_counter()
+        if not outcomes:
+            return
+
+        with self._lock:
+            self.batches += 1
+            self.jobs += len(outcomes)
+            self.failed += sum(1 for _, _, error, _ in outcomes if error is not None)
+            self.batch_sizes[next((b for b in BATCH_BUCKETS if len(outcomes) <= b), BATCH_BUCKETS[-1])] += 1
+            self._commit_times.append(finished - started)
+            self._wait_times.extend(started - queued_at for _, _, _, queued_at in outcomes)
+        for future, result, error, _ in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    def stats(self):
+        def summary(samples):
+            samples = sorted(samples)
+            if not samples:
+                return {'mean_ms': 0.0, 'p99_ms': 0.0, 'max_ms': 0.0}
+            return {
+                'mean_ms': round(sum(samples) / len(samples) * 1000, 3),
+                'p99_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000, 3),
+                'max_ms': round(samples[-1] * 1000, 3),
+            }
+
+        with self._lock:
+            return {
+                'queue_depth': self._queue.qsize() if self._queue is not None else 0,
+                'jobs': self.jobs,
+                'failed': self.failed,
+                'batches': self.batches,
+                'commit_errors': self.commit_errors,
+                'avg_batch': round(self.jobs / self.batches, 2) if self.batches else 0.0,
+                'batch_sizes': {f'<={b}': self.batch_sizes[b] for b in BATCH_BUCKETS},
+                'commit_latency': summary(self._commit_times),
+                'queue_wait': summary(self._wait_times),
+            }
+
+
+def init_app(app):
+    if not app.config.get('DATABASE_WRITE_QUEUE'):
+        app.extensions.pop('write_queue', None)
+        return
+    app.extensions['write_queue'] = WriteQueue(
+        app,
+        max_batch=app.config.get('DATABASE_WRITE_MAX_BATCH', 64),
+        max_latency=app.config.get('DATABASE_WRITE_MAX_LATENCY', 0.0),
+        timeout=app.config.get('DATABASE_WRITE_TIMEOUT', 10.0),
+    )